@@ -0,0 +1,71 @@
+"""
+Fixtures available in our benchmarks.
+
+Databases are expensive to build, so all fixtures here are session scoped. Each database
+size is only built once and shared by all benchmarks using it.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import os
+
+import pytest
+
+import hamster_cli.hamster_cli as hamster_cli
+
+# Number of generated facts in each of the databases we benchmark against, by test id.
+DATABASE_SIZES = (
+    ('1k', 1000),
+    ('100k', 100000),
+    ('1M', 1000000),
+)
+
+
+class TmpAppDirs(object):
+    """Stand in for ``hamster_cli.AppDirs`` with all user dirs below ``path``."""
+
+    def __init__(self, path):
+        """Create a directory below ``path`` for each of the user dirs."""
+        for name in ('user_config_dir', 'user_data_dir', 'user_cache_dir', 'user_log_dir'):
+            directory = os.path.join(path, name)
+            os.makedirs(directory)
+            setattr(self, name, directory)
+
+
+@pytest.yield_fixture(scope='session')
+def appdirs(tmpdir_factory):
+    """Make sure our benchmarks never touch the actual user dirs."""
+    original = hamster_cli.AppDirs
+    hamster_cli.AppDirs = TmpAppDirs(tmpdir_factory.mktemp('appdirs').strpath)
+    yield hamster_cli.AppDirs
+    hamster_cli.AppDirs = original
+
+
+@pytest.fixture(scope='session')
+def config_instance(appdirs):
+    """Provide our default config."""
+    return hamster_cli._write_config_file(os.path.join(appdirs.user_config_dir,
+        'hamster_cli.conf'))
+
+
+@pytest.fixture(scope='session')
+def controler(config_instance):
+    """Provide a controler using our default config with logging setup."""
+    controler = hamster_cli.Controler(hamster_cli._get_config(config_instance))
+    hamster_cli._setup_logging(controler)
+    return controler
+
+
+@pytest.fixture(scope='session', params=[count for name, count in DATABASE_SIZES],
+    ids=[name for name, count in DATABASE_SIZES])
+def bench_controler(request, controler, tmpdir_factory):
+    """
+    Provide a controler for a database of generated facts, for each of our sizes.
+
+    Facts are generated exactly like ``bench`` does, using its default seed as well as
+    number of activities and categories.
+    """
+    workdir = tmpdir_factory.mktemp('database').strpath
+    bench_controler = hamster_cli._get_bench_controler(controler, workdir)
+    hamster_cli._populate_bench_store(bench_controler, request.param, 20, 5)
+    return bench_controler
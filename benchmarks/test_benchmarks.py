@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for our command helpers.
+
+Facts in our databases are generated at a constant rate, so a time range of a given width
+holds about the same number of facts regardless of database size. Any difference between
+sizes is down to how well the backend finds them.
+"""
+
+import datetime
+import os
+
+import pytest
+
+from hamster_cli import hamster_cli
+
+# Width, in days, of the time range we search and export.
+RANGE_DAYS = 30
+
+
+@pytest.fixture
+def time_range():
+    """Provide ``(start, end)`` covering the last ``RANGE_DAYS`` days."""
+    end = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    return end - datetime.timedelta(days=RANGE_DAYS), end
+
+
+@pytest.fixture
+def raw_time_range(time_range):
+    """Provide our time range as accepted by ``search`` and ``list``."""
+    return '{} - {}'.format(*[value.strftime('%Y-%m-%d %H:%M') for value in time_range])
+
+
+@pytest.mark.parametrize('search_term', ('', 'activity-1'))
+def test_search(benchmark, bench_controler, raw_time_range, search_term):
+    """Benchmark listing and searching the facts of our time range."""
+    with hamster_cli._silenced_stdout():
+        benchmark(hamster_cli._search, bench_controler, search_term, raw_time_range)
+
+
+def test_generate_facts_table(benchmark, bench_controler, time_range):
+    """Benchmark rendering the facts of our time range."""
+    start, end = time_range
+    facts = bench_controler.facts.get_all(start=start, end=end)
+    benchmark(hamster_cli._generate_facts_table, facts)
+
+
+@pytest.mark.parametrize('format', ('csv', 'ical', 'xml', 'parquet', 'arrow'))
+def test_export(benchmark, bench_controler, time_range, format, tmpdir):
+    """Benchmark exporting the facts of our time range."""
+    if format in ('parquet', 'arrow'):
+        pytest.importorskip('pyarrow')
+    start, end = time_range
+    path = os.path.join(tmpdir.strpath, 'export.{}'.format(format))
+    with hamster_cli._silenced_stdout():
+        benchmark(hamster_cli._export, bench_controler, format, start, end, path)
+
+
+def test_start_stop(benchmark, bench_controler):
+    """Benchmark starting and stopping an *ongoing fact*."""
+    def start_stop():
+        hamster_cli._start(bench_controler, 'activity-0@category-0', '', '')
+        hamster_cli._stop(bench_controler)
+
+    with hamster_cli._silenced_stdout():
+        benchmark(start_stop)
+
+
+def test_get_config(benchmark, config_instance):
+    """Benchmark processing our default config."""
+    benchmark(hamster_cli._get_config, config_instance)
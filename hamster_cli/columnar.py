@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of 'hamster_cli'.
+#
+# 'hamster_cli' is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# 'hamster_cli' is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with 'hamster_cli'.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Columnar export writers based on ``pyarrow``.
+
+The writers provided here follow the interface of ``hamster_lib.reports.ReportWriter``
+but produce typed, columnar output that can be loaded without any parsing.
+Facts are collected into chunks of ``chunk_size`` rows and each chunk is written
+as its own row group (parquet) or record batch (arrow).
+
+``pyarrow`` is an optional dependency and will only be imported once one of our
+writers is actually instantiated.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from collections import namedtuple
+from gettext import gettext as _
+
+from hamster_lib import reports
+
+ColumnarFactTuple = namedtuple('ColumnarFactTuple', ('start', 'end', 'duration', 'activity',
+    'category', 'tags', 'description'))
+
+# Number of facts that make up a single row group/record batch.
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def import_pyarrow():
+    """
+    Import ``pyarrow`` on demand.
+
+    Returns:
+        module: The ``pyarrow`` package.
+
+    Raises:
+        ImportError: If ``pyarrow`` is not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc  # NOQA
+        import pyarrow.parquet  # NOQA
+    except ImportError:
+        raise ImportError(_(
+            "Columnar exports require 'pyarrow'. You can install it with"
+            " 'pip install hamster_cli[columnar]'."
+        ))
+    return pyarrow
+
+
+class ColumnarWriter(reports.ReportWriter):
+    """
+    Base class for writers that produce columnar output.
+
+    Subclasses need to provide ``_open_writer``, which is expected to return an object
+    with ``write_batch`` and ``close`` methods.
+    """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Initiate new instance and open a binary output file like object.
+
+        Args:
+            path: File like object to be opened. This is where all output will be directed to.
+            chunk_size (int): Number of facts per row group/record batch.
+        """
+        self.pyarrow = import_pyarrow()
+        self.chunk_size = chunk_size
+        self.schema = self._get_schema()
+        self.file = open(path, 'wb')
+        try:
+            self.writer = self._open_writer()
+        except Exception:
+            self.file.close()
+            raise
+        self.chunk = []
+        # Dictionary values seen so far for our dictionary encoded columns. Later
+        # batches only ever extend those, so each batch carries a dictionary delta.
+        self.dictionaries = {'activity': {}, 'category': {}}
+
+    def _get_schema(self):
+        """Return the ``pyarrow.Schema`` for our output."""
+        pa = self.pyarrow
+        dictionary = pa.dictionary(pa.int32(), pa.string())
+        return pa.schema([
+            ('start', pa.timestamp('s')),
+            ('end', pa.timestamp('s')),
+            ('duration', pa.duration('s')),
+            ('activity', dictionary),
+            ('category', dictionary),
+            ('tags', pa.list_(pa.string())),
+            ('description', pa.string()),
+        ])
+
+    def _open_writer(self):
+        """Return the format specific batch writer wrapping ``self.file``."""
+        raise NotImplementedError
+
+    def _fact_to_tuple(self, fact):
+        """
+        Convert a ``Fact`` to its normalized tuple.
+
+        Unlike the text based writers we keep native types. Missing categories and
+        descriptions are represented by ``None``.
+
+        Args:
+            fact (hamster_lib.Fact): Fact to be converted.
+
+        Returns:
+            ColumnarFactTuple: Tuple representing the original ``Fact``.
+        """
+        if fact.category:
+            category = fact.category.name
+        else:
+            category = None
+
+        if fact.end:
+            duration = int(fact.delta.total_seconds())
+        else:
+            duration = None
+
+        return ColumnarFactTuple(
+            start=fact.start,
+            end=fact.end,
+            duration=duration,
+            activity=fact.activity.name,
+            category=category,
+            tags=sorted(getattr(tag, 'name', tag) for tag in fact.tags),
+            description=fact.description,
+        )
+
+    def _write_fact(self, fact_tuple):
+        """Add a fact to the current chunk and write the chunk once it is full."""
+        self.chunk.append(fact_tuple)
+        if len(self.chunk) >= self.chunk_size:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        """Turn the current chunk into a record batch and hand it to our writer."""
+        pa = self.pyarrow
+        columns = ColumnarFactTuple(*zip(*self.chunk))
+        arrays = [
+            pa.array(columns.start, type=pa.timestamp('s')),
+            pa.array(columns.end, type=pa.timestamp('s')),
+            pa.array(columns.duration, type=pa.int64()).cast(pa.duration('s')),
+            self._dictionary_encode('activity', columns.activity),
+            self._dictionary_encode('category', columns.category),
+            pa.array(columns.tags, type=pa.list_(pa.string())),
+            pa.array(columns.description, type=pa.string()),
+        ]
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.chunk = []
+
+    def _dictionary_encode(self, column, values):
+        """Return ``values`` as ``DictionaryArray`` that shares its dictionary across batches."""
+        pa = self.pyarrow
+        dictionary = self.dictionaries[column]
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+            else:
+                indices.append(dictionary.setdefault(value, len(dictionary)))
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32()),
+            pa.array(sorted(dictionary, key=dictionary.get), type=pa.string()),
+        )
+
+    def _close(self):
+        """Write any pending facts, finalize the output and close our file."""
+        if self.chunk:
+            self._write_chunk()
+        self.writer.close()
+        return super(ColumnarWriter, self)._close()
+
+
+class ParquetWriter(ColumnarWriter):
+    """Writer for Apache Parquet files. Each chunk becomes a row group."""
+
+    def _open_writer(self):
+        return self.pyarrow.parquet.ParquetWriter(self.file, self.schema)
+
+
+class ArrowWriter(ColumnarWriter):
+    """Writer for Arrow IPC (aka feather v2) files that can be memory mapped."""
+
+    def _open_writer(self):
+        options = self.pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        return self.pyarrow.ipc.new_file(self.file, self.schema, options=options)
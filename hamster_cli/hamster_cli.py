@@ -20,11 +20,34 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import atexit
+import bisect
+import bz2
+import codecs
+import cProfile
+import csv
 import datetime
+import errno
+import glob
+import gzip
+import hashlib
+import json
 import logging
+import math
+import multiprocessing
 import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import timeit
 from collections import namedtuple
+from contextlib import contextmanager
 from gettext import gettext as _
+from logging.handlers import RotatingFileHandler
 
 import appdirs
 import click
@@ -33,11 +56,45 @@ import hamster_lib
 # under python 2 is practicly non existing and manual encoding is not easily
 # possible.
 from backports.configparser import SafeConfigParser
-from hamster_lib import Fact, HamsterControl, reports
+from hamster_lib import Activity, Category, Fact, HamsterControl, Tag, reports
+from hamster_lib.backends.sqlalchemy import objects as alchemy_objects
 from hamster_lib.helpers import time as time_helpers
+from six.moves import queue
+from six.moves.urllib.request import pathname2url
+from sqlalchemy import create_engine, event, inspect, select, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.pool import QueuePool
 from tabulate import tabulate
 
-from . import help_strings
+from . import columnar, heatmap, help_strings, metrics
+
+try:
+    import lzma
+except ImportError:
+    # ``lzma`` is only part of the standard library from python 3.3 onwards.
+    lzma = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import tracemalloc
+except ImportError:
+    # ``tracemalloc`` is only part of the standard library from python 3.4 onwards.
+    tracemalloc = None
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    # Only part of the standard library from python 3.2 onwards. We write our logfile
+    # right away instead.
+    QueueHandler = QueueListener = None
+
+# Make our own log structured store available next to those shipped with hamster-lib.
+hamster_lib.lib.REGISTERED_BACKENDS.setdefault('log', hamster_lib.lib.BackendRegistryEntry(
+    'Log structured', 'hamster_cli.logstore.LogStore'))
 
 
 class HamsterAppDirs(appdirs.AppDirs):
@@ -112,11 +169,260 @@ class HamsterAppDirs(appdirs.AppDirs):
 class Controler(HamsterControl):
     """A custom controler that adds config handling on top of its regular functionality."""
 
-    def __init__(self):
-        """Instantiate controler instance and adding client_config to it."""
-        lib_config, client_config = _get_config(_get_config_instance())
+    def __init__(self, config=None):
+        """
+        Instantiate controler instance and adding client_config to it.
+
+        Args:
+            config (tuple, optional): ``(lib_config, client_config)`` as returned by
+                ``_get_config``. If not given, it is read from our config file.
+        """
+        if config is None:
+            config = _get_config(_get_config_instance())
+        lib_config, client_config = config
         super(Controler, self).__init__(lib_config)
         self.client_config = client_config
+        self.phase_timer = None
+        self.memory_profiler = None
+        # Number of results the invoked command returned, if that applies.
+        self.result_count = None
+
+    def _get_store(self):
+        """Setup the store and apply any client specific database settings to it."""
+        store = super(Controler, self)._get_store()
+        _apply_sqlite_pragmas(store)
+        _apply_connection_pool(store)
+        _load_snapshot(store)
+        _create_facts_end_index(store)
+        return store
+
+
+class TimedQueuePool(QueuePool):
+    """A ``QueuePool`` that logs how long it takes to check out a connection."""
+
+    def connect(self):
+        """Check out a connection, including any pre-ping, and log the time it took."""
+        timer = timeit.default_timer()
+        connection = super(TimedQueuePool, self).connect()
+        duration = (timeit.default_timer() - timer) * 1000
+        logging.getLogger('hamster_cli').debug(_(
+            "Connection checked out in {:.1f} ms.".format(duration)
+        ), extra={'duration_ms': round(duration, 3)})
+        return connection
+
+
+class LockedRotatingFileHandler(RotatingFileHandler):
+    """
+    A ``RotatingFileHandler`` that can be shared by concurrent processes.
+
+    Each record is written, and the file rolled over if need be, while holding an
+    advisory lock on ``<filename>.lock`` where ``fcntl`` is available. If another
+    process rolled the file over in the meantime, we reopen it first rather than keep
+    writing to the renamed file.
+    """
+
+    def __init__(self, filename, *args, **kwargs):
+        """Set up the handler, the lock file is only opened by the first ``emit``."""
+        RotatingFileHandler.__init__(self, filename, *args, **kwargs)
+        self._lock_file = None
+
+    def emit(self, record):
+        """Write ``record`` and roll over if need be, while holding our lock."""
+        if fcntl is None:
+            RotatingFileHandler.emit(self, record)
+            return
+        try:
+            if self._lock_file is None:
+                self._lock_file = open('{}.lock'.format(self.baseFilename), 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_rotated()
+                RotatingFileHandler.emit(self, record)
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        """Close our logfile as well as our lock file."""
+        RotatingFileHandler.close(self)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _reopen_if_rotated(self):
+        """Reopen our file if it is not the one at ``baseFilename`` any more."""
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except OSError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or (current.st_dev, current.st_ino) != (opened.st_dev,
+                opened.st_ino):
+            self.stream.close()
+            self.stream = self._open()
+
+
+class JSONLogFormatter(logging.Formatter):
+    """
+    Format log records as JSON objects, one per line.
+
+    Besides the wall clock time each record carries the milliseconds since startup. A
+    ``duration_ms`` passed as ``extra`` is included as well.
+    """
+
+    def format(self, record):
+        """Return ``record`` as a JSON object on a single line."""
+        data = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(),
+            'elapsed_ms': round(record.relativeCreated, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'function': record.funcName,
+            'process': record.process,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        duration = getattr(record, 'duration_ms', None)
+        if duration is not None:
+            data['duration_ms'] = duration
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data)
+
+
+class PhaseTimer(object):
+    """Accumulate the wall clock time spent in each phase of an invocation."""
+
+    def __init__(self):
+        """Start the clock, phases are added as they are entered."""
+        self.started = timeit.default_timer()
+        self.names = []
+        self.durations = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent within this block to phase ``name``."""
+        timer = timeit.default_timer()
+        try:
+            yield
+        finally:
+            if name not in self.durations:
+                self.names.append(name)
+                self.durations[name] = 0.0
+            self.durations[name] += timeit.default_timer() - timer
+
+    def get_table(self):
+        """
+        Return a breakdown of all phases so far.
+
+        Anything not covered by a phase is accounted for as 'other'.
+
+        Returns:
+            tuple: ``(table, headers)`` ready to be passed to ``tabulate``.
+        """
+        total = timeit.default_timer() - self.started
+        rows = [(name, self.durations[name]) for name in self.names]
+        rows.append(('other', max(total - sum(self.durations.values()), 0.0)))
+        rows.append(('total', total))
+        table = [(name, '{:.1f}'.format(seconds * 1000), '{:.0f}'.format(
+            seconds / total * 100 if total else 0)) for name, seconds in rows]
+        return table, (_("Phase"), _("ms"), _("%"))
+
+
+# Number of allocation sites listed by ``--memprofile``.
+MEMPROFILE_TOP_SITES = 10
+
+
+class MemoryProfiler(object):
+    """
+    Trace memory allocations and take a snapshot at the end of each phase.
+
+    Only a single frame is recorded per allocation, which is all we need to point out
+    allocation sites and keeps the overhead of tracing low.
+
+    The peak of each phase is only its own where ``tracemalloc.reset_peak`` exists
+    (python 3.9 onwards), otherwise it is the peak of the process so far.
+    """
+
+    def __init__(self):
+        """Start tracing allocations."""
+        tracemalloc.start()
+        self.snapshots = []
+        self.peak = 0
+        self.per_phase_peak = hasattr(tracemalloc, 'reset_peak')
+
+    def start_phase(self):
+        """Start measuring the peak of a new phase, if possible."""
+        if self.per_phase_peak:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+    def snapshot(self, name):
+        """Record current and peak memory after phase ``name`` along with a snapshot."""
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ))
+        self.snapshots.append((name, current, peak, snapshot))
+
+    def stop(self):
+        """Stop tracing and discard all traces."""
+        tracemalloc.stop()
+
+    def get_report(self, limit=MEMPROFILE_TOP_SITES):
+        """
+        Return a report of peak memory, all phases and the top allocation sites.
+
+        For each phase the site that allocated the most memory during that phase is
+        shown. The top ``limit`` allocation sites are those still holding memory after
+        the phase that ended with the highest memory usage.
+
+        Returns:
+            str: Report ready to be printed.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [_("Peak memory: {peak}, currently allocated: {current}.".format(
+            peak=_format_size(max(self.peak, peak)), current=_format_size(current)))]
+        if not self.snapshots:
+            self.snapshot('total')
+
+        table = []
+        previous = None
+        for name, current, peak, snapshot in self.snapshots:
+            if previous is None:
+                statistics = snapshot.statistics('lineno')
+                growth = current
+            else:
+                statistics = snapshot.compare_to(previous[3], 'lineno')
+                growth = current - previous[1]
+            site = ''
+            if statistics:
+                top = statistics[0]
+                site = '{} ({})'.format(top.traceback[0], _format_size(getattr(
+                    top, 'size_diff', top.size)))
+            table.append((name, _format_size(current), _format_size(peak),
+                _format_size(growth), site))
+            previous = (name, current, peak, snapshot)
+        lines.append('')
+        if self.per_phase_peak:
+            peak_header = _("Peak")
+        else:
+            peak_header = _("Peak (cumulative)")
+        lines.append(tabulate(table, headers=(_("Phase"), _("Allocated"), peak_header,
+            _("Growth"), _("Top allocation site"))))
+
+        name, current, peak, snapshot = max(self.snapshots, key=lambda item: item[1])
+        lines.append('')
+        lines.append(_("Top allocation sites after '{}':".format(name)))
+        table = [(_format_size(statistic.size), statistic.count, statistic.traceback[0])
+            for statistic in snapshot.statistics('lineno')[:limit]]
+        lines.append(tabulate(table, headers=(_("Size"), _("Blocks"), _("Site"))))
+        return '\n'.join(lines)
 
 
 LOG_LEVELS = {
@@ -127,24 +433,257 @@ LOG_LEVELS = {
 }
 
 
+# sqlite PRAGMAs that may be configured, in the order they are applied. The second
+# value lists all valid settings, ``int`` indicates a numeric value.
+SQLITE_PRAGMAS = (
+    ('busy_timeout', int),
+    ('journal_mode', ('delete', 'truncate', 'persist', 'memory', 'wal', 'off')),
+    ('synchronous', ('off', 'normal', 'full', 'extra')),
+    ('cache_size', int),
+    ('mmap_size', int),
+    ('temp_store', ('default', 'file', 'memory')),
+)
+
+
+# Named presets for our sqlite PRAGMAs. Individual settings in the config file take
+# precedence over their profile.
+SQLITE_PROFILES = {
+    # Leave everything to sqlite.
+    'default': {},
+    # Readers and a writer do not block each other. Concurrent writers wait instead of
+    # failing right away.
+    'concurrent': {
+        'busy_timeout': '5000',
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+    },
+    # Like 'concurrent' plus generous caches. 64MiB page cache and 256MiB mmap.
+    'fast': {
+        'busy_timeout': '5000',
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'cache_size': '-65536',
+        'mmap_size': '268435456',
+        'temp_store': 'memory',
+    },
+    # Maximum durability. Use this on filesystems that do not support WAL, e.g. network
+    # shares.
+    'safe': {
+        'busy_timeout': '5000',
+        'journal_mode': 'delete',
+        'synchronous': 'full',
+    },
+}
+
+
+# Index of ``facts.end``, created along with the store. Overlap checks depend on it.
+FACTS_END_INDEX = ('ix_facts_end', 'facts', ('end',))
+
+# Indexes ``db optimize`` makes sure of. Each entry is ``(name, table, columns)``.
+OPTIMIZE_INDEXES = (
+    ('ix_facts_start', 'facts', ('start',)),
+    FACTS_END_INDEX,
+    ('ix_facts_activity_id', 'facts', ('activity_id',)),
+    ('ix_activities_name_category_id', 'activities', ('name', 'category_id')),
+)
+
+# How datetimes are stored in our write-behind journal.
+JOURNAL_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Length of datetimes as stored by sqlite, see ``JOURNAL_DATETIME_FORMAT``.
+STORED_DATETIME_LENGTH = 26
+
+# Filename of the database we create by default.
+DEFAULT_DB_FILENAME = 'hamster_cli.sqlite'
+
+# Filename of an archive partition holding all archived facts of a given year.
+ARCHIVE_PARTITION_FILENAME = 'hamster_cli-{year}.sqlite'
+
+# Facts to be archived, along with the names of their activity and category. The
+# partition is attached as ``archive``.
+ARCHIVED_FACTS = (
+    'SELECT f.id, f.start, f."end", f.description, a.name AS activity,'
+    ' c.name AS category FROM main.facts f'
+    ' JOIN main.activities a ON a.id = f.activity_id'
+    ' LEFT JOIN main.categories c ON c.id = a.category_id'
+    ' WHERE f."end" <= :before AND f.start >= :first AND f.start < :next'
+)
+
+# Facts to be archived along with the key of their activity within the partition.
+ARCHIVED_FACTS_MAPPED = (
+    'SELECT s.id, s.start, s."end", s.description, aa.id AS activity_id'
+    ' FROM ({}) s LEFT JOIN archive.categories ac ON ac.name = s.category'
+    ' JOIN archive.activities aa ON aa.name = s.activity AND aa.category_id IS ac.id'
+).format(ARCHIVED_FACTS)
+
+# Statements moving facts from our sqlite database into an attached partition. Anything
+# the partition holds already is not copied again. The last one returns the number of
+# facts moved.
+ARCHIVE_STATEMENTS = (
+    'INSERT INTO archive.categories (name) SELECT DISTINCT s.category FROM ({}) s'
+    ' WHERE s.category IS NOT NULL'
+    ' AND s.category NOT IN (SELECT name FROM archive.categories)'.format(ARCHIVED_FACTS),
+    'INSERT INTO archive.activities (name, deleted, category_id)'
+    ' SELECT DISTINCT s.activity, 0, ac.id FROM ({}) s'
+    ' LEFT JOIN archive.categories ac ON ac.name = s.category WHERE NOT EXISTS ('
+    'SELECT 1 FROM archive.activities x WHERE x.name = s.activity'
+    ' AND x.category_id IS ac.id)'.format(ARCHIVED_FACTS),
+    'INSERT INTO archive.tags (name) SELECT DISTINCT t.name FROM main.facttags ft'
+    ' JOIN main.tags t ON t.id = ft.tag_id WHERE ft.fact_id IN (SELECT id FROM ({}))'
+    ' AND t.name NOT IN (SELECT name FROM archive.tags)'.format(ARCHIVED_FACTS),
+    'INSERT INTO archive.facts (start, "end", activity_id, description)'
+    ' SELECT s.start, s."end", s.activity_id, s.description FROM ({}) s'
+    ' WHERE NOT EXISTS (SELECT 1 FROM archive.facts x WHERE x.start = s.start'
+    ' AND x."end" = s."end" AND x.activity_id = s.activity_id)'.format(
+        ARCHIVED_FACTS_MAPPED),
+    'INSERT INTO archive.facttags (fact_id, tag_id) SELECT af.id, at.id FROM ({}) s'
+    ' JOIN main.facttags ft ON ft.fact_id = s.id JOIN main.tags t ON t.id = ft.tag_id'
+    ' JOIN archive.tags at ON at.name = t.name'
+    ' JOIN archive.facts af ON af.start = s.start AND af."end" = s."end"'
+    ' AND af.activity_id = s.activity_id WHERE NOT EXISTS (SELECT 1 FROM archive.facttags x'
+    ' WHERE x.fact_id = af.id AND x.tag_id = at.id)'.format(ARCHIVED_FACTS_MAPPED),
+    'DELETE FROM main.facttags WHERE fact_id IN (SELECT id FROM ({}))'.format(
+        ARCHIVED_FACTS),
+    'DELETE FROM main.facts WHERE id IN (SELECT id FROM ({}))'.format(ARCHIVED_FACTS),
+)
+
+# Number of days covered by the reference query timed by ``db optimize``.
+OPTIMIZE_REFERENCE_DAYS = 30
+
+# Widths, in days, of the time ranges ``bench`` runs ``list`` and ``search`` on.
+BENCH_RANGE_DAYS = (1, 7, 30, 365)
+
+# Latency percentiles reported by ``bench``.
+BENCH_PERCENTILES = (50, 95, 99)
+
+# Default minimum length of a gap in minutes reported by ``check``.
+CHECK_MIN_GAP = 15
+
+# Number of weeks ``heatmap`` shows if no time range is given.
+HEATMAP_DEFAULT_WEEKS = 52
+
+# Periods ``pivot`` can use as columns.
+PIVOT_PERIODS = ('day', 'week', 'month')
+
+# Summarizes a single database for ``fleet-report``. Facts are clipped to our timeframe
+# and grouped by the day, shifted by ``day_start``, and category they start on. Durations
+# are rounded to milliseconds to do away with the limited precision of ``julianday``.
+FLEET_REPORT_QUERY = """
+    SELECT date(max(facts.start, :start), :offset) AS day, categories.name, COUNT(*),
+        SUM(round((julianday(min(facts."end", :end)) - julianday(max(facts.start, :start)))
+            * 86400, 3)),
+        MIN(max(facts.start, :start)), MAX(min(facts."end", :end))
+    FROM facts
+    JOIN activities ON activities.id = facts.activity_id
+    LEFT OUTER JOIN categories ON categories.id = activities.category_id
+    WHERE facts.start <= :end AND facts."end" >= :start
+    GROUP BY day, categories.name
+"""
+
+# Sides ``sync`` may prefer when resolving conflicts.
+SYNC_PREFERENCES = ('local', 'other')
+
+# Number of rows fetched at once while streaming facts from the database.
+FACT_KEY_BATCH_SIZE = 1000
+
+# Number of duplicates ``dedupe`` removes per transaction. sqlite limits the number of
+# parameters of a statement to 999.
+DEDUPE_BATCH_SIZE = 500
+
+# Number of synthetic facts ``bench`` inserts per transaction.
+BENCH_INSERT_CHUNK_SIZE = 10000
+
+# Number of most recent slow queries ``details --queries`` considers. Once the slow
+# query log grows beyond ``SLOW_QUERY_LOG_MAX_SIZE`` bytes only those are kept.
+SLOW_QUERY_LOG_ENTRIES = 500
+SLOW_QUERY_LOG_MAX_SIZE = 512 * 1024
+
+# Number of statements listed by ``details --queries`` and the length they are cut to.
+SLOW_QUERY_SUMMARY_SIZE = 10
+SLOW_QUERY_SUMMARY_WIDTH = 80
+
+
 AppDirs = HamsterAppDirs('hamster_cli')
 
 
+# Suffixes of export paths that will be compressed on the fly.
+COMPRESSED_EXPORT_SUFFIXES = ('.gz', '.bz2', '.xz')
+
+# Number of bytes read from the export pipe at once.
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Directory holding a path for each open file descriptor, where there is one.
+DEV_FD_PATH = '/dev/fd'
+
+# Snapshot formats an in-memory database can be seeded from, by file suffix. A 'sqlite'
+# snapshot is just a database file, e.g. a copy of a regular hamster database. A 'csv'
+# snapshot is what ``export csv`` produces.
+SNAPSHOT_FORMATS = {'.sqlite': 'sqlite', '.db': 'sqlite', '.csv': 'csv', '.tsv': 'csv'}
+
+
 pass_controler = click.make_pass_decorator(Controler, ensure=True)
 
+# Background thread writing our logfile, see ``_setup_logging``.
+_log_listener = None
+
 
 @click.group(help=help_strings.RUN_HELP)
-@pass_controler
-def run(controler):
+@click.option('--profile', is_flag=True, help=_(
+    "Print how long each phase of the command took to stderr."))
+@click.option('--profile-stats', is_flag=True, help=_(
+    "Like '--profile' but also dump cProfile statistics to our cache directory."))
+@click.option('--memprofile', is_flag=True, help=_(
+    "Trace memory allocations and print peak memory, memory after each phase and the"
+    " top allocation sites to stderr."))
+@click.option('--memprofile-output', type=click.Path(dir_okay=False), default=None,
+    help=_("Write the '--memprofile' report to this file instead. Implies '--memprofile'."))
+@click.pass_context
+def run(ctx, profile, profile_stats, memprofile, memprofile_output):
     """General context run right before any of the commands."""
-    click.clear()
-    _show_greeting()
-    _run(controler)
+    profiler = None
+    if profile_stats:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    memory_profiler = None
+    if memprofile or memprofile_output:
+        if tracemalloc is None:
+            raise click.ClickException(_("'--memprofile' requires python 3.4 or later."))
+        memory_profiler = MemoryProfiler()
+        ctx.call_on_close(lambda: _report_memory(memory_profiler, memprofile_output))
+    timer = PhaseTimer()
+    with timer.phase('config'):
+        config = _get_config(_get_config_instance())
+    with timer.phase('controler'):
+        controler = ctx.obj = Controler(config)
+    controler.memory_profiler = memory_profiler
+    record_metrics = controler.client_config['metrics']
+    if profile or profile_stats or record_metrics:
+        controler.phase_timer = timer
+    if profile or profile_stats:
+        ctx.call_on_close(lambda: _report_profile(timer, profiler))
+    if record_metrics:
+        ctx.call_on_close(lambda: _record_metrics(controler, ctx.invoked_subcommand, timer))
+
+    # Keep stdout clean if it is not a terminal. Otherwise our greeting would end
+    # up in the middle of piped output such as ``export --output -``.
+    if sys.stdout.isatty():
+        click.clear()
+        _show_greeting()
+    with timer.phase('logging'):
+        _run(controler)
+    # Writing commands are supposed to return right away if we use a write-behind
+    # journal, so anything else takes care of applying it.
+    if ctx.invoked_subcommand not in ('start', 'stop', 'flush'):
+        with timer.phase('backend'):
+            _apply_journal_quietly(controler)
+    if controler.config.get('db_snapshot') and controler.config.get('db_snapshot_save'):
+        ctx.call_on_close(lambda: _save_snapshot(controler))
 
 
 def _run(controler):
     """Make sure that loggers are setup properly."""
     _setup_logging(controler)
+    _apply_slow_query_log(controler)
 
 
 @run.command(help=help_strings.SEARCH_HELP)
@@ -155,6 +694,7 @@ def search(controler, search_term, time_range):
     """Fetch facts matching certain criteria."""
     # [FIXME]
     # Check what we actually match against.
+    _use_replica(controler)
     _search(controler, search_term, time_range)
 
 
@@ -177,25 +717,16 @@ def _search(controler, search_term, time_range):
     # [FIXME]
     # As far as our backend is concerned search_term as well as time range are
     # optional. If the same is true for legacy hamster-cli needs to be checked.
-    if not time_range:
-        start, end = (None, None)
-    else:
-        # [FIXME]
-        # This is a rather crude fix. Recent versions of ``hamster-lib`` do not
-        # provide a dedicated helper to parse *just* time(ranges) but expect a
-        # ``raw_fact`` text. In order to work around this we just append
-        # whitespaces to our time range argument which will qualify for the
-        # desired parsing.
-        # Once raw_fact/time parsing has been refactored in hamster-lib, this
-        # should no longer be needed.
-        time_range = time_range + '  '
-        timeinfo = time_helpers.extract_time_info(time_range)[0]
-        start, end = time_helpers.complete_timeframe(timeinfo, controler.config)
+    start, end = _parse_time_range(controler, time_range)
 
-    results = controler.facts.get_all(filter_term=search_term, start=start, end=end)
+    with _profile_phase(controler, 'backend'):
+        results = _get_facts(controler, filter_term=search_term, start=start, end=end)
+    controler.result_count = len(results)
 
-    table, headers = _generate_facts_table(results)
-    click.echo(tabulate(table, headers=headers))
+    with _profile_phase(controler, 'table'):
+        table, headers = _generate_facts_table(results)
+    with _profile_phase(controler, 'render'):
+        click.echo(tabulate(table, headers=headers))
 
 
 @run.command(help=help_strings.LIST_HELP)
@@ -203,6 +734,7 @@ def _search(controler, search_term, time_range):
 @pass_controler
 def list(controler, time_range):
     """List all facts within a timerange."""
+    _use_replica(controler)
     _search(controler, search_term='', time_range=time_range)
 
 
@@ -293,7 +825,16 @@ def _start(controler, raw_fact, start, end):
     controler.client_logger.debug(_(
         "New fact instance created: {fact}".format(fact=fact)
     ))
-    fact = controler.facts.save(fact)
+    with _profile_phase(controler, 'backend'):
+        if not tmp_fact:
+            fact = _retry_on_locked(controler, _resolve_overlap, controler, fact)
+        if controler.client_config['write_behind'] and not tmp_fact:
+            _check_min_delta(controler, fact)
+            _journal_fact(controler, fact)
+            return
+        fact = _retry_on_locked(controler, controler.facts.save, fact,
+            applied=lambda: _get_stored_fact(controler, fact))
+        _record_local_write(controler)
 
 
 @run.command(help=help_strings.STOP_HELP)
@@ -313,18 +854,41 @@ def _stop(controler):
     Raises:
         ValueError: If no *ongoing fact* can be found.
     """
-    try:
-        fact = controler.facts.stop_tmp_fact()
-    except ValueError:
-        message = _(
-            "Unable to continue temporary fact. Are you sure there is one?"
-            "Try running *current*."
-        )
-        raise click.ClickException(message)
-    else:
-        message = '{fact} ({duration} minutes)'.format(fact=fact, duration=fact.get_string_delta())
-        controler.client_logger.info(_(message))
-        click.echo(_(message))
+    def already_stopped():
+        fact = _get_stored_fact(controler, ongoing_fact)
+        if fact:
+            # The fact has been saved, only removing the *ongoing fact* did not happen.
+            controler.facts.cancel_tmp_fact()
+        return fact
+
+    with _profile_phase(controler, 'backend'):
+        try:
+            ongoing_fact = controler.facts.get_tmp_fact()
+        except KeyError:
+            ongoing_fact = None
+
+        if controler.client_config['write_behind'] and ongoing_fact:
+            ongoing_fact.end = datetime.datetime.now()
+            # Run the checks ``save`` would run, our *ongoing fact* is gone once journaled.
+            _check_min_delta(controler, ongoing_fact)
+            fact = _retry_on_locked(controler, _resolve_overlap, controler, ongoing_fact)
+            _journal_fact(controler, fact)
+            controler.facts.cancel_tmp_fact()
+        else:
+            try:
+                fact = _retry_on_locked(controler, controler.facts.stop_tmp_fact,
+                    applied=already_stopped if ongoing_fact else None)
+            except ValueError:
+                message = _(
+                    "Unable to continue temporary fact. Are you sure there is one?"
+                    "Try running *current*."
+                )
+                raise click.ClickException(message)
+            _record_local_write(controler)
+
+    message = '{fact} ({duration} minutes)'.format(fact=fact, duration=fact.get_string_delta())
+    controler.client_logger.info(_(message))
+    click.echo(_(message))
 
 
 @run.command(help=help_strings.CANCEL_HELP)
@@ -345,7 +909,7 @@ def _cancel(controler):
         KeyErŕor: No *ongoing fact* can be found.
     """
     try:
-        controler.facts.cancel_tmp_fact()
+        _retry_on_locked(controler, controler.facts.cancel_tmp_fact)
     except KeyError:
         message = _("Nothing tracked right now. Not doing anything.")
         controler.client_logger.info(message)
@@ -356,32 +920,62 @@ def _cancel(controler):
         controler.client_logger.debug(message)
 
 
+@run.command(help=help_strings.FLUSH_HELP)
+@pass_controler
+def flush(controler):
+    """Apply all pending entries of the write-behind journal."""
+    _flush(controler)
+
+
+def _flush(controler):
+    """
+    Apply all pending entries of the write-behind journal to our store.
+
+    Returns:
+        None: If everything went alright.
+    """
+    applied, rejected = _apply_journal(controler)
+    click.echo(_("Applied {count} journal entries.".format(count=applied)))
+    if rejected:
+        raise click.ClickException(_(
+            "{count} journal entries could not be applied. They have been moved to:"
+            " {path}".format(count=rejected, path=_get_rejected_journal_path(controler))
+        ))
+
+
 @run.command(help=help_strings.EXPORT_HELP)
 @click.argument('format', nargs=1, default='csv')
 @click.argument('start', nargs=1, default='')
 @click.argument('end', nargs=1, default='')
+@click.option('-o', '--output', default='', help=_(
+    "Export to this path instead of the default location. Use '-' for stdout."))
 @pass_controler
-def export(controler, format, start, end):
+def export(controler, format, start, end, output):
     """Export all facts of within a given timewindow to a file of specified format."""
-    _export(controler, format, start, end)
+    _use_replica(controler)
+    _export(controler, format, start, end, output)
 
 
-def _export(controler, format, start, end):
+def _export(controler, format, start, end, output=None):
     """
     Export all facts in the given timeframe in the format specified.
 
     Args:
-        format (str): Format to export to. Valid options are: ``csv``, ``xml`` and ``ical``.
+        format (str): Format to export to. Valid options are: ``csv``, ``xml``, ``ical``,
+            ``parquet`` and ``arrow``. The latter two require ``pyarrow`` to be installed.
         start (datetime.datetime): Consider only facts starting at this time or later.
         end (datetime.datetime): Consider only facts starting no later than this time.
+        output (str, optional): Path to export to. ``-`` will write to stdout. If the path
+            ends in one of ``COMPRESSED_EXPORT_SUFFIXES`` the export will be compressed on
+            the fly. Defaults to ``client_config['export_path']``.
 
     Returns:
         None: If everything went alright.
 
     Raises:
-        click.Exception: If format is not recognized.
+        click.Exception: If format is not recognized or its requirements are not met.
     """
-    accepted_formats = ['csv', 'ical', 'xml']
+    accepted_formats = ['csv', 'ical', 'xml', 'parquet', 'arrow']
     # [TODO]
     # Once hamster_lib has a proper 'export' register available we should be able
     # to streamline this.
@@ -389,31 +983,115 @@ def _export(controler, format, start, end):
         message = _("Unrecocgnized export format recieved")
         controler.client_logger.info(message)
         raise click.ClickException(message)
+    if format in ('parquet', 'arrow'):
+        try:
+            columnar.import_pyarrow()
+        except ImportError as error:
+            controler.client_logger.info(error)
+            raise click.ClickException(str(error))
     if not start:
         start = None
     if not end:
         end = None
 
-    filepath = controler.client_config['export_path']
-    facts = controler.facts.get_all(start=start, end=end)
-    if format == 'csv':
-        writer = reports.TSVWriter(filepath)
-        writer.write_report(facts)
-        click.echo(_("Facts have been exported to: {path}".format(path=filepath)))
-    elif format == 'ical':
-        writer = reports.ICALWriter(filepath)
-        writer.write_report(facts)
-        click.echo(_("Facts have been exported to: {path}".format(path=filepath)))
-    elif format == 'xml':
-        writer = reports.XMLWriter(filepath)
-        writer.write_report(facts)
+    filepath = output or controler.client_config['export_path']
+    with _profile_phase(controler, 'backend'):
+        facts = _get_facts(controler, start=start, end=end)
+    controler.result_count = len(facts)
+    with _profile_phase(controler, 'export'), _export_target(filepath) as target:
+        if format == 'csv':
+            writer = reports.TSVWriter(target)
+        elif format == 'ical':
+            writer = reports.ICALWriter(target)
+        elif format == 'xml':
+            writer = reports.XMLWriter(target)
+        elif format == 'parquet':
+            writer = columnar.ParquetWriter(target)
+        elif format == 'arrow':
+            writer = columnar.ArrowWriter(target)
+        try:
+            writer.write_report(facts)
+        finally:
+            # ``write_report`` only closes the file if it succeeds. Export pipes wait
+            # for it to be closed either way.
+            writer.file.close()
+
+    if filepath != '-':
         click.echo(_("Facts have been exported to: {path}".format(path=filepath)))
 
 
+@run.command(help=help_strings.ARCHIVE_HELP)
+@click.option('--before', required=True, help=_(
+    "Archive all facts ending before this date. Format: YYYY-MM-DD."))
+@pass_controler
+def archive(controler, before):
+    """Move old facts into yearly archive partitions."""
+    _archive(controler, before)
+
+
+def _archive(controler, before):
+    """
+    Move all facts ending before ``before`` into yearly archive partitions.
+
+    Each partition is a sqlite database of its own, holding all archived facts that
+    start within a given year. If our main store is a sqlite database too, each
+    partition is filled and the facts are removed in a single transaction, see
+    ``_move_to_partition``. Otherwise facts are copied one by one first and only removed
+    from our main store afterwards, so an interrupted run can just be started again.
+
+    Args:
+        before (str): Date string (``YYYY-MM-DD``).
+
+    Returns:
+        None: If everything went alright.
+
+    Raises:
+        click.ClickException: If ``before`` is not a valid date.
+    """
+    try:
+        before = datetime.datetime.strptime(before, '%Y-%m-%d')
+    except ValueError:
+        raise click.ClickException(_("Unrecognized date. Please use 'YYYY-MM-DD'."))
+
+    is_sqlite = (controler.config['store'] == 'sqlalchemy' and controler.config.get(
+        'db_engine') == 'sqlite')
+    if is_sqlite:
+        years = _get_archive_years(controler, before)
+    else:
+        facts_by_year = {}
+        for fact in controler.facts.get_all(end=before):
+            facts_by_year.setdefault(fact.start.year, []).append(fact)
+        years = sorted(facts_by_year)
+    if not years:
+        click.echo(_("Nothing to archive."))
+        return
+
+    for year in years:
+        partition = _get_partition(controler, year)
+        if is_sqlite:
+            count = _move_to_partition(controler, partition, year, before)
+        else:
+            facts = facts_by_year[year]
+            for fact in facts:
+                fact_copy = _copy_fact(fact)
+                # We may have been interrupted after copying before.
+                if _get_stored_fact(partition, fact_copy) is None:
+                    partition.facts.save(fact_copy)
+            for fact in facts:
+                controler.facts.remove(fact)
+            count = len(facts)
+        message = _("Archived {count} facts into {path}.".format(
+            count=count, path=partition.config['db_path']))
+        controler.client_logger.info(message)
+        click.echo(message)
+    click.echo(_("You may want to run 'db optimize' to reclaim the freed space."))
+
+
 @run.command(help=help_strings.CATEGORIES_HELP)
 @pass_controler
 def categories(controler):
     """List all existing categories, ordered by name."""
+    _use_replica(controler)
     _categories(controler)
 
 
@@ -424,11 +1102,14 @@ def _categories(controler):
     Returns:
         None: If success.
     """
-    result = controler.categories.get_all()
+    with _profile_phase(controler, 'backend'):
+        result = controler.categories.get_all()
+    controler.result_count = len(result)
     # [TODO]
     # Provide nicer looking tabulated output.
-    for category in result:
-        click.echo(category.name)
+    with _profile_phase(controler, 'render'):
+        for category in result:
+            click.echo(category.name)
 
 
 @run.command(help=help_strings.CURRENT_HELP)
@@ -467,6 +1148,7 @@ def _current(controler):
 @pass_controler
 def activities(controler, search_term):
     """List all activities. Provide optional filtering by name."""
+    _use_replica(controler)
     _activities(controler, search_term)
 
 
@@ -480,159 +1162,1578 @@ def _activities(controler, search_term):
     Returns:
         None: If success.
     """
-    result = controler.activities.get_all(search_term=search_term)
-    table = []
-    headers = (_("Activity"), _("Category"))
-    for activity in result:
-        if activity.category:
-            category = activity.category.name
-        else:
-            category = None
-        table.append((activity.name, category))
+    with _profile_phase(controler, 'backend'):
+        result = controler.activities.get_all(search_term=search_term)
+    controler.result_count = len(result)
+    with _profile_phase(controler, 'render'):
+        table = []
+        headers = (_("Activity"), _("Category"))
+        for activity in result:
+            if activity.category:
+                category = activity.category.name
+            else:
+                category = None
+            table.append((activity.name, category))
 
-    click.echo(tabulate(table, headers=headers))
+        click.echo(tabulate(table, headers=headers))
 
 
-@run.command(help=help_strings.LICENSE_HELP)
-def license():
-    """Show license information."""
-    _license()
+@run.command(help=help_strings.CHECK_HELP)
+@click.argument('time_range', default='')
+@click.option('--min-gap', default=CHECK_MIN_GAP, type=click.IntRange(0), help=_(
+    "Only report gaps of at least this many minutes."))
+@click.option('--json', 'as_json', is_flag=True, help=_("Print the issues as JSON."))
+@pass_controler
+def check(controler, time_range, min_gap, as_json):
+    """Report overlapping facts and untracked gaps."""
+    _use_replica(controler)
+    if _check(controler, time_range, min_gap, as_json):
+        click.get_current_context().exit(1)
 
 
-def _license():
-    """Show license information."""
-    license = """
-        'hamster_cli' is free software: you can redistribute it and/or modify
-        it under the terms of the GNU General Public License as published by
-        the Free Software Foundation, either version 3 of the License, or
-        (at your option) any later version.
+def _check(controler, time_range, min_gap=CHECK_MIN_GAP, as_json=False):
+    """
+    Report overlapping facts and gaps of at least ``min_gap`` minutes within a day.
 
-        'hamster_cli' is distributed in the hope that it will be useful,
-        but WITHOUT ANY WARRANTY; without even the implied warranty of
-        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
-        GNU General Public License for more details.
+    Args:
+        time_range (str): Only facts within this timerange will be considered.
+        min_gap (int): Minimum length of a gap in minutes to be reported.
+        as_json (bool): Print the issues as JSON instead of a table.
 
-        You should have received a copy of the GNU General Public License
-        along with .  If not, see <http://www.gnu.org/licenses/>.
-        """
-    click.echo(license)
+    Returns:
+        list: Issues found, as returned by ``_find_timesheet_issues``.
+    """
+    start, end = _parse_time_range(controler, time_range)
+    with _profile_phase(controler, 'backend'):
+        facts = _get_facts(controler, start=start, end=end)
+    with _profile_phase(controler, 'check'):
+        issues = _find_timesheet_issues(facts, datetime.timedelta(minutes=min_gap),
+            controler.config['day_start'])
+    controler.result_count = len(issues)
+
+    with _profile_phase(controler, 'render'):
+        if as_json:
+            click.echo(json.dumps([dict(issue, start=issue['start'].isoformat(),
+                end=issue['end'].isoformat(), facts=[_serialize_fact(fact) for fact in
+                issue['facts']]) for issue in issues], indent=2))
+        else:
+            table = []
+            for issue in issues:
+                table.append((issue['type'], issue['start'], issue['end'],
+                    issue['minutes'], ', '.join('{}@{} ({})'.format(fact.activity.name,
+                        fact.category.name if fact.category else '', fact.start)
+                        for fact in issue['facts'])))
+            click.echo(tabulate(table, headers=(_("Issue"), _("Start"), _("End"),
+                _("Minutes"), _("Facts")), floatfmt='.1f'))
+    return issues
+
+
+def _find_timesheet_issues(facts, min_gap, day_start):
+    """
+    Find overlapping facts and gaps between facts in one sweep over their start times.
 
+    Facts are sorted once and we keep track of the fact reaching furthest so far. Any
+    fact starting before that one ends overlaps it. Otherwise the time in between is a
+    gap. Gaps are only reported if they are at least ``min_gap`` long and do not cross
+    the beginning of a day, as defined by ``day_start``. That way nights and weekends
+    do not count as untracked time.
 
-@run.command(help=help_strings.DETAILS_HELP)
+    Args:
+        facts (iterable): Facts to check. Facts without an end are ignored.
+        min_gap (datetime.timedelta): Minimum length of a gap to be reported.
+        day_start (datetime.time): Time a new day starts at.
+
+    Returns:
+        list: Issues ordered by their start. Each is a ``dict`` with its ``type``
+            (``'overlap'`` or ``'gap'``), ``start``, ``end``, length in ``minutes`` and
+            the two ``facts`` involved.
+    """
+    offset = datetime.timedelta(hours=day_start.hour, minutes=day_start.minute,
+        seconds=day_start.second)
+    epsilon = datetime.timedelta(microseconds=1)
+    facts = sorted((fact for fact in facts if fact.end), key=lambda fact: (fact.start,
+        fact.end))
+
+    def get_issue(kind, start, end, first, second):
+        return {'type': kind, 'start': start, 'end': end,
+            'minutes': (end - start).total_seconds() / 60, 'facts': [first, second]}
+
+    issues = []
+    furthest = None
+    for fact in facts:
+        if furthest is None:
+            pass
+        elif fact.start < furthest.end:
+            issues.append(get_issue('overlap', fact.start, min(fact.end, furthest.end),
+                furthest, fact))
+        elif fact.start - furthest.end >= max(min_gap, epsilon) and (
+                (furthest.end - offset - epsilon).date() == (fact.start - offset).date()):
+            issues.append(get_issue('gap', furthest.end, fact.start, furthest, fact))
+        if furthest is None or fact.end > furthest.end:
+            furthest = fact
+    return issues
+
+
+@run.command('heatmap', help=help_strings.HEATMAP_HELP)
+@click.argument('time_range', default='')
+@click.option('--hours', is_flag=True, help=_(
+    "Show how tracked time is spread across the hours of the week as well."))
 @pass_controler
-def details(controler):
-    """List details about the runtime environment."""
-    _details(controler)
+def heatmap_(controler, time_range, hours):
+    """Show a calendar of hours tracked per day."""
+    # The trailing underscore keeps our ``heatmap`` module accessible.
+    _use_replica(controler)
+    _heatmap(controler, time_range, hours)
 
 
-def _details(controler):
-    """List details about the runtime environment."""
-    def get_db_info():
-        result = None
+def _heatmap(controler, time_range, hours=False):
+    """
+    Show a calendar of hours tracked per day, optionally followed by hours per hour of week.
 
-        def get_sqlalchemy_info():
-            engine = controler.config['db_engine']
-            if engine == 'sqlite':
-                sqlalchemy_string = _("Using 'sqlite' with database stored under: {}".format(
-                    controler.config['db_path']))
-            else:
-                port = controler.config.get('db_port', '')
-                if port:
-                    port = ':{}'.format(port)
+    Args:
+        time_range (str): Only time tracked within this timerange will be considered.
+            Defaults to the last 52 weeks.
+        hours (bool): Show the hour of week density as well.
 
-                sqlalchemy_string = _(
-                    "Using '{engine}' connecting to database {name} on {host}{port}"
-                    " as user {username}.".format(
-                        engine=engine, host=controler.config['db_host'], port=port,
-                        username=controler.config['db_user'], name=controler.config['db_name'])
-                )
-            return sqlalchemy_string
+    Returns:
+        None: If everything went alright.
+    """
+    try:
+        np = heatmap.import_numpy()
+    except ImportError as error:
+        raise click.ClickException(str(error))
+
+    start, end = _parse_time_range(controler, time_range)
+    if end is None:
+        end = datetime.datetime.now()
+    if start is None:
+        start = end - datetime.timedelta(weeks=HEATMAP_DEFAULT_WEEKS)
+
+    with _profile_phase(controler, 'backend'):
+        intervals = _get_fact_intervals(controler, start, end)
+    controler.result_count = len(intervals)
+
+    with _profile_phase(controler, 'heatmap'):
+        if intervals:
+            starts, ends = heatmap.to_seconds(intervals).T
+        else:
+            starts = ends = np.zeros(0, dtype='int64')
+        day_start = controler.config['day_start']
+        offset = datetime.timedelta(hours=day_start.hour, minutes=day_start.minute,
+            seconds=day_start.second)
+        first_day = (start - offset).date()
+        daily = heatmap.get_daily_hours(starts, ends, first_day, (end - offset).date(),
+            day_start)
+        if hours:
+            hourly = heatmap.get_hour_of_week_hours(starts, ends, start, end)
+
+    with _profile_phase(controler, 'render'):
+        click.echo(heatmap.render_calendar(first_day, daily))
+        if hours:
+            click.echo('')
+            click.echo(heatmap.render_hour_of_week(hourly))
+
+
+@run.command(help=help_strings.PIVOT_HELP)
+@click.argument('time_range', default='')
+@click.option('--rows', type=click.Choice(['activity', 'category']), default='activity',
+    help=_("What each row stands for."))
+@click.option('--cols', type=click.Choice(PIVOT_PERIODS), default='week', help=_(
+    "Period each column stands for."))
+@click.option('--csv', 'as_csv', is_flag=True, help=_("Print the matrix as CSV."))
+@pass_controler
+def pivot(controler, time_range, rows, cols, as_csv):
+    """Show hours tracked per activity or category and period."""
+    _use_replica(controler)
+    _pivot(controler, time_range, rows, cols, as_csv)
 
-        # For now we do not need to check for various store option as we allow
-        # only one anyway.
-        result = get_sqlalchemy_info()
-        return result
 
-    from hamster_cli import __version__, __appname__
-    click.echo(_("You are running {name} version {version}.".format(
-        name=__appname__, version=__version__)))
-    click.echo("Configuration found under: {}.".format(_get_config_path()))
-    click.echo("Logfile stored under: {}.".format(controler.client_config['logfile_path']))
-    click.echo("Reports exported to: {}.".format(controler.client_config['export_path']))
-    click.echo(get_db_info())
+def _pivot(controler, time_range, rows='activity', cols='week', as_csv=False):
+    """
+    Show a matrix of hours tracked per activity or category and day, week or month.
 
+    Args:
+        time_range (str): Only time tracked within this timerange will be considered.
+        rows (str): ``'activity'`` or ``'category'``.
+        cols (str): One of ``PIVOT_PERIODS``.
+        as_csv (bool): Print the matrix as CSV instead of a table.
 
-# Helper functions
-def _setup_logging(controler):
-    """Setup logging for the lib_logger as well as client specific logging."""
-    formatter = logging.Formatter(
-        '[%(levelname)s] %(asctime)s %(name)s %(funcName)s:  %(message)s')
+    Returns:
+        None: If everything went alright.
+    """
+    start, end = _parse_time_range(controler, time_range)
+    with _profile_phase(controler, 'backend'):
+        intervals = _get_fact_intervals(controler, start, end, names=True)
+    controler.result_count = len(intervals)
+
+    with _profile_phase(controler, 'pivot'):
+        totals = _get_pivot_totals(controler, intervals, rows, cols, start, end)
+        labels = sorted(set(label for label, period in totals))
+        periods = sorted(set(period for label, period in totals))
+        headers = [_("Activity") if rows == 'activity' else _("Category")]
+        headers += [_format_period(period, cols) for period in periods] + [_("Total")]
+
+        def get_rows():
+            column_totals = [0.0] * (len(periods) + 1)
+            for label in labels:
+                hours = [totals.get((label, period), 0) / 3600 for period in periods]
+                hours.append(sum(hours))
+                column_totals = [total + value for total, value in zip(column_totals, hours)]
+                yield [label] + hours
+            yield [_("Total")] + column_totals
+
+    with _profile_phase(controler, 'render'):
+        if as_csv:
+            writer = csv.writer(click.get_text_stream('stdout'))
+            writer.writerow(headers)
+            for row in get_rows():
+                writer.writerow(row[:1] + ['{:.2f}'.format(value) for value in row[1:]])
+        else:
+            click.echo(tabulate(get_rows(), headers=headers, floatfmt='.2f'))
 
-    lib_logger = controler.lib_logger
-    client_logger = logging.getLogger('hamster_cli')
-    # Clear any existing (null)Handlers
-    lib_logger.handlers = []
-    client_logger.handlers = []
-    client_logger.setLevel(controler.client_config['log_level'])
-    lib_logger.setLevel(controler.client_config['log_level'])
-    controler.client_logger = client_logger
 
-    if controler.client_config['log_console']:
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        lib_logger.addHandler(console_handler)
-        client_logger.addHandler(console_handler)
+def _get_pivot_totals(controler, intervals, rows, cols, start=None, end=None):
+    """
+    Return the seconds tracked per row label and period in a single pass over ``intervals``.
 
-    if controler.client_config['logfile_path']:
-        filename = controler.client_config['logfile_path']
-        file_handler = logging.FileHandler(filename, encoding='utf-8')
-        file_handler.setFormatter(formatter)
-        lib_logger.addHandler(file_handler)
-        client_logger.addHandler(file_handler)
+    Facts are split wherever they cross into the next period. Periods begin at
+    ``day_start`` and weeks on mondays.
 
+    Args:
+        intervals (list): ``(start, end, activity, category)`` as returned by
+            ``_get_fact_intervals``.
+        rows (str): ``'activity'`` or ``'category'``.
+        cols (str): One of ``PIVOT_PERIODS``.
+        start (datetime.datetime, optional): Time before this is not counted.
+        end (datetime.datetime, optional): Time after this is not counted.
 
-def _get_config(config_instance):
+    Returns:
+        dict: Seconds by ``(label, first day of period)``.
     """
-    Rertrieve config dictionaries for backend and client setup.
+    day_start = controler.config['day_start']
+    offset = datetime.timedelta(hours=day_start.hour, minutes=day_start.minute,
+        seconds=day_start.second)
+    unsorted = controler.client_config['unsorted_localized']
+
+    def get_period(day):
+        if cols == 'week':
+            return day - datetime.timedelta(days=day.weekday())
+        if cols == 'month':
+            return day.replace(day=1)
+        return day
+
+    def get_next_period(period):
+        if cols == 'week':
+            return period + datetime.timedelta(days=7)
+        if cols == 'month':
+            return (period.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        return period + datetime.timedelta(days=1)
+
+    # Most facts start on a day we have seen before.
+    periods = {}
+
+    def get_period_and_boundary(day):
+        if day not in periods:
+            period = get_period(day)
+            periods[day] = (period, datetime.datetime.combine(get_next_period(period),
+                datetime.time(0, 0)) + offset)
+        return periods[day]
+
+    totals = {}
+    for fact_start, fact_end, activity, category in intervals:
+        fact_start, fact_end = _to_datetime(fact_start), _to_datetime(fact_end)
+        if start and fact_start < start:
+            fact_start = start
+        if end and fact_end > end:
+            fact_end = end
+        if rows == 'activity':
+            label = '{}@{}'.format(activity, category) if category else activity
+        else:
+            label = category or unsorted
+        while fact_start < fact_end:
+            period, boundary = get_period_and_boundary((fact_start - offset).date())
+            split = min(fact_end, boundary)
+            key = (label, period)
+            totals[key] = totals.get(key, 0) + (split - fact_start).total_seconds()
+            fact_start = split
+    return totals
+
+
+def _format_period(period, cols):
+    """Return the label of the period starting on ``period``."""
+    if cols == 'week':
+        year, week, weekday = period.isocalendar()
+        return '{}-W{:02d}'.format(year, week)
+    if cols == 'month':
+        return period.strftime('%Y-%m')
+    return period.strftime('%Y-%m-%d')
+
+
+@run.command(help=help_strings.FLEET_REPORT_HELP)
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.argument('time_range', default='')
+@click.option('--jobs', default=0, type=click.IntRange(0), help=_(
+    "Number of worker processes. Defaults to one per CPU."))
+@click.option('--json', 'as_json', is_flag=True, help=_("Print the report as JSON."))
+@pass_controler
+def fleet_report(controler, directory, time_range, jobs, as_json):
+    """Summarize the databases of a whole team."""
+    _fleet_report(controler, directory, time_range, jobs, as_json)
 
-    Raises:
-        ValueError: Raised if we fail to process the user supplied config information.
-            Please note that there will be no log entry as at this point, logging has not
-            been set up yet.
 
-    Returns:
-        tuple: ``backend_config, client_config)`` tuple, where each element is a
-            dictionary storing relevant config data.
+def _fleet_report(controler, directory, time_range='', jobs=0, as_json=False):
     """
-    # [TODO]
-    # We propably can make better use of configparsers default config optionn,
-    # but for now this will do.
+    Summarize each sqlite database below ``directory`` and print one merged report.
 
-    def get_client_config(config):
-        """
-        Process client section of provided config and turn it into proper config dictionary.
+    Each database is opened read-only and summarized by a single grouped query in a
+    pool of worker processes, so the wall time depends on the number of CPUs rather
+    than the number of users.
 
-        Make sure config values are of proper type and provide basic
-        sanity checks (e.g. make sure we got a filename if we want to log to
-        file and such..).
+    Args:
+        directory (str): Directory to search for databases.
+        time_range (str): Only time tracked within this timerange will be considered.
+        jobs (int): Number of worker processes. ``0`` means one per CPU.
+        as_json (bool): Print the report as JSON instead of tables.
 
-        Not all key/values returned here need to be user configurable!
+    Returns:
+        list: Summary of each database, as returned by ``_summarize_database``.
+    """
+    paths = _get_fleet_databases(directory)
+    if not paths:
+        raise click.ClickException(_("No databases found in {}.".format(directory)))
+    start, end = _parse_time_range(controler, time_range)
+    day_start = controler.config['day_start']
+    offset = '-{} seconds'.format(
+        (day_start.hour * 60 + day_start.minute) * 60 + day_start.second)
+    tasks = [(user, path, start, end, offset) for user, path in paths]
+    jobs = min(jobs or multiprocessing.cpu_count(), len(tasks))
+
+    with _profile_phase(controler, 'backend'):
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs)
+            try:
+                summaries = pool.map(_summarize_database, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            summaries = [_summarize_database(task) for task in tasks]
+    controler.result_count = len(summaries)
+
+    with _profile_phase(controler, 'render'):
+        for summary in summaries:
+            if summary['error']:
+                click.echo(_("Skipped {user} ({path}): {error}".format(**summary)), err=True)
+        summaries = [summary for summary in summaries if not summary['error']]
+        if as_json:
+            click.echo(json.dumps(summaries, indent=2, sort_keys=True))
+            return summaries
+
+        table = []
+        categories = {}
+        for summary in summaries:
+            table.append((summary['user'], summary['facts'], summary['days'],
+                summary['seconds'] / 3600, summary['first'] and summary['first'][:16],
+                summary['last'] and summary['last'][:16]))
+            for category, seconds in summary['categories'].items():
+                users, total = categories.get(category, (0, 0))
+                categories[category] = (users + 1, total + seconds)
+        table.append((_("Total"), sum(summary['facts'] for summary in summaries),
+            sum(summary['days'] for summary in summaries),
+            sum(summary['seconds'] for summary in summaries) / 3600, None, None))
+        click.echo(tabulate(table, headers=(_("User"), _("Facts"), _("Days"), _("Hours"),
+            _("First"), _("Last")), floatfmt='.2f'))
+        click.echo('')
+        unsorted = controler.client_config['unsorted_localized']
+        table = sorted(((category or unsorted, users, seconds / 3600) for
+            category, (users, seconds) in categories.items()), key=lambda row: -row[2])
+        click.echo(tabulate(table, headers=(_("Category"), _("Users"), _("Hours")),
+            floatfmt='.2f'))
+    return summaries
+
+
+def _get_fleet_databases(directory):
+    """
+    Return ``(user, path)`` of each sqlite database below ``directory``, sorted by user.
 
-        It is worth noting that this is where we turn our user provided config information
-        into the actual dictionaries to be consumed by our backend and client objects.
-        A particular consequence is that the division of "Client/Backend" in the config
-        file is purely cosmetic. Another consequence is that not all user provided config
-        information has to be processed at all. We just take what we need and can safely
-        ignore the rest. That way we can improve the config file layout without having to
-        adjust our code all the time. It also means our main code does not have to deal with
-        turning ``path`` plus ``name`` into a full location and such.
-        """
-        def get_logfile_path():
-            log_dir = AppDirs.user_log_dir
-            return os.path.join(log_dir, config.get('Client', 'log_filename'))
+    Users are named after their database. Databases using our default filename are
+    named after the directory they are in instead.
+    """
+    paths = []
+    for root, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() not in ('.sqlite', '.db'):
+                continue
+            path = os.path.join(root, filename)
+            if filename == DEFAULT_DB_FILENAME and root != directory:
+                user = os.path.relpath(root, directory)
+            else:
+                user = os.path.splitext(os.path.relpath(path, directory))[0]
+            paths.append((user, path))
+    return sorted(paths)
 
-        def get_log_level():
-            try:
+
+def _summarize_database(task):
+    """
+    Return the summary of a single database. Run by our worker processes.
+
+    Args:
+        task (tuple): ``(user, path, start, end, offset)``. ``start`` and ``end`` may be
+            ``None``, ``offset`` is a sqlite date modifier moving times back by
+            ``day_start``.
+
+    Returns:
+        dict: The ``user``, ``path``, number of ``facts``, distinct ``days`` and
+            ``seconds`` tracked, the ``first`` and ``last`` time tracked, the seconds
+            tracked per category in ``categories`` and an ``error`` message if the
+            database could not be read.
+    """
+    user, path, start, end, offset = task
+    summary = {'user': user, 'path': path, 'facts': 0, 'days': 0, 'seconds': 0.0,
+        'first': None, 'last': None, 'categories': {}, 'error': None}
+    # Dates are stored as text, so comparing them to these bounds clips facts to our
+    # timeframe without any special case for open ones.
+    start = start.strftime(JOURNAL_DATETIME_FORMAT) if start else '0001-01-01'
+    end = end.strftime(JOURNAL_DATETIME_FORMAT) if end else '9999-12-31'
+    try:
+        try:
+            connection = sqlite3.connect('file:{}?mode=ro'.format(
+                pathname2url(os.path.abspath(path))), uri=True)
+        except TypeError:
+            # Opening databases by URI is only supported from python 3.4 onwards.
+            connection = sqlite3.connect(path)
+            connection.execute('PRAGMA query_only = ON')
+        try:
+            rows = connection.execute(FLEET_REPORT_QUERY, {'start': start, 'end': end,
+                'offset': offset}).fetchall()
+        finally:
+            connection.close()
+    except sqlite3.Error as error:
+        summary['error'] = str(error)
+        return summary
+
+    days = set()
+    for day, category, count, seconds, first, last in rows:
+        days.add(day)
+        summary['facts'] += count
+        summary['seconds'] += seconds
+        summary['categories'][category] = summary['categories'].get(category, 0) + seconds
+        summary['first'] = min(first, summary['first'] or first)
+        summary['last'] = max(last, summary['last'] or last)
+    summary['days'] = len(days)
+    return summary
+
+
+@run.command(help=help_strings.SYNC_HELP)
+@click.argument('other_db_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--prefer', type=click.Choice(SYNC_PREFERENCES), help=_(
+    "Resolve conflicts by keeping the facts of this side."))
+@click.option('--dry-run', is_flag=True, help=_("Only show what would be transferred."))
+@pass_controler
+def sync(controler, other_db_path, prefer, dry_run):
+    """Exchange facts with another database."""
+    if _sync(controler, other_db_path, prefer, dry_run)['conflicts']:
+        click.get_current_context().exit(1)
+
+
+def _sync(controler, other_db_path, prefer=None, dry_run=False):
+    """
+    Make sure our store and the sqlite database at ``other_db_path`` hold the same facts.
+
+    Rather than comparing all facts, we compare content hashes of each year. Only for
+    years that differ we compare their months and only for those months their days.
+    Facts are just loaded for days that differ. Facts present on one side only are
+    copied to the other, unless they conflict with a fact present only on the other side.
+    Conflicts are either reported or, if ``prefer`` is given, resolved by replacing the
+    facts of the other side. Either way the outcome does not depend on which side we
+    are on or the order facts are processed in. Identical facts are only copied once.
+
+    Before writing anything we make sure none of the facts we copy would overlap a fact
+    it is not meant to replace. That may only happen if one side holds overlapping facts
+    already, in which case we refuse to sync rather than leave it half done.
+
+    Args:
+        other_db_path (str): Path of the other database.
+        prefer (str, optional): ``'local'`` or ``'other'``. The side whose facts win
+            conflicts.
+        dry_run (bool): Only report what would be done.
+
+    Returns:
+        dict: The facts ``copied`` to and ``removed`` from each side, by ``'local'`` and
+            ``'other'``, and the ``conflicts`` left, as ``(local, other)`` tuples.
+
+    Raises:
+        click.ClickException: If ``other_db_path`` is our own database or facts to copy
+            would overlap stored facts.
+    """
+    db_path = controler.config['db_path']
+    is_sqlite = controler.config.get('db_engine') == 'sqlite' and db_path != ':memory:'
+    if is_sqlite and os.path.realpath(db_path) == os.path.realpath(other_db_path):
+        raise click.ClickException(_("Refusing to sync the database with itself."))
+    other = _get_sync_partner(controler, other_db_path)
+
+    with _profile_phase(controler, 'backend'):
+        local_tree = _get_hash_tree(_get_day_hashes(controler))
+        other_tree = _get_hash_tree(_get_day_hashes(other))
+        days = _get_differing_days(local_tree, other_tree)
+        local_facts = _get_facts_starting_on(controler, days)
+        other_facts = _get_facts_starting_on(other, days)
+        result = _plan_sync(local_facts, other_facts, prefer)
+        blocked = (_get_blocked_copies(other, result['copied']['other'],
+            result['removed']['other']) + _get_blocked_copies(controler,
+            result['copied']['local'], result['removed']['local']))
+    controler.result_count = len(days)
+    if blocked:
+        raise click.ClickException(_(
+            "Nothing has been synced, as some facts would overlap facts of the other"
+            " database: {facts}. Use 'check' to find overlapping facts.".format(
+                facts=', '.join('{} overlaps {}'.format(*pair) for pair in blocked))))
+
+    click.echo(_("{count} of {total} days differ.".format(count=len(days),
+        total=len(set(_get_tree_days(local_tree)) | set(_get_tree_days(other_tree))))))
+    for target, control, name in (('other', other, other_db_path), ('local', controler,
+            controler.config['db_path'])):
+        removed, copied = result['removed'][target], result['copied'][target]
+        if not (removed or copied):
+            continue
+        click.echo(_("{verb} {copied} facts to and removing {removed} from {name}.".format(
+            verb=_("Would be copying") if dry_run else _("Copying"), copied=len(copied),
+            removed=len(removed), name=name)))
+        if dry_run:
+            continue
+        for fact in removed:
+            control.facts.remove(fact)
+        for fact in copied:
+            control.facts.save(_copy_fact(fact))
+        if control is controler:
+            _record_local_write(controler)
+    for local, remote in result['conflicts']:
+        click.echo(_("Conflict: {local} overlaps {other}".format(local=local, other=remote)),
+            err=True)
+    if result['conflicts']:
+        click.echo(_("Use '--prefer' to resolve {count} conflicts.".format(
+            count=len(result['conflicts']))), err=True)
+    return result
+
+
+def _get_sync_partner(controler, path):
+    """Return a ``HamsterControl`` for the sqlite database at ``path``, see ``_sync``."""
+    config = dict(controler.config)
+    config.update({'store': 'sqlalchemy', 'db_engine': 'sqlite', 'db_path': path,
+        'db_snapshot': None})
+    return HamsterControl(config)
+
+
+def _get_fact_key(start, end, activity, category, description, tags):
+    """
+    Return a normalized tuple identifying a fact by its content rather than its key.
+
+    Two facts with the same key are considered the same fact, no matter which store they
+    come from. Dates may be given as ``datetime`` or as stored by sqlite.
+    """
+    return (_format_stored_datetime(start), _format_stored_datetime(end), activity,
+        category or '', (description or '').strip(), tuple(sorted(tags)))
+
+
+def _format_stored_datetime(value):
+    """
+    Return ``value`` as returned by ``_get_fact_intervals`` in ``JOURNAL_DATETIME_FORMAT``.
+
+    That is what sqlite stores already, so most values are passed as they are, which
+    saves us parsing and formatting each of them.
+    """
+    if not isinstance(value, datetime.datetime) and len(value) == STORED_DATETIME_LENGTH:
+        return value
+    return _to_datetime(value).strftime(JOURNAL_DATETIME_FORMAT)
+
+
+def _get_fact_key_of(fact):
+    """Return the key of the ``Fact`` instance ``fact``, see ``_get_fact_key``."""
+    return _get_fact_key(fact.start, fact.end, fact.activity.name,
+        fact.category.name if fact.category else None, fact.description,
+        [getattr(tag, 'name', tag) for tag in fact.tags])
+
+
+def _iter_fact_keys(control, start=None, end=None):
+    """
+    Yield ``(pk, key)`` of each fact starting within ``start`` to ``end``, by start.
+
+    For ``sqlalchemy`` stores rows are streamed straight from the database driver
+    without creating any ``Fact`` instances, see ``_get_fact_intervals``. Tags are read
+    upfront with a query of their own.
+
+    Args:
+        start (datetime.datetime, optional): Start of our timeframe. Open if ``None``.
+        end (datetime.datetime, optional): End of our timeframe. Open if ``None``.
+    """
+    if control.config['store'] != 'sqlalchemy':
+        for fact in sorted(control.facts._get_all(start, end, partial=True),
+                key=lambda fact: fact.start):
+            if (start is None or fact.start >= start) and (end is None or fact.start <= end):
+                yield fact.pk, _get_fact_key_of(fact)
+        return
+
+    facts, tags = alchemy_objects.facts, alchemy_objects.tags
+    activities, categories = alchemy_objects.activities, alchemy_objects.categories
+    fact_tags = {}
+    result = control.store.session.execute(select([alchemy_objects.facttags.c.fact_id,
+        tags.c.name]).select_from(alchemy_objects.facttags.join(tags)))
+    for fact_id, name in result.cursor.fetchall():
+        fact_tags.setdefault(fact_id, []).append(name)
+    result.close()
+
+    query = select([facts.c.id, facts.c.start, facts.c.end, activities.c.name,
+        categories.c.name, facts.c.description]).select_from(
+        facts.join(activities).outerjoin(categories)).order_by(facts.c.start)
+    if start:
+        query = query.where(facts.c.start >= start)
+    if end:
+        query = query.where(facts.c.start <= end)
+    result = control.store.session.execute(query)
+    try:
+        while True:
+            rows = result.cursor.fetchmany(FACT_KEY_BATCH_SIZE)
+            if not rows:
+                break
+            for pk, fact_start, fact_end, activity, category, description in rows:
+                yield pk, _get_fact_key(fact_start, fact_end, activity, category,
+                    description, fact_tags.get(pk, ()))
+    finally:
+        result.close()
+
+
+def _get_day_hashes(control):
+    """Return a content hash of all facts starting on each day by ``YYYY-MM-DD``."""
+    keys_by_day = {}
+    for pk, key in _iter_fact_keys(control):
+        keys_by_day.setdefault(key[0][:10], []).append(key)
+    hashes = {}
+    for day, keys in keys_by_day.items():
+        # Facts may start at the same time, so we do not rely on the order of our query.
+        # Duplicates are ignored, ``sync`` copies them just once anyway.
+        digest = hashlib.sha1()
+        for key in sorted(set(keys)):
+            digest.update('\x1f'.join(key[:5] + key[5] + ('\x1e',)).encode('utf-8'))
+        hashes[day] = digest.hexdigest()
+    return hashes
+
+
+def _get_hash_tree(day_hashes):
+    """
+    Return ``day_hashes`` as tree by year, month and day.
+
+    Each year and month is represented by a ``(hash, children)`` tuple. Its hash covers
+    the hashes of all its children, so two years with the same hash hold the same facts.
+
+    Returns:
+        dict: ``(hash, months)`` by ``YYYY``, with ``(hash, days)`` by ``YYYY-MM`` and the
+            hash of each day by ``YYYY-MM-DD``.
+    """
+    def get_level(hashes, length):
+        children = {}
+        for key, value in hashes.items():
+            children.setdefault(key[:length], {})[key] = value
+        return dict((key, (_hash_children(values), values)) for key, values in
+            children.items())
+
+    months = get_level(day_hashes, 7)
+    return get_level(months, 4)
+
+
+def _hash_children(children):
+    """Return the hash of a node of our hash tree, given its children."""
+    digest = hashlib.sha1()
+    for key, value in sorted(children.items()):
+        if isinstance(value, tuple):
+            value = value[0]
+        digest.update('{} {}\n'.format(key, value).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _get_tree_days(tree):
+    """Return all days of a tree returned by ``_get_hash_tree``."""
+    return [day for year, months in tree.values() for month, days in months.values()
+        for day in days]
+
+
+def _get_differing_days(tree, other):
+    """
+    Return the days whose facts differ between two trees returned by ``_get_hash_tree``.
+
+    We only descend into years and months whose hashes differ.
+
+    Returns:
+        list: Differing days as ``datetime.date``, in ascending order.
+    """
+    empty = (None, {})
+    days = []
+    for year in sorted(set(tree) | set(other)):
+        (year_hash, months), (other_hash, other_months) = (tree.get(year, empty),
+            other.get(year, empty))
+        if year_hash == other_hash:
+            continue
+        for month in sorted(set(months) | set(other_months)):
+            (month_hash, hashes), (other_hash, other_hashes) = (months.get(month, empty),
+                other_months.get(month, empty))
+            if month_hash == other_hash:
+                continue
+            days.extend(day for day in sorted(set(hashes) | set(other_hashes))
+                if hashes.get(day) != other_hashes.get(day))
+    return [datetime.datetime.strptime(day, '%Y-%m-%d').date() for day in days]
+
+
+def _get_facts_starting_on(control, days):
+    """Return all facts starting on any of ``days``, ordered by start."""
+    facts = []
+    for day in days:
+        start = datetime.datetime.combine(day, datetime.time.min)
+        end = start + datetime.timedelta(days=1)
+        facts.extend(fact for fact in _get_overlapping_facts(control, start, end)
+            if start <= fact.start < end)
+    return facts
+
+
+def _plan_sync(local_facts, other_facts, prefer=None):
+    """
+    Decide which facts ``_sync`` copies and removes on either side.
+
+    Facts present on both sides are left alone. Facts present on one side only conflict
+    with those present on the other side only they overlap. Anything else they overlap
+    is caught by ``_get_blocked_copies``.
+
+    Args:
+        local_facts (list): Our facts of all days that differ.
+        other_facts (list): Facts of the other side on the same days.
+        prefer (str, optional): ``'local'`` or ``'other'``, see ``_sync``.
+
+    Returns:
+        dict: See ``_sync``.
+    """
+    def get_unique(facts):
+        # Duplicates (see ``dedupe``) are only copied once. We keep the first of them.
+        unique = {}
+        for fact in facts:
+            unique.setdefault(_get_fact_key_of(fact), fact)
+        return unique
+
+    local_facts, other_facts = get_unique(local_facts), get_unique(other_facts)
+    local_only = sorted((fact for key, fact in local_facts.items() if key not in
+        other_facts), key=lambda fact: fact.start)
+    other_only = sorted((fact for key, fact in other_facts.items() if key not in
+        local_facts), key=lambda fact: fact.start)
+    conflicts = _get_conflicts(local_only, other_only)
+    local_losers = set(id(local) for local, other in conflicts if prefer != 'local')
+    other_losers = set(id(other) for local, other in conflicts if prefer != 'other')
+    result = {
+        'copied': {
+            'other': [fact for fact in local_only if id(fact) not in local_losers],
+            'local': [fact for fact in other_only if id(fact) not in other_losers],
+        },
+        'removed': {'other': [], 'local': []},
+        'conflicts': conflicts if prefer is None else [],
+    }
+    if prefer == 'local':
+        result['removed']['other'] = [fact for fact in other_only
+            if id(fact) in other_losers]
+    elif prefer == 'other':
+        result['removed']['local'] = [fact for fact in local_only
+            if id(fact) in local_losers]
+    return result
+
+
+def _get_conflicts(facts, others):
+    """
+    Return ``(fact, other)`` for each of ``facts`` that overlaps any of ``others``.
+
+    Just like our backends, we consider facts touching each other as overlapping. We do
+    not assume ``others`` to be free of overlaps, so any of them starting before a fact
+    ends is a candidate, no matter how early.
+    """
+    others = sorted(others, key=lambda other: other.start)
+    starts = [other.start for other in others]
+    conflicts = []
+    for fact in sorted(facts, key=lambda fact: fact.start):
+        for other in others[:bisect.bisect_right(starts, fact.end)]:
+            if other.end >= fact.start:
+                conflicts.append((fact, other))
+    return conflicts
+
+
+def _get_blocked_copies(control, copied, removed):
+    """
+    Return ``(fact, other)`` for each fact to copy to ``control`` that would overlap another.
+
+    ``other`` is either a fact stored by ``control`` that is not going to be removed or
+    another fact to copy.
+
+    Args:
+        copied (list): Facts to be copied to ``control``.
+        removed (list): Facts to be removed from ``control`` beforehand.
+    """
+    removed = set(fact.pk for fact in removed)
+    # Report each pair of facts to copy just once, the later one first.
+    positions = dict((id(fact), position) for position, fact in enumerate(copied))
+    blocked = [(fact, other) for fact, other in _get_conflicts(copied, copied)
+        if positions[id(other)] < positions[id(fact)]]
+    for fact in copied:
+        blocked.extend((fact, other) for other in _get_overlapping_facts(control, fact.start,
+            fact.end) if other.pk not in removed)
+    return blocked
+
+
+@run.command(help=help_strings.DEDUPE_HELP)
+@click.argument('time_range', default='')
+@click.option('--dry-run', is_flag=True, help=_("Only list duplicates, do not remove them."))
+@pass_controler
+def dedupe(controler, time_range, dry_run):
+    """Remove duplicate facts."""
+    _dedupe(controler, time_range, dry_run)
+
+
+def _dedupe(controler, time_range='', dry_run=False):
+    """
+    Remove all but the first of each set of identical facts starting within ``time_range``.
+
+    Facts are identical if their keys (see ``_get_fact_key``) are. We stream the key of
+    each fact from the database once and remember the first fact seen for each key, so
+    time and memory grow linearly with the number of facts. Duplicates are removed in
+    batches of ``DEDUPE_BATCH_SIZE``, each in a transaction of its own.
+
+    Args:
+        time_range (str): Only facts starting within this timerange will be considered.
+        dry_run (bool): Only list duplicates.
+
+    Returns:
+        dict: The primary keys of the duplicates of each fact kept, by the key of the
+            one kept.
+    """
+    start, end = _parse_time_range(controler, time_range)
+    with _profile_phase(controler, 'backend'):
+        duplicates = _find_duplicates(controler, start, end)
+    count = sum(len(pks) for pks in duplicates.values())
+    controler.result_count = count
+    if not count:
+        click.echo(_("No duplicates found."))
+        return duplicates
+
+    if dry_run:
+        table = [(key[0][:19], key[1][:19], key[2], key[3], len(pks)) for key, pks in
+            sorted(duplicates.items())]
+        click.echo(tabulate(table, headers=(_("Start"), _("End"), _("Activity"),
+            _("Category"), _("Duplicates"))))
+        click.echo(_("Would remove {count} duplicates of {facts} facts.".format(
+            count=count, facts=len(duplicates))))
+        return duplicates
+
+    facts = sorted((pk, _to_datetime(key[0])) for key, pks in duplicates.items()
+        for pk in pks)
+    for index in range(0, len(facts), DEDUPE_BATCH_SIZE):
+        _retry_on_locked(controler, _remove_facts, controler,
+            facts[index:index + DEDUPE_BATCH_SIZE])
+    _record_local_write(controler)
+    message = _("Removed {count} duplicates of {facts} facts.".format(count=count,
+        facts=len(duplicates)))
+    controler.client_logger.info(message)
+    click.echo(message)
+    return duplicates
+
+
+def _find_duplicates(controler, start=None, end=None):
+    """
+    Return the duplicates of all facts starting within ``start`` to ``end``.
+
+    Of each set of identical facts we keep the one with the lowest primary key.
+
+    Returns:
+        dict: See ``_dedupe``.
+    """
+    first_seen = {}
+    duplicates = {}
+    for pk, key in _iter_fact_keys(controler, start, end):
+        kept = first_seen.setdefault(key, pk)
+        if kept == pk:
+            continue
+        if pk < kept:
+            first_seen[key], pk = pk, kept
+        duplicates.setdefault(key, []).append(pk)
+    return duplicates
+
+
+def _remove_facts(controler, facts):
+    """
+    Remove the given facts, in a single transaction where our store supports that.
+
+    Args:
+        facts (list): ``(pk, start)`` of each fact. Knowing its start lets the ``log``
+            store find a fact without scanning all of them.
+    """
+    if controler.config['store'] != 'sqlalchemy':
+        for pk, start in facts:
+            controler.facts.remove(controler.facts.get(pk, start=start))
+        return
+    pks = [pk for pk, start in facts]
+    session = controler.store.session
+    facttags, facts = alchemy_objects.facttags, alchemy_objects.facts
+    session.execute(facttags.delete().where(facttags.c.fact_id.in_(pks)))
+    session.execute(facts.delete().where(facts.c.id.in_(pks)))
+    session.commit()
+
+
+@run.command(help=help_strings.LICENSE_HELP)
+def license():
+    """Show license information."""
+    _license()
+
+
+def _license():
+    """Show license information."""
+    license = """
+        'hamster_cli' is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        'hamster_cli' is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with .  If not, see <http://www.gnu.org/licenses/>.
+        """
+    click.echo(license)
+
+
+@run.command(help=help_strings.DETAILS_HELP)
+@click.option('--queries', is_flag=True, help=_(
+    "Summarize the slowest database statements seen recently."))
+@pass_controler
+def details(controler, queries):
+    """List details about the runtime environment."""
+    if queries:
+        _slow_queries(controler)
+    else:
+        _details(controler)
+
+
+def _details(controler):
+    """List details about the runtime environment."""
+    def get_db_info():
+        result = None
+
+        def get_sqlalchemy_info():
+            engine = controler.config['db_engine']
+            if engine == 'sqlite':
+                sqlalchemy_string = _("Using 'sqlite' with database stored under: {}".format(
+                    controler.config['db_path']))
+                pragmas = ', '.join('{}={}'.format(name, value) for name, value in
+                    _get_sqlite_pragmas(_get_engine(controler.store)))
+                sqlalchemy_string += '\n' + _("Effective sqlite settings: {}".format(pragmas))
+                snapshot = controler.config.get('db_snapshot')
+                if snapshot:
+                    sqlalchemy_string += '\n' + _("Seeded from snapshot: {}".format(snapshot))
+                    if controler.config.get('db_snapshot_save'):
+                        sqlalchemy_string += _(" (written back on exit)")
+            else:
+                port = controler.config.get('db_port', '')
+                if port:
+                    port = ':{}'.format(port)
+
+                sqlalchemy_string = _(
+                    "Using '{engine}' connecting to database {name} on {host}{port}"
+                    " as user {username}.".format(
+                        engine=engine, host=controler.config['db_host'], port=port,
+                        username=controler.config['db_user'], name=controler.config['db_name'])
+                )
+                replica = controler.config.get('db_replica')
+                if replica:
+                    sqlalchemy_string += '\n' + _(
+                        "Read only commands use the replica {name} on {host} as user {user}."
+                        .format(**replica)
+                    )
+                pool = controler.config.get('db_pool')
+                if pool:
+                    sqlalchemy_string += '\n' + _(
+                        "Connection pool: size={pool_size}, overflow={max_overflow},"
+                        " recycle={pool_recycle}s, timeout={pool_timeout}s,"
+                        " pre-ping={pool_pre_ping}".format(**pool)
+                    )
+            return sqlalchemy_string
+
+        def get_log_info():
+            store = controler.store
+            return _(
+                "Using the log structured store under: {path}\n"
+                "{base} facts in the base segment, {live} records in the live segment"
+                " (compacted at {threshold}).".format(path=store.path, base=store.base_facts,
+                    live=store.live_records, threshold=store.compaction_threshold)
+            )
+
+        if controler.config['store'] == 'log':
+            result = get_log_info()
+        else:
+            result = get_sqlalchemy_info()
+        return result
+
+    from hamster_cli import __version__, __appname__
+    click.echo(_("You are running {name} version {version}.".format(
+        name=__appname__, version=__version__)))
+    click.echo("Configuration found under: {}.".format(_get_config_path()))
+    click.echo("Logfile stored under: {}.".format(controler.client_config['logfile_path']))
+    click.echo("Reports exported to: {}.".format(controler.client_config['export_path']))
+    click.echo("Archived facts stored under: {}.".format(controler.client_config['archive_path']))
+    click.echo(get_db_info())
+    threshold = controler.client_config.get('slow_query_threshold')
+    if threshold and controler.config['store'] == 'sqlalchemy':
+        click.echo(_("Statements taking {threshold:g} ms or longer are logged, see"
+                     " 'details --queries'.".format(threshold=threshold)))
+
+
+def _slow_queries(controler):
+    """
+    Summarize the slowest database statements recorded in our slow query log.
+
+    Only the most recent ``SLOW_QUERY_LOG_ENTRIES`` entries are considered. Executions
+    of the same statement are grouped, the slowest ones are shown first.
+    """
+    summary = {}
+    for entry in _read_slow_query_log(controler):
+        statement = ' '.join(entry['statement'].split())
+        item = summary.setdefault(statement, {'count': 0, 'total': 0.0, 'max': 0.0,
+            'rows': None, 'last': None})
+        item['count'] += 1
+        item['total'] += entry['duration']
+        if entry['duration'] >= item['max']:
+            item['max'] = entry['duration']
+            item['rows'] = entry['rows']
+        item['last'] = entry['time']
+    if not summary:
+        click.echo(_("No slow queries recorded."))
+        return
+
+    table = []
+    for statement, item in sorted(summary.items(), key=lambda item: item[1]['max'],
+            reverse=True)[:SLOW_QUERY_SUMMARY_SIZE]:
+        if len(statement) > SLOW_QUERY_SUMMARY_WIDTH:
+            statement = statement[:SLOW_QUERY_SUMMARY_WIDTH - 3] + '...'
+        table.append((statement, item['count'], item['max'], item['total'] / item['count'],
+            item['rows'], item['last']))
+    headers = (_("Statement"), _("Count"), _("Max (ms)"), _("Mean (ms)"), _("Rows"),
+        _("Last seen"))
+    click.echo(tabulate(table, headers=headers, floatfmt='.1f'))
+
+
+@run.group(help=help_strings.DB_HELP)
+def db():
+    """Group of database maintenance commands."""
+    pass
+
+
+@db.command(help=help_strings.DB_OPTIMIZE_HELP)
+@pass_controler
+def optimize(controler):
+    """Create missing indexes, update statistics and defragment the database."""
+    _optimize(controler)
+
+
+def _optimize(controler):
+    """
+    Create missing indexes, update the query planner statistics and defragment the database.
+
+    In order to make the gain visible we time a reference query (all facts of the last
+    ``OPTIMIZE_REFERENCE_DAYS`` days) before and after.
+
+    Returns:
+        None: If everything went alright.
+    """
+    if controler.config['store'] == 'log':
+        _compact_log_store(controler)
+        return
+
+    engine = _get_engine(controler.store)
+    before = _time_reference_query(controler)
+
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    for name, table, columns in OPTIMIZE_INDEXES:
+        existing = [index['column_names'] for index in inspector.get_indexes(table)]
+        try:
+            existing += [constraint['column_names'] for constraint in
+                inspector.get_unique_constraints(table)]
+        except NotImplementedError:
+            pass
+        if any(tuple(index[:len(columns)]) == columns for index in existing):
+            continue
+        statement = 'CREATE INDEX {name} ON {table} ({columns})'.format(
+            name=quote(name), table=quote(table),
+            columns=', '.join(quote(column) for column in columns))
+        with engine.begin() as connection:
+            connection.execute(text(statement))
+        message = _("Created index {name} on {table} ({columns}).".format(
+            name=name, table=table, columns=', '.join(columns)))
+        controler.client_logger.info(message)
+        click.echo(message)
+
+    # Make sure no session holds on to a connection while we vacuum.
+    controler.store.session.close()
+    if engine.name == 'sqlite':
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute('ANALYZE')
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] == 2:
+                # 'incremental' auto vacuum lets us free pages without rebuilding the file.
+                cursor.execute('PRAGMA incremental_vacuum')
+                cursor.fetchall()
+                vacuum = 'incremental_vacuum'
+            else:
+                cursor.execute('VACUUM')
+                vacuum = 'VACUUM'
+            cursor.close()
+        finally:
+            connection.close()
+        click.echo(_("Ran ANALYZE and {vacuum}.".format(vacuum=vacuum)))
+    elif engine.name == 'postgresql':
+        connection = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            connection.execute(text('VACUUM ANALYZE'))
+        finally:
+            connection.close()
+        click.echo(_("Ran VACUUM ANALYZE."))
+    else:
+        click.echo(_("Updating statistics and vacuuming is not supported for '{engine}'.".format(
+            engine=engine.name)))
+
+    _report_reference_query(controler, before)
+
+
+def _compact_log_store(controler):
+    """Merge the live segment of our log structured store into a new base segment."""
+    before = _time_reference_query(controler)
+    records, facts = controler.store.compact()
+    message = _("Compacted {records} live records, the base segment now holds {facts}"
+                " facts.".format(records=records, facts=facts))
+    controler.client_logger.info(message)
+    click.echo(message)
+    _report_reference_query(controler, before)
+
+
+def _report_reference_query(controler, before):
+    """Show the time our reference query took ``before`` optimizing next to what it takes now."""
+    after = _time_reference_query(controler)
+    message = _(
+        "Reference query (facts of the last {days} days): {before:.1f} ms before,"
+        " {after:.1f} ms after.".format(days=OPTIMIZE_REFERENCE_DAYS, before=before * 1000,
+            after=after * 1000)
+    )
+    controler.client_logger.info(message)
+    click.echo(message)
+
+
+@run.command(help=help_strings.BENCH_HELP)
+@click.option('--facts', 'fact_count', default=1000, type=click.IntRange(1), help=_(
+    "Number of facts to generate."))
+@click.option('--activities', 'activity_count', default=20, type=click.IntRange(1), help=_(
+    "Number of activities to spread the facts across."))
+@click.option('--categories', 'category_count', default=5, type=click.IntRange(1), help=_(
+    "Number of categories to spread the activities across."))
+@click.option('--repeat', default=20, type=click.IntRange(1), help=_(
+    "How often each operation is timed."))
+@click.option('--seed', default=0, help=_("Seed for generating the facts."))
+@click.option('--store', type=click.Choice(['sqlalchemy', 'log']), default=None, help=_(
+    "Store to benchmark. Defaults to the configured one."))
+@click.option('--json', 'as_json', is_flag=True, help=_("Print the results as JSON."))
+@pass_controler
+def bench(controler, fact_count, activity_count, category_count, repeat, seed, store,
+        as_json):
+    """Time common operations against a throwaway database of generated facts."""
+    _bench(controler, fact_count, activity_count, category_count, repeat, seed, store,
+        as_json)
+
+
+def _bench(controler, fact_count, activity_count, category_count, repeat, seed=0, store=None,
+        as_json=False):
+    """
+    Time common operations against a throwaway database of generated facts.
+
+    The database is created in a temporary directory using our current backend settings
+    and removed afterwards. Our actual database is never touched.
+
+    Args:
+        fact_count (int): Number of facts to generate.
+        activity_count (int): Number of activities to spread the facts across.
+        category_count (int): Number of categories to spread the activities across.
+        repeat (int): How often each operation is timed.
+        seed (int): Seed for generating the facts. The same seed produces the same facts.
+        store (str, optional): Store to benchmark. Defaults to ``config['store']``.
+        as_json (bool): Print the results as JSON instead of a table.
+
+    Returns:
+        None: If everything went alright.
+    """
+    workdir = tempfile.mkdtemp(prefix='hamster_cli-bench-')
+    try:
+        bench_controler = _get_bench_controler(controler, workdir, store)
+        timer = timeit.default_timer()
+        _populate_bench_store(bench_controler, fact_count, activity_count, category_count,
+            seed)
+        click.echo(_("Generated {count} facts in {seconds:.1f} s.".format(
+            count=fact_count, seconds=timeit.default_timer() - timer)), err=True)
+        results = _run_bench(bench_controler, workdir, repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if as_json:
+        from hamster_cli import __version__
+        click.echo(json.dumps({
+            'version': __version__,
+            'store': bench_controler.config['store'],
+            'facts': fact_count,
+            'activities': activity_count,
+            'categories': category_count,
+            'repeat': repeat,
+            'seed': seed,
+            'results': results,
+        }, indent=2))
+    else:
+        headers = [_("Operation"), _("Runs")]
+        headers += ['p{} (ms)'.format(percentile) for percentile in BENCH_PERCENTILES]
+        headers.append(_("ops/s"))
+        table = []
+        for result in results:
+            row = [result['operation'], result['runs']]
+            row += [result['p{}_ms'.format(percentile)] for percentile in BENCH_PERCENTILES]
+            row.append(result['ops_per_second'])
+            table.append(row)
+        click.echo(tabulate(table, headers=headers, floatfmt='.2f'))
+
+
+def _get_bench_controler(controler, workdir, store=None):
+    """
+    Return a controler for a fresh database within ``workdir``.
+
+    Apart from its location and store the database uses the same settings as the one
+    of ``controler``. ``fact_min_delta`` is disabled so that start/stop cycles, which
+    only last a few milliseconds, can be saved.
+    """
+    lib_config = dict(controler.config, store=store or controler.config['store'],
+        db_engine='sqlite', db_path=os.path.join(workdir, 'bench.sqlite'),
+        tmpfile_path=os.path.join(workdir, 'bench.fact'), fact_min_delta='0',
+        db_snapshot=None)
+    if lib_config['store'] == 'log':
+        lib_config['db_path'] = os.path.join(workdir, 'bench.log')
+        lib_config.setdefault('log_compaction_threshold', 1000)
+    client_config = dict(controler.client_config, write_behind=False,
+        export_path=os.path.join(workdir, 'export'),
+        archive_path=os.path.join(workdir, 'archive'),
+        last_write_path=os.path.join(workdir, 'last_write'),
+        journal_path=os.path.join(workdir, 'bench.journal'))
+    bench_controler = Controler((lib_config, client_config))
+    bench_controler.client_logger = controler.client_logger
+    return bench_controler
+
+
+def _populate_bench_store(controler, fact_count, activity_count, category_count, seed=0):
+    """
+    Fill the store of ``controler`` with generated, non overlapping facts.
+
+    Facts are spread randomly across ``activity_count`` activities, which in turn belong
+    to one of ``category_count`` categories. Going back from midnight, each fact lasts
+    between 5 minutes and 2 hours and there is a gap of up to an hour between two facts.
+    """
+    rng = random.Random(seed)
+    categories = [Category('category-{}'.format(index)) for index in range(category_count)]
+    activities = [controler.activities.get_or_create(Activity('activity-{}'.format(index),
+        category=categories[index % category_count])) for index in range(activity_count)]
+
+    def generate_facts():
+        end = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        for index in range(fact_count):
+            end -= datetime.timedelta(minutes=rng.randint(1, 60))
+            start = end - datetime.timedelta(minutes=rng.randint(5, 120))
+            yield Fact(rng.choice(activities), start, end,
+                description='Generated fact #{}'.format(index))
+            end = start
+
+    if controler.config['store'] == 'sqlalchemy':
+        # Saving facts one by one checks for overlaps and commits each of them, which
+        # would take ages for realistic volumes. Our facts do not overlap by design, so
+        # we insert them in bulk instead.
+        session = controler.store.session
+        chunk = []
+        for fact in generate_facts():
+            chunk.append({'start': fact.start, 'end': fact.end,
+                'activity_id': fact.activity.pk, 'description': fact.description})
+            if len(chunk) >= BENCH_INSERT_CHUNK_SIZE:
+                session.execute(alchemy_objects.facts.insert(), chunk)
+                chunk = []
+        if chunk:
+            session.execute(alchemy_objects.facts.insert(), chunk)
+        session.commit()
+    else:
+        for fact in generate_facts():
+            controler.facts.save(fact)
+
+
+def _run_bench(controler, workdir, repeat):
+    """
+    Time each of our benchmarked operations ``repeat`` times.
+
+    Returns:
+        list: One dictionary per operation holding its name, number of runs, latency
+            percentiles in milliseconds and throughput.
+    """
+    now = datetime.datetime.now()
+    operations = []
+
+    def start_stop():
+        _start(controler, 'activity-0@category-0', '', '')
+        _stop(controler)
+
+    operations.append(('start/stop', start_stop))
+    for days in BENCH_RANGE_DAYS:
+        time_range = '{start} - {end}'.format(
+            start=(now - datetime.timedelta(days=days)).strftime('%Y-%m-%d %H:%M'),
+            end=now.strftime('%Y-%m-%d %H:%M'))
+        operations.append(('list {}d'.format(days),
+            lambda time_range=time_range: _search(controler, '', time_range)))
+        operations.append(('search {}d'.format(days),
+            lambda time_range=time_range: _search(controler, 'activity-1', time_range)))
+    operations.append(('activities', lambda: _activities(controler, '')))
+
+    formats = ['csv', 'ical', 'xml']
+    try:
+        columnar.import_pyarrow()
+    except ImportError:
+        pass
+    else:
+        formats += ['parquet', 'arrow']
+    for format in formats:
+        path = os.path.join(workdir, 'export.{}'.format(format))
+        operations.append(('export {}'.format(format),
+            lambda format=format, path=path: _export(controler, format, None, None, path)))
+
+    results = []
+    for name, operation in operations:
+        samples = []
+        with _silenced_stdout():
+            for iteration in range(repeat):
+                timer = timeit.default_timer()
+                operation()
+                samples.append(timeit.default_timer() - timer)
+        samples.sort()
+        result = {'operation': name, 'runs': repeat}
+        for percentile in BENCH_PERCENTILES:
+            result['p{}_ms'.format(percentile)] = _get_percentile(samples, percentile) * 1000
+        result['ops_per_second'] = len(samples) / sum(samples) if sum(samples) else 0.0
+        results.append(result)
+    return results
+
+
+def _get_percentile(samples, percentile):
+    """Return the ``percentile`` of the sorted ``samples`` using the nearest rank method."""
+    rank = int(math.ceil(percentile / 100.0 * len(samples)))
+    return samples[max(rank, 1) - 1]
+
+
+@contextmanager
+def _silenced_stdout():
+    """Discard anything written to stdout within this block."""
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+
+# Helper functions
+@contextmanager
+def _profile_phase(controler, name):
+    """
+    Account the time spent within this block to phase ``name`` if we are profiling.
+
+    If we are profiling memory, a snapshot is taken at the end of the block.
+    """
+    memory_profiler = getattr(controler, 'memory_profiler', None)
+    if memory_profiler is not None:
+        memory_profiler.start_phase()
+    timer = getattr(controler, 'phase_timer', None)
+    if timer is None:
+        yield
+    else:
+        with timer.phase(name):
+            yield
+    if memory_profiler is not None:
+        memory_profiler.snapshot(name)
+
+
+def _report_memory(memory_profiler, path=None):
+    """Print the report of ``memory_profiler`` to stderr or write it to ``path``."""
+    report = memory_profiler.get_report()
+    memory_profiler.stop()
+    if path:
+        with codecs.open(path, 'w', encoding='utf-8') as fobj:
+            fobj.write(report + '\n')
+        click.echo(_("Memory profile written to: {}".format(path)), err=True)
+    else:
+        click.echo(report, err=True)
+
+
+def _format_size(size):
+    """Return ``size`` bytes in a human readable form."""
+    if abs(size) < 1024 * 1024:
+        return '{:.1f} KiB'.format(size / 1024.0)
+    return '{:.1f} MiB'.format(size / 1024.0 / 1024.0)
+
+
+def _record_metrics(controler, command, timer):
+    """
+    Add wall time, backend time and result count of this invocation to our metrics.
+
+    Failing to do so is logged but never fails the command itself.
+    """
+    config = controler.client_config
+    observations = {
+        'wall': timeit.default_timer() - timer.started,
+        'backend': timer.durations.get('backend', 0.0),
+        'results': getattr(controler, 'result_count', None),
+    }
+    try:
+        metrics.record(config['metrics_path'], command, observations,
+            config['metrics_textfile'] or None)
+    except (IOError, OSError) as error:
+        controler.client_logger.warning(_("Unable to record metrics: {}".format(error)))
+
+
+def _report_profile(timer, profiler=None):
+    """
+    Print the phase breakdown of ``timer`` to stderr.
+
+    If we got a ``profiler`` its statistics are dumped to our cache directory as well.
+    """
+    if profiler:
+        profiler.disable()
+        path = os.path.join(AppDirs.user_cache_dir, 'hamster_cli-{}.pstats'.format(
+            datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+        profiler.dump_stats(path)
+        click.echo(_("cProfile statistics written to: {}".format(path)), err=True)
+    table, headers = timer.get_table()
+    click.echo(tabulate(table, headers=headers), err=True)
+
+
+def _setup_logging(controler):
+    """
+    Setup logging for the lib_logger as well as client specific logging.
+
+    Records for our logfile are passed to a background thread through a queue, so
+    writing them never blocks a command. Any records still pending are written at exit.
+    """
+    formatter = logging.Formatter(
+        '[%(levelname)s] %(asctime)s %(name)s %(funcName)s:  %(message)s')
+
+    lib_logger = controler.lib_logger
+    client_logger = logging.getLogger('hamster_cli')
+    # Clear any existing (null)Handlers
+    lib_logger.handlers = []
+    client_logger.handlers = []
+    _stop_log_listener()
+    client_logger.setLevel(controler.client_config['log_level'])
+    lib_logger.setLevel(controler.client_config['log_level'])
+    controler.client_logger = client_logger
+
+    if controler.client_config['log_console']:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        lib_logger.addHandler(console_handler)
+        client_logger.addHandler(console_handler)
+
+    if controler.client_config['logfile_path']:
+        filename = controler.client_config['logfile_path']
+        file_handler = LockedRotatingFileHandler(filename, encoding='utf-8',
+            maxBytes=controler.client_config['log_max_bytes'],
+            backupCount=controler.client_config['log_backup_count'])
+        if controler.client_config['log_format'] == 'json':
+            file_handler.setFormatter(JSONLogFormatter())
+        else:
+            file_handler.setFormatter(formatter)
+        if QueueListener is not None:
+            file_handler = _start_log_listener(file_handler)
+        lib_logger.addHandler(file_handler)
+        client_logger.addHandler(file_handler)
+
+
+def _start_log_listener(handler):
+    """
+    Start a background thread passing queued log records on to ``handler``.
+
+    Returns:
+        logging.handlers.QueueHandler: Handler to add to our loggers instead of ``handler``.
+    """
+    global _log_listener
+    log_queue = queue.Queue(-1)
+    _log_listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _log_listener.start()
+    return QueueHandler(log_queue)
+
+
+@atexit.register
+def _stop_log_listener():
+    """Stop our background log writer, if any, once all pending records are written."""
+    global _log_listener
+    if _log_listener is None:
+        return
+    listener, _log_listener = _log_listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def _get_config(config_instance):
+    """
+    Rertrieve config dictionaries for backend and client setup.
+
+    Raises:
+        ValueError: Raised if we fail to process the user supplied config information.
+            Please note that there will be no log entry as at this point, logging has not
+            been set up yet.
+
+    Returns:
+        tuple: ``backend_config, client_config)`` tuple, where each element is a
+            dictionary storing relevant config data.
+    """
+    # [TODO]
+    # We propably can make better use of configparsers default config optionn,
+    # but for now this will do.
+
+    def get_client_config(config):
+        """
+        Process client section of provided config and turn it into proper config dictionary.
+
+        Make sure config values are of proper type and provide basic
+        sanity checks (e.g. make sure we got a filename if we want to log to
+        file and such..).
+
+        Not all key/values returned here need to be user configurable!
+
+        It is worth noting that this is where we turn our user provided config information
+        into the actual dictionaries to be consumed by our backend and client objects.
+        A particular consequence is that the division of "Client/Backend" in the config
+        file is purely cosmetic. Another consequence is that not all user provided config
+        information has to be processed at all. We just take what we need and can safely
+        ignore the rest. That way we can improve the config file layout without having to
+        adjust our code all the time. It also means our main code does not have to deal with
+        turning ``path`` plus ``name`` into a full location and such.
+        """
+        def get_logfile_path():
+            log_dir = AppDirs.user_log_dir
+            return os.path.join(log_dir, config.get('Client', 'log_filename'))
+
+        def get_log_level():
+            try:
                 log_level = LOG_LEVELS[config.get('Client', 'log_level').lower()]
             except KeyError:
                 raise ValueError(_("Unrecognized log level value in config"))
@@ -641,15 +2742,132 @@ def _get_config(config_instance):
         def get_log_console():
             return config.getboolean('Client', 'log_console')
 
+        def get_unsorted_localized():
+            """Return the name shown for facts without any category."""
+            return config.get('Client', 'unsorted_localized', fallback=_("Unsorted"))
+
+        def get_fact_overlap():
+            """Return how new facts overlapping existing ones are dealt with."""
+            fact_overlap = config.get('Client', 'fact_overlap', fallback='reject').lower()
+            if fact_overlap not in ('reject', 'trim'):
+                raise ValueError(_("'fact_overlap' needs to be either 'reject' or 'trim'."))
+            return fact_overlap
+
+        def get_log_format():
+            log_format = config.get('Client', 'log_format', fallback='text').lower()
+            if log_format not in ('text', 'json'):
+                raise ValueError(_("'log_format' needs to be either 'text' or 'json'."))
+            return log_format
+
+        def get_log_max_bytes():
+            """Return size at which our logfile is rotated. ``0`` disables rotation."""
+            try:
+                max_bytes = config.getint('Client', 'log_max_bytes', fallback=1048576)
+            except ValueError:
+                max_bytes = -1
+            if max_bytes < 0:
+                raise ValueError(_("'log_max_bytes' needs to be a positive number."))
+            return max_bytes
+
+        def get_log_backup_count():
+            try:
+                backup_count = config.getint('Client', 'log_backup_count', fallback=3)
+            except ValueError:
+                backup_count = 0
+            if backup_count < 1:
+                raise ValueError(_("'log_backup_count' needs to be a positive number."))
+            return backup_count
+
+        def get_write_retries():
+            try:
+                return config.getint('Client', 'write_retries', fallback=5)
+            except ValueError:
+                raise ValueError(_("'write_retries' needs to be an integer value."))
+
+        def get_write_retry_delay(key, default):
+            try:
+                return config.getfloat('Client', key, fallback=default)
+            except ValueError:
+                raise ValueError(_("'{}' needs to be a number of seconds.".format(key)))
+
         def get_export_dir():
             """Return path to save exports to. Filenextension will be added by export method."""
             return os.path.join(AppDirs.user_data_dir, 'export')
 
+        def get_archive_dir():
+            """Return path to the directory holding our archive partitions."""
+            return os.path.join(AppDirs.user_data_dir, 'archive')
+
+        def get_write_behind():
+            return config.getboolean('Client', 'write_behind', fallback=False)
+
+        def get_journal_path():
+            """Return path to our write-behind journal."""
+            return os.path.join(AppDirs.user_data_dir, 'hamster_cli.journal')
+
+        def get_last_write_path():
+            """Return path to the file marking our last write to the database."""
+            return os.path.join(AppDirs.user_cache_dir, 'hamster_cli.last_write')
+
+        def get_slow_query_threshold():
+            """Return the threshold in milliseconds. ``0`` disables our slow query log."""
+            try:
+                threshold = config.getfloat('Client', 'slow_query_threshold', fallback=500.0)
+            except ValueError:
+                threshold = -1
+            if threshold < 0:
+                raise ValueError(_(
+                    "'slow_query_threshold' needs to be a positive number of milliseconds."))
+            return threshold
+
+        def get_slow_query_redact():
+            return config.getboolean('Client', 'slow_query_redact', fallback=False)
+
+        def get_metrics():
+            return config.getboolean('Client', 'metrics', fallback=True)
+
+        def get_metrics_path():
+            """Return path to the state file holding our per command metrics."""
+            return os.path.join(AppDirs.user_cache_dir, 'hamster_cli.metrics')
+
+        def get_metrics_textfile():
+            """
+            Return path to render our metrics to for the node exporter's textfile collector.
+
+            The collector only picks up files ending in '.prom'.
+            """
+            path = config.get('Client', 'metrics_textfile', fallback='')
+            if path and not path.endswith('.prom'):
+                raise ValueError(_("'metrics_textfile' needs to end in '.prom'."))
+            return path
+
+        def get_slow_query_log_path():
+            """Return path to the log of recent slow queries."""
+            return os.path.join(AppDirs.user_cache_dir, 'hamster_cli.slow_queries')
+
         return {
+            'unsorted_localized': get_unsorted_localized(),
             'log_level': get_log_level(),
             'log_console': get_log_console(),
             'logfile_path': get_logfile_path(),
+            'log_format': get_log_format(),
+            'log_max_bytes': get_log_max_bytes(),
+            'log_backup_count': get_log_backup_count(),
             'export_path': get_export_dir(),
+            'archive_path': get_archive_dir(),
+            'last_write_path': get_last_write_path(),
+            'write_behind': get_write_behind(),
+            'fact_overlap': get_fact_overlap(),
+            'journal_path': get_journal_path(),
+            'write_retries': get_write_retries(),
+            'write_retry_delay': get_write_retry_delay('write_retry_delay', 0.05),
+            'write_retry_max_delay': get_write_retry_delay('write_retry_max_delay', 2.0),
+            'slow_query_threshold': get_slow_query_threshold(),
+            'slow_query_redact': get_slow_query_redact(),
+            'slow_query_log_path': get_slow_query_log_path(),
+            'metrics': get_metrics(),
+            'metrics_path': get_metrics_path(),
+            'metrics_textfile': get_metrics_textfile(),
         }
 
     def get_backend_config(config):
@@ -689,17 +2907,127 @@ def _get_config(config_instance):
         def get_fact_min_delta():
             return config.get('Backend', 'fact_min_delta')
 
-        def get_tmpfile_path():
-            """Return path to file used to store *ongoing fact*."""
-            return os.path.join(AppDirs.user_data_dir, 'hamster_cli.fact')
+        def get_tmpfile_path():
+            """Return path to file used to store *ongoing fact*."""
+            return os.path.join(AppDirs.user_data_dir, 'hamster_cli.fact')
+
+        def get_sqlite_pragmas():
+            """
+            Return ``(name, value)`` tuples of PRAGMAs to be applied to new sqlite connections.
+
+            Settings are taken from the chosen ``sqlite_profile`` and may be overridden
+            one by one. Anything not set at all is left to sqlite.
+            """
+            profile = config.get('Backend', 'sqlite_profile', fallback='') or 'default'
+            try:
+                settings = dict(SQLITE_PROFILES[profile.lower()])
+            except KeyError:
+                raise ValueError(_("Unrecognized sqlite_profile value in config."))
+
+            result = []
+            for name, choices in SQLITE_PRAGMAS:
+                value = config.get('Backend', 'sqlite_{}'.format(name), fallback='')
+                value = value.strip().lower() or settings.get(name)
+                if not value:
+                    continue
+                if choices is int:
+                    try:
+                        value = str(int(value))
+                    except ValueError:
+                        raise ValueError(_(
+                            "'sqlite_{}' needs to be an integer value.".format(name)))
+                elif value not in choices:
+                    raise ValueError(_("Unrecognized 'sqlite_{}' value in config.".format(name)))
+                result.append((name, value))
+            return result
+
+        def get_db_pool():
+            """Return ``create_engine`` keyword arguments that configure our connection pool."""
+            try:
+                return {
+                    'pool_size': config.getint('Backend', 'db_pool_size', fallback=5),
+                    'max_overflow': config.getint('Backend', 'db_pool_overflow', fallback=10),
+                    'pool_recycle': config.getint('Backend', 'db_pool_recycle', fallback=3600),
+                    'pool_timeout': config.getint('Backend', 'db_pool_timeout', fallback=30),
+                    'pool_pre_ping': config.getboolean('Backend', 'db_pool_pre_ping',
+                        fallback=True),
+                }
+            except ValueError:
+                raise ValueError(_("We encountered an error when parsing the connection pool"
+                                   " settings! Aborting ..."))
+
+        def get_db_replica():
+            """
+            Return connection settings for an optional read replica.
+
+            Any setting left blank is the same as for the primary database.
+
+            Returns:
+                dict or None: ``None`` if no ``replica_host`` is configured.
+            """
+            if not config.get('Backend', 'replica_host', fallback=''):
+                return None
+            result = {}
+            for key in ('host', 'port', 'name', 'user', 'password'):
+                value = config.get('Backend', 'replica_{}'.format(key), fallback='')
+                if not value:
+                    value = config.get('Backend', 'db_{}'.format(key), fallback='')
+                result[key] = value
+            return result
+
+        def get_db_replica_staleness():
+            try:
+                return config.getint('Backend', 'replica_staleness', fallback=10)
+            except ValueError:
+                raise ValueError(_("'replica_staleness' needs to be a number of seconds."))
+
+        def get_log_compaction_threshold():
+            try:
+                threshold = config.getint('Backend', 'log_compaction_threshold', fallback=1000)
+            except ValueError:
+                threshold = 0
+            if threshold < 1:
+                raise ValueError(_("'log_compaction_threshold' needs to be a positive number."))
+            return threshold
+
+        def get_db_snapshot():
+            """
+            Return path to the snapshot to seed our in-memory database from.
+
+            Returns:
+                text_type or None: ``None`` if no snapshot is configured.
+            """
+            path = config.get('Backend', 'db_snapshot', fallback='')
+            if not path:
+                return None
+            if config.get('Backend', 'db_path') != ':memory:':
+                raise ValueError(_("'db_snapshot' requires 'db_path' to be ':memory:'."))
+            if os.path.splitext(path)[1].lower() not in SNAPSHOT_FORMATS:
+                raise ValueError(_("Unrecognized 'db_snapshot' format. Supported suffixes"
+                                   " are: {}".format(', '.join(sorted(SNAPSHOT_FORMATS)))))
+            return path
+
+        def get_db_snapshot_save():
+            return config.getboolean('Backend', 'db_snapshot_save', fallback=False)
 
         def get_db_config():
             """Provide a dict with db-specifiy key/value to be added to the backend config."""
+            if config.get('Backend', 'store') == 'log':
+                return {
+                    'db_path': config.get('Backend', 'db_path'),
+                    'log_compaction_threshold': get_log_compaction_threshold(),
+                }
+
             result = {}
             engine = config.get('Backend', 'db_engine')
             result = {'db_engine': engine}
             if engine == 'sqlite':
-                result.update({'db_path': config.get('Backend', 'db_path')})
+                result.update({
+                    'db_path': config.get('Backend', 'db_path'),
+                    'sqlite_pragmas': get_sqlite_pragmas(),
+                    'db_snapshot': get_db_snapshot(),
+                    'db_snapshot_save': get_db_snapshot_save(),
+                })
             else:
                 try:
                     result.update({'db_port': config.get('Backend', 'db_port')})
@@ -711,6 +3039,9 @@ def _get_config(config_instance):
                     'db_name': config.get('Backend', 'db_name'),
                     'db_user': config.get('Backend', 'db_user'),
                     'db_password': config.get('Backend', 'db_password'),
+                    'db_pool': get_db_pool(),
+                    'db_replica': get_db_replica(),
+                    'db_replica_staleness': get_db_replica_staleness(),
                 })
             return result
 
@@ -766,7 +3097,7 @@ def _write_config_file(file_path):
     # factory settings easily.
 
     def get_db_path():
-        return os.path.join(str(AppDirs.user_data_dir), 'hamster_cli.sqlite')
+        return os.path.join(str(AppDirs.user_data_dir), DEFAULT_DB_FILENAME)
 
     def get_tmp_file_path():
         return os.path.join(str(AppDirs.user_data_dir), 'hamster_cli.fact')
@@ -785,6 +3116,23 @@ def _write_config_file(file_path):
     config.set('Backend', 'db_path', get_db_path())
     config.set('Backend', 'db_user', '')
     config.set('Backend', 'db_password', '')
+    config.set('Backend', 'db_pool_size', '5')
+    config.set('Backend', 'db_pool_overflow', '10')
+    config.set('Backend', 'db_pool_recycle', '3600')
+    config.set('Backend', 'db_pool_timeout', '30')
+    config.set('Backend', 'db_pool_pre_ping', 'True')
+    config.set('Backend', 'replica_host', '')
+    config.set('Backend', 'replica_port', '')
+    config.set('Backend', 'replica_name', '')
+    config.set('Backend', 'replica_user', '')
+    config.set('Backend', 'replica_password', '')
+    config.set('Backend', 'replica_staleness', '10')
+    config.set('Backend', 'sqlite_profile', 'default')
+    for name, choices in SQLITE_PRAGMAS:
+        config.set('Backend', 'sqlite_{}'.format(name), '')
+    config.set('Backend', 'log_compaction_threshold', '1000')
+    config.set('Backend', 'db_snapshot', '')
+    config.set('Backend', 'db_snapshot_save', 'False')
 
     # Client
     config.add_section('Client')
@@ -792,6 +3140,18 @@ def _write_config_file(file_path):
     config.set('Client', 'log_level', 'debug')
     config.set('Client', 'log_console', 'False')
     config.set('Client', 'log_filename', 'hamster_cli.log')
+    config.set('Client', 'log_format', 'text')
+    config.set('Client', 'log_max_bytes', '1048576')
+    config.set('Client', 'log_backup_count', '3')
+    config.set('Client', 'write_behind', 'False')
+    config.set('Client', 'fact_overlap', 'reject')
+    config.set('Client', 'write_retries', '5')
+    config.set('Client', 'write_retry_delay', '0.05')
+    config.set('Client', 'write_retry_max_delay', '2.0')
+    config.set('Client', 'slow_query_threshold', '500')
+    config.set('Client', 'slow_query_redact', 'False')
+    config.set('Client', 'metrics', 'True')
+    config.set('Client', 'metrics_textfile', '')
 
     configfile_path = os.path.dirname(file_path)
     if not os.path.lexists(configfile_path):
@@ -802,6 +3162,1140 @@ def _write_config_file(file_path):
     return config
 
 
+def _get_engine(store):
+    """Return the SQLAlchemy engine used by ``store``."""
+    return store.session.get_bind()
+
+
+def _apply_sqlite_pragmas(store):
+    """
+    Make sure the configured ``sqlite_pragmas`` are applied to every new connection.
+
+    Args:
+        store (hamster_lib.storage.BaseStore): Store whose engine we configure. Anything
+            but a ``sqlalchemy`` store using ``sqlite`` is left untouched.
+    """
+    config = store.config
+    pragmas = config.get('sqlite_pragmas')
+    if config['store'] != 'sqlalchemy' or config['db_engine'] != 'sqlite' or not pragmas:
+        return
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute('PRAGMA {name} = {value}'.format(name=name, value=value))
+        cursor.close()
+
+    engine = _get_engine(store)
+    event.listen(engine, 'connect', set_pragmas)
+    if config['db_path'] == ':memory:':
+        # Disposing the pool would throw away the database itself. There is only ever
+        # this one connection so we configure it right away.
+        connection = engine.raw_connection()
+        set_pragmas(connection, None)
+        connection.close()
+    else:
+        # Setting up the store already opened connections we want to get rid off.
+        engine.dispose()
+
+
+def _create_facts_end_index(store):
+    """
+    Make sure the index of ``facts.end`` exists, as each new fact is checked for overlaps.
+
+    Databases other than sqlite and PostgreSQL lack ``CREATE INDEX IF NOT EXISTS``, there
+    the index is left to ``db optimize``.
+    """
+    if store.config['store'] != 'sqlalchemy':
+        return
+    engine = _get_engine(store)
+    if engine.name not in ('sqlite', 'postgresql'):
+        return
+    name, table, columns = FACTS_END_INDEX
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as connection:
+        connection.execute(text('CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'
+            .format(name=quote(name), table=quote(table),
+                columns=', '.join(quote(column) for column in columns))))
+
+
+def _load_snapshot(store):
+    """
+    Seed the in-memory database of ``store`` from its configured ``db_snapshot``.
+
+    A missing snapshot file is not an error, we just start out empty. If
+    ``db_snapshot_save`` is enabled it will be created on exit.
+    """
+    config = store.config
+    path = config.get('db_snapshot')
+    if config['store'] != 'sqlalchemy' or not path or not os.path.exists(path):
+        return
+    timer = timeit.default_timer()
+    if SNAPSHOT_FORMATS[os.path.splitext(path)[1].lower()] == 'sqlite':
+        source = sqlite3.connect(path)
+        connection = _get_engine(store).raw_connection()
+        try:
+            _copy_sqlite_database(source, connection.connection)
+        finally:
+            connection.close()
+            source.close()
+    else:
+        datetime_format = '%Y-%m-%d %H:%M:%S'
+        with codecs.open(path, encoding='utf-8') as fobj:
+            reader = csv.reader(fobj, dialect='excel-tab')
+            next(reader, None)
+            for start, end, activity, category, description, duration in reader:
+                if category:
+                    category = Category(category)
+                else:
+                    category = None
+                store.facts.save(Fact(Activity(activity, category=category),
+                    datetime.datetime.strptime(start, datetime_format),
+                    datetime.datetime.strptime(end, datetime_format),
+                    description=description or None))
+    logging.getLogger('hamster_cli').debug(_("Loaded snapshot {path} in {time:.1f} ms.".format(
+        path=path, time=(timeit.default_timer() - timer) * 1000)))
+
+
+def _save_snapshot(controler):
+    """
+    Write the in-memory database of ``controler`` back to its ``db_snapshot``.
+
+    The snapshot is replaced atomically, so a crash while writing leaves the previous
+    one intact.
+    """
+    path = controler.config['db_snapshot']
+    tmp_path = '{}.tmp'.format(path)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    if SNAPSHOT_FORMATS[os.path.splitext(path)[1].lower()] == 'sqlite':
+        target = sqlite3.connect(tmp_path)
+        connection = _get_engine(controler.store).raw_connection()
+        try:
+            _copy_sqlite_database(connection.connection, target)
+        finally:
+            connection.close()
+            target.close()
+    else:
+        reports.TSVWriter(tmp_path).write_report(controler.facts.get_all())
+    os.rename(tmp_path, path)
+    controler.client_logger.debug(_("Saved snapshot to {}.".format(path)))
+
+
+def _copy_sqlite_database(source, target):
+    """Replace the contents of the sqlite database ``target`` by those of ``source``."""
+    if hasattr(source, 'backup'):
+        source.backup(target)
+        return
+    # ``Connection.backup`` is only available from python 3.7 onwards. Replaying a dump
+    # is slower, but works anywhere.
+    script = '\n'.join(source.iterdump())
+    tables = [name for name, in target.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    for name in tables:
+        target.execute('DROP TABLE "{}"'.format(name.replace('"', '""')))
+    target.commit()
+    target.executescript(script)
+    target.commit()
+
+
+def _apply_connection_pool(store):
+    """
+    Replace the engine of ``store`` by one using our configured connection pool.
+
+    ``hamster_lib`` creates its engine without any pool settings, so all we can do is
+    swap it for a new one once the store is set up.
+
+    Args:
+        store (hamster_lib.storage.BaseStore): Store whose engine we replace. Anything
+            but a ``sqlalchemy`` store using a server based ``db_engine`` is left untouched.
+    """
+    config = store.config
+    pool = config.get('db_pool')
+    if config['store'] != 'sqlalchemy' or config['db_engine'] == 'sqlite' or not pool:
+        return
+    old_engine = _get_engine(store)
+    store.session.bind = _create_pooled_engine(store._get_db_url(), pool)
+    old_engine.dispose()
+
+
+def _create_pooled_engine(url, pool):
+    """
+    Return an engine for ``url`` using a ``TimedQueuePool``.
+
+    The time it takes to establish each new connection is written to the debug log.
+
+    Args:
+        url (str): Database URL.
+        pool (dict): Pool related keyword arguments for ``create_engine``.
+    """
+    logger = logging.getLogger('hamster_cli')
+    engine = create_engine(url, poolclass=TimedQueuePool, **pool)
+
+    def before_connect(dialect, connection_record, cargs, cparams):
+        connection_record.info['connect_timer'] = timeit.default_timer()
+
+    def after_connect(dbapi_connection, connection_record):
+        timer = connection_record.info.pop('connect_timer', None)
+        if timer is not None:
+            logger.debug(_("New database connection established in {:.1f} ms.".format(
+                (timeit.default_timer() - timer) * 1000)))
+
+    event.listen(engine, 'do_connect', before_connect)
+    event.listen(engine, 'connect', after_connect)
+    return engine
+
+
+def _use_replica(controler):
+    """
+    Route all further queries of ``controler`` to the read replica, if one is configured.
+
+    Only purely read-only commands should call this. If we wrote to the database
+    ourselves less than ``db_replica_staleness`` seconds ago the replica may not have
+    caught up yet, so we stick with the primary in that case.
+    """
+    config = controler.config
+    replica = config.get('db_replica')
+    if not replica:
+        return
+    try:
+        last_write = os.path.getmtime(controler.client_config['last_write_path'])
+    except OSError:
+        last_write = None
+    if last_write and time.time() - last_write < config['db_replica_staleness']:
+        controler.client_logger.debug(_("Recent local write, reading from the primary."))
+        return
+
+    url = '{engine}://{user}:{password}@{host}{port}/{name}'.format(
+        engine=config['db_engine'], user=replica['user'], password=replica['password'],
+        host=replica['host'], port=':{}'.format(replica['port']) if replica['port'] else '',
+        name=replica['name'])
+    controler.store.session.bind = _create_pooled_engine(url, config['db_pool'])
+    _apply_slow_query_log(controler)
+    controler.client_logger.debug(_("Reading from replica on {}.".format(replica['host'])))
+
+
+def _record_local_write(controler):
+    """Remember that we just wrote to the database. See ``_use_replica``."""
+    path = controler.client_config['last_write_path']
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+def _apply_slow_query_log(controler):
+    """
+    Log all statements of ``controler``'s engine that take ``slow_query_threshold`` or longer.
+
+    We time statements between SQLAlchemy's ``before_cursor_execute`` and
+    ``after_cursor_execute`` events. Drivers such as ``sqlite3`` compute rows as they
+    are fetched, which is not included. Slow statements are written to our client
+    logger as well as to our slow query log, see ``details --queries``.
+    """
+    threshold = controler.client_config.get('slow_query_threshold')
+    if controler.config['store'] != 'sqlalchemy' or not threshold:
+        return
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.slow_query_timer = timeit.default_timer()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timer = getattr(context, 'slow_query_timer', None)
+        if timer is None:
+            return
+        duration = (timeit.default_timer() - timer) * 1000
+        if duration >= threshold:
+            _log_slow_query(controler, statement, parameters, duration,
+                cursor.rowcount if cursor.rowcount >= 0 else None)
+
+    engine = _get_engine(controler.store)
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def _log_slow_query(controler, statement, parameters, duration, rows):
+    """
+    Write a slow statement to our client logger and append it to our slow query log.
+
+    Args:
+        statement (str): SQL statement.
+        parameters: Parameters the statement was executed with. Replaced by ``?`` if
+            ``slow_query_redact`` is enabled.
+        duration (float): Milliseconds the statement took to execute.
+        rows (int): Number of rows affected. ``None`` if unknown, e.g. for queries.
+    """
+    if controler.client_config['slow_query_redact']:
+        parameters = '?'
+    else:
+        parameters = repr(parameters)
+    controler.client_logger.warning(_(
+        "Slow query ({duration:.1f} ms, {rows} rows): {statement} {parameters}".format(
+            duration=duration, rows='?' if rows is None else rows,
+            statement=' '.join(statement.split()), parameters=parameters)
+    ), extra={'duration_ms': round(duration, 3)})
+    path = controler.client_config['slow_query_log_path']
+    line = json.dumps({
+        'time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'statement': statement,
+        'parameters': parameters,
+        'duration': round(duration, 3),
+        'rows': rows,
+    }) + '\n'
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+    if os.path.getsize(path) > SLOW_QUERY_LOG_MAX_SIZE:
+        entries = _read_slow_query_log(controler)
+        tmp_path = '{}.{}'.format(path, os.getpid())
+        with codecs.open(tmp_path, 'w', encoding='utf-8') as fobj:
+            for entry in entries:
+                fobj.write(json.dumps(entry) + '\n')
+        os.rename(tmp_path, path)
+
+
+def _read_slow_query_log(controler):
+    """
+    Return the most recent ``SLOW_QUERY_LOG_ENTRIES`` entries of our slow query log.
+
+    Lines that can not be parsed, e.g. because they have only been written partially,
+    are skipped.
+    """
+    entries = []
+    try:
+        with codecs.open(controler.client_config['slow_query_log_path'],
+                encoding='utf-8') as fobj:
+            for line in fobj:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except IOError:
+        pass
+    return entries[-SLOW_QUERY_LOG_ENTRIES:]
+
+
+def _get_sqlite_pragmas(engine):
+    """
+    Return the effective values of all ``SQLITE_PRAGMAS`` for a new connection of ``engine``.
+
+    Returns:
+        list: ``(name, value)`` tuples. Enumerated values are translated to their names.
+            Settings that do not apply to this database are omitted.
+    """
+    result = []
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for name, choices in SQLITE_PRAGMAS:
+            cursor.execute('PRAGMA {}'.format(name))
+            row = cursor.fetchone()
+            if row is None:
+                # Not applicable, e.g. ``mmap_size`` for in memory databases.
+                continue
+            value = row[0]
+            if name in ('synchronous', 'temp_store'):
+                value = choices[value]
+            result.append((name, value))
+        cursor.close()
+    finally:
+        connection.close()
+    return result
+
+
+def _get_facts(controler, **kwargs):
+    """
+    Return facts from our main store as well as from any relevant archive partition.
+
+    Partitions are only opened if the requested time range reaches into their year.
+    Without any ``start`` that means all partitions are searched. Facts still waiting
+    in our write-behind journal are included as well.
+
+    Args:
+        **kwargs: Passed on to ``FactManager.get_all`` unaltered.
+
+    Returns:
+        list: Facts matching the query. Sorted by start if any partition or journal entry
+            was included.
+    """
+    facts = controler.facts.get_all(**kwargs)
+    pending = _get_journal_facts(controler, **kwargs)
+    if pending:
+        stored = set((fact.start, fact.activity.name) for fact in facts)
+        facts = facts + [fact for fact in pending if
+            (fact.start, fact.activity.name) not in stored]
+        facts = sorted(facts, key=lambda fact: fact.start)
+
+    def get_year(value):
+        if isinstance(value, datetime.date):
+            return value.year
+        return datetime.date.today().year
+
+    start, end = kwargs.get('start'), kwargs.get('end')
+    years = [year for year in _get_partition_years(controler) if (
+        (start is None or year >= get_year(start)) and (end is None or year <= get_year(end)))]
+    if not years:
+        return facts
+
+    for year in years:
+        partition = _get_partition(controler, year)
+        facts.extend(partition.facts.get_all(**kwargs))
+    return sorted(facts, key=lambda fact: fact.start)
+
+
+def _get_fact_intervals(controler, start=None, end=None, names=False):
+    """
+    Return ``(start, end)`` of all facts sharing any time with ``start`` to ``end``.
+
+    Unlike ``_get_facts`` we do not create any ``Fact`` instances for ``sqlalchemy``
+    stores but just fetch the columns we need, straight from the database driver.
+    Converting each value to a ``datetime`` would take longer than the query itself.
+    Archive partitions and facts still waiting in our write-behind journal are included
+    as well.
+
+    Args:
+        start (datetime.datetime, optional): Start of our timeframe. Open if ``None``.
+        end (datetime.datetime, optional): End of our timeframe. Open if ``None``.
+        names (bool): Add the names of each fact's activity and category.
+
+    Returns:
+        list: ``(start, end)`` or ``(start, end, activity, category)`` tuples in no
+            particular order. Dates are ``datetime`` instances or, for sqlite databases,
+            their ISO format (see ``_to_datetime``). Missing categories are ``None``.
+    """
+    def get_values(fact):
+        values = (fact.start, fact.end)
+        if names:
+            values += (fact.activity.name, fact.category.name if fact.category else None)
+        return values
+
+    def get_intervals(control):
+        if control.config['store'] != 'sqlalchemy':
+            if start and end:
+                facts = control.facts.get_overlapping(start, end)
+            else:
+                facts = control.facts._get_all(start, end, partial=True)
+            return [get_values(fact) for fact in facts]
+        table = alchemy_objects.facts
+        if names:
+            activities, categories = alchemy_objects.activities, alchemy_objects.categories
+            query = select([table.c.start, table.c.end, activities.c.name,
+                categories.c.name]).select_from(table.join(activities).outerjoin(categories))
+        else:
+            query = select([table.c.start, table.c.end])
+        if end:
+            query = query.where(table.c.start <= end)
+        if start:
+            query = query.where(table.c.end >= start)
+        result = control.store.session.execute(query)
+        try:
+            return result.cursor.fetchall()
+        finally:
+            result.close()
+
+    intervals = get_intervals(controler)
+    intervals.extend(get_values(fact) for fact in _get_journal_facts(controler)
+        if (end is None or fact.start <= end) and (start is None or fact.end >= start))
+    for year in _get_partition_years(controler):
+        if (start is None or start.year <= year) and (end is None or year <= end.year):
+            intervals.extend(get_intervals(_get_partition(controler, year)))
+    return intervals
+
+
+def _to_datetime(value):
+    """
+    Return ``value`` as returned by ``_get_fact_intervals`` as ``datetime``.
+
+    sqlite stores datetimes as text. Both ``fromisoformat`` and picking it apart
+    ourselves are several times faster than ``strptime``.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except AttributeError:
+        # ``fromisoformat`` is only available from python 3.7 onwards.
+        return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19]), int(value[20:26] or 0))
+
+
+def _serialize_fact(fact):
+    """Return a JSON serializable ``dict`` representing ``fact``."""
+    return {
+        'activity': fact.activity.name,
+        'category': fact.category.name if fact.category else None,
+        'start': fact.start.strftime(JOURNAL_DATETIME_FORMAT),
+        'end': fact.end.strftime(JOURNAL_DATETIME_FORMAT),
+        'description': fact.description,
+        'tags': sorted(getattr(tag, 'name', tag) for tag in fact.tags),
+    }
+
+
+def _deserialize_fact(data):
+    """Return a new ``Fact`` from a ``dict`` created by ``_serialize_fact``."""
+    if data['category']:
+        category = Category(data['category'])
+    else:
+        category = None
+    return Fact(Activity(data['activity'], category=category),
+        datetime.datetime.strptime(data['start'], JOURNAL_DATETIME_FORMAT),
+        datetime.datetime.strptime(data['end'], JOURNAL_DATETIME_FORMAT),
+        description=data['description'], tags=[Tag(tag) for tag in data['tags']])
+
+
+def _journal_fact(controler, fact):
+    """
+    Append ``fact`` to our write-behind journal.
+
+    The entry is a single line written with one ``write`` call to a file opened in
+    append mode, so concurrent processes will not garble each others entries. We fsync
+    before returning so the fact survives a crash.
+    """
+    line = json.dumps(_serialize_fact(fact), sort_keys=True) + '\n'
+    # Hold the journal lock, so ``_apply_journal`` does not claim it halfway through.
+    with _journal_locked(controler):
+        fd = os.open(controler.client_config['journal_path'],
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line.encode('utf-8'))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    controler.client_logger.debug(_("Added {fact} to the journal.".format(fact=fact)))
+
+
+def _get_journal_paths(controler):
+    """Return paths of the journal itself and of any journal currently being applied."""
+    path = controler.client_config['journal_path']
+    paths = sorted(glob.glob('{}.applying-*'.format(path)))
+    if os.path.exists(path):
+        paths.append(path)
+    return paths
+
+
+@contextmanager
+def _journal_locked(controler):
+    """Hold an exclusive advisory lock on our journal for the duration of the block."""
+    if fcntl is None:
+        yield
+        return
+    with open('{}.lock'.format(controler.client_config['journal_path']), 'a') as fobj:
+        fcntl.flock(fobj, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fobj, fcntl.LOCK_UN)
+
+
+def _get_claim_pid(path):
+    """Return the PID of the process that claimed the journal at ``path``, if any."""
+    try:
+        return int(path.rsplit('.applying-', 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _is_process_alive(pid):
+    """
+    Return whether a process with ``pid`` is running.
+
+    Where we can not tell, we assume it is, so we never take over a claim in use.
+    """
+    if pid is None:
+        return False
+    if os.name == 'nt':
+        # ``os.kill`` would terminate the process rather than probe it.
+        return True
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno != errno.ESRCH
+    return True
+
+
+def _get_rejected_journal_path(controler):
+    """Return path of the file collecting journal entries we failed to apply."""
+    return '{}.rejected'.format(controler.client_config['journal_path'])
+
+
+def _read_journal(controler, path):
+    """
+    Return all facts stored in the journal at ``path``.
+
+    Lines that can not be parsed, e.g. an incomplete last line after a crash, are
+    skipped with a warning.
+    """
+    facts = []
+    with codecs.open(path, encoding='utf-8') as fobj:
+        for line in fobj:
+            try:
+                facts.append(_deserialize_fact(json.loads(line)))
+            except (ValueError, KeyError, TypeError):
+                controler.client_logger.warning(_(
+                    "Skipping malformed journal entry: {line!r}".format(line=line)))
+    return facts
+
+
+def _get_journal_facts(controler, start=None, end=None, filter_term=''):
+    """
+    Return all facts still waiting in our write-behind journal that match the query.
+
+    The arguments mirror those of ``FactManager.get_all``.
+    """
+    paths = _get_journal_paths(controler)
+    if not paths:
+        return []
+    if isinstance(start, datetime.date) and not isinstance(start, datetime.datetime):
+        start = datetime.datetime.combine(start, datetime.time.min)
+    if isinstance(end, datetime.date) and not isinstance(end, datetime.datetime):
+        end = datetime.datetime.combine(end, datetime.time.max)
+    filter_term = (filter_term or '').lower()
+
+    facts = []
+    for path in paths:
+        for fact in _read_journal(controler, path):
+            if start and fact.start < start:
+                continue
+            if end and fact.end > end:
+                continue
+            names = [fact.activity.name.lower()]
+            if fact.category:
+                names.append(fact.category.name.lower())
+            if filter_term and not any(filter_term in name for name in names):
+                continue
+            facts.append(fact)
+    return facts
+
+
+def _apply_journal(controler):
+    """
+    Apply all pending journal entries to our store.
+
+    The journal is first claimed by renaming it to ``<journal>.applying-<pid>``, so
+    entries added meanwhile go to a fresh one. Claims of processes that died before
+    finishing are taken over as well, while those of processes still running are left
+    to them. Claiming happens under the journal lock, so no entry is ever claimed by
+    two processes. Entries already present in the store are skipped, which makes it
+    safe to apply a journal that was interrupted before. Entries the store refuses
+    (e.g. because they overlap an existing fact) are moved to a separate file instead
+    of being lost.
+
+    Returns:
+        tuple: ``(applied, rejected)`` counts.
+    """
+    path = controler.client_config['journal_path']
+    claimed = '{}.applying-{}'.format(path, os.getpid())
+    with _journal_locked(controler):
+        sources = [other for other in glob.glob('{}.applying-*'.format(path))
+            if other != claimed and not _is_process_alive(_get_claim_pid(other))]
+        if os.path.exists(path):
+            sources.append(path)
+        for source in sources:
+            if not os.path.exists(claimed):
+                os.rename(source, claimed)
+                continue
+            with open(source, 'rb') as fobj, open(claimed, 'ab+') as target:
+                # Do not glue the first entry to an incomplete last line.
+                target.seek(-1, os.SEEK_END)
+                if target.read(1) != b'\n':
+                    target.write(b'\n')
+                shutil.copyfileobj(fobj, target)
+            os.remove(source)
+    if not os.path.exists(claimed):
+        return (0, 0)
+
+    applied = rejected = 0
+    for fact in _read_journal(controler, claimed):
+        if _get_stored_fact(controler, fact) is not None:
+            continue
+        try:
+            _retry_on_locked(controler, controler.facts.save, fact,
+                applied=lambda: _get_stored_fact(controler, fact))
+        except ValueError as error:
+            if _get_stored_fact(controler, fact) is not None:
+                continue
+            controler.client_logger.error(_(
+                "Unable to apply journal entry {fact}: {error}".format(
+                    fact=fact, error=error)))
+            with codecs.open(_get_rejected_journal_path(controler), 'a',
+                    encoding='utf-8') as fobj:
+                fobj.write(json.dumps(_serialize_fact(fact), sort_keys=True) + '\n')
+            rejected += 1
+        else:
+            applied += 1
+    try:
+        os.remove(claimed)
+    except OSError as error:
+        if error.errno != errno.ENOENT:
+            raise
+
+    if applied:
+        _record_local_write(controler)
+        controler.client_logger.info(_("Applied {count} journal entries.".format(
+            count=applied)))
+    return (applied, rejected)
+
+
+def _apply_journal_quietly(controler):
+    """Apply our journal if there is one, but never let that stop the actual command."""
+    if not _get_journal_paths(controler):
+        return
+    try:
+        applied, rejected = _apply_journal(controler)
+    except (OperationalError, click.ClickException, IOError, OSError) as error:
+        controler.client_logger.warning(_(
+            "Unable to apply the journal right now: {error}".format(error=error)))
+    else:
+        if rejected:
+            click.echo(_(
+                "{count} journal entries could not be applied. They have been moved to:"
+                " {path}".format(count=rejected, path=_get_rejected_journal_path(controler))
+            ), err=True)
+
+
+def _get_partition_years(controler):
+    """Return the years for which there are archive partitions, in ascending order."""
+    pattern = os.path.join(controler.client_config['archive_path'],
+        ARCHIVE_PARTITION_FILENAME.format(year='[0-9]' * 4))
+    years = []
+    for path in glob.glob(pattern):
+        years.append(int(os.path.basename(path).split('-')[1].split('.')[0]))
+    return sorted(years)
+
+
+def _get_archive_years(controler, before):
+    """Return the years facts ending before ``before`` start in, from our sqlite store."""
+    query = text('SELECT DISTINCT substr(start, 1, 4) FROM facts WHERE "end" <= :before')
+    rows = controler.store.session.execute(query, {
+        'before': before.strftime(JOURNAL_DATETIME_FORMAT)}).fetchall()
+    return sorted(int(row[0]) for row in rows)
+
+
+def _move_to_partition(controler, partition, year, before):
+    """
+    Move all facts of ``year`` ending before ``before`` from our sqlite store to ``partition``.
+
+    The partition is attached to our database, so copying the facts along with their
+    categories, activities and tags and removing them from our store happens in a single
+    transaction with one statement each (see ``ARCHIVE_STATEMENTS``). In WAL mode
+    sqlite only commits each database atomically on its own. If we crash in between,
+    the facts are in both, and the next run just removes them from our store.
+
+    Returns:
+        int: Number of facts moved.
+    """
+    # Make sure neither store is within a transaction meanwhile, ``ATTACH`` is not
+    # allowed within one.
+    partition.store.session.close()
+    _get_engine(partition.store).dispose()
+    controler.store.session.commit()
+    params = {
+        'before': before.strftime(JOURNAL_DATETIME_FORMAT),
+        'first': datetime.datetime(year, 1, 1).strftime(JOURNAL_DATETIME_FORMAT),
+        'next': datetime.datetime(year + 1, 1, 1).strftime(JOURNAL_DATETIME_FORMAT),
+    }
+    connection = _get_engine(controler.store).connect()
+    try:
+        connection.execute(text('ATTACH DATABASE :path AS archive'),
+            {'path': partition.config['db_path']})
+        try:
+            with connection.begin():
+                for statement in ARCHIVE_STATEMENTS:
+                    result = connection.execute(text(statement), params)
+        finally:
+            connection.execute(text('DETACH DATABASE archive'))
+    finally:
+        connection.close()
+    return result.rowcount
+
+
+def _get_partition(controler, year):
+    """
+    Return a ``HamsterControl`` for the archive partition of ``year``.
+
+    The partition is created if it does not exist yet.
+    """
+    archive_path = controler.client_config['archive_path']
+    if not os.path.lexists(archive_path):
+        os.makedirs(archive_path)
+    config = dict(controler.config)
+    config.update({
+        'store': 'sqlalchemy',
+        'db_engine': 'sqlite',
+        'db_path': os.path.join(archive_path, ARCHIVE_PARTITION_FILENAME.format(year=year)),
+    })
+    return HamsterControl(config)
+
+
+def _copy_fact(fact):
+    """Return a copy of ``fact`` without any primary keys, ready to be added to another store."""
+    if fact.category:
+        category = Category(fact.category.name)
+    else:
+        category = None
+    return Fact(Activity(fact.activity.name, category=category), fact.start, fact.end,
+        description=fact.description,
+        tags=[Tag(getattr(tag, 'name', tag)) for tag in fact.tags])
+
+
+def _retry_on_locked(controler, func, *args, **kwargs):
+    """
+    Call ``func`` and retry with jittered exponential backoff while the database is locked.
+
+    Several processes writing to the same sqlite database will run into each other
+    every now and then. Instead of failing right away we retry up to
+    ``client_config['write_retries']`` times. The n-th retry waits a random time
+    between 0 and ``write_retry_delay * 2 ** (n - 1)`` seconds, capped at
+    ``write_retry_max_delay``.
+
+    Processes saving facts with the same new category, activity or tag at once race to
+    create it, and all but one run into a unique constraint. That is retried the same
+    way, by then the entry exists and will just be used.
+
+    A locked database may also be reported *after* the actual write has been committed,
+    for example when the backend reads the new entry back. Retrying blindly would then
+    try to write the same thing twice. If ``applied`` is passed, it is called before
+    each retry and if it returns anything but ``None`` we consider the write done.
+
+    Args:
+        func (callable): Function doing the actual write.
+        applied (callable, optional): Returns the result of a write that has already
+            happened or ``None``.
+
+    Returns:
+        Whatever ``func`` (or ``applied``) returns.
+
+    Raises:
+        click.ClickException: If the database is still locked after our last retry.
+    """
+    applied = kwargs.pop('applied', None)
+    retries = controler.client_config['write_retries']
+    delay = controler.client_config['write_retry_delay']
+    max_delay = controler.client_config['write_retry_max_delay']
+    attempt = 0
+    waited = 0.0
+    while True:
+        attempt += 1
+        try:
+            result = None
+            if attempt > 1 and applied:
+                result = applied()
+            if result is None:
+                result = func(*args, **kwargs)
+        except (OperationalError, IntegrityError, ValueError) as error:
+            if not _is_retryable_error(error):
+                raise
+            # The failed transaction needs to be discarded before we can try again.
+            controler.store.session.rollback()
+            if attempt > retries:
+                message = _(
+                    "The database is still locked after {attempts} attempts and {waited:.3f}s"
+                    " of waiting. Giving up.".format(attempts=attempt, waited=waited)
+                )
+                controler.client_logger.error(message)
+                raise click.ClickException(message)
+            wait = random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+            controler.client_logger.debug(_(
+                "Database is locked (attempt {attempt}). Retrying in {wait:.3f}s.".format(
+                    attempt=attempt, wait=wait)
+            ))
+            time.sleep(wait)
+            waited += wait
+        else:
+            if attempt > 1:
+                controler.client_logger.info(_(
+                    "Write succeeded after {attempts} attempts and {waited:.3f}s of"
+                    " waiting.".format(attempts=attempt, waited=waited)
+                ))
+            return result
+
+
+def _is_retryable_error(error):
+    """
+    Return whether ``error`` is a locked database or a lost race to create an entry.
+
+    hamster-lib turns some unique constraint violations into a ``ValueError``. We tell
+    those apart by the ``IntegrityError`` they were raised from, or its message, as
+    exceptions are not chained on python 2.
+    """
+    if isinstance(error, OperationalError):
+        return 'locked' in str(error)
+    if isinstance(error, ValueError):
+        cause = getattr(error, '__context__', None)
+        if not isinstance(cause, IntegrityError) and 'IntegrityError' not in str(error):
+            return False
+    message = str(error).lower()
+    return 'unique' in message or 'duplicate' in message
+
+
+def _get_overlapping_facts(controler, start, end):
+    """
+    Return all stored facts sharing any point in time with ``start`` to ``end``.
+
+    Just like our backends, we consider facts touching each other as overlapping.
+    We do not assume stored facts to be free of overlaps, legacy databases or facts
+    saved by other paths may well overlap each other. New facts usually lie close to
+    the present, so few facts end after them and the index of ``facts.end`` (see
+    ``_create_facts_end_index``) narrows the query down to a handful of candidates.
+
+    Returns:
+        list: Overlapping facts ordered by start.
+    """
+    if controler.config['store'] != 'sqlalchemy':
+        return controler.facts.get_overlapping(start, end)
+
+    AlchemyFact = alchemy_objects.AlchemyFact
+    # Ordering by start in the query would lure sqlite into the index of ``facts.start``.
+    query = controler.store.session.query(AlchemyFact).filter(
+        AlchemyFact.start <= end, AlchemyFact.end >= start)
+    return sorted((fact.as_hamster() for fact in query.all()), key=lambda fact: fact.start)
+
+
+def _check_min_delta(controler, fact):
+    """
+    Make sure ``fact`` lasts at least ``fact_min_delta`` seconds, just like ``save`` does.
+
+    Raises:
+        click.ClickException: If ``fact`` is shorter than that.
+    """
+    min_delta = datetime.timedelta(seconds=int(controler.config['fact_min_delta']))
+    if fact.delta and fact.delta < min_delta:
+        message = _("The fact is shorter than the mandatory value of {} specified in your"
+            " config.".format(min_delta))
+        controler.client_logger.info(message)
+        raise click.ClickException(message)
+
+
+def _resolve_overlap(controler, fact):
+    """
+    Make sure ``fact`` does not overlap any stored fact before we save it.
+
+    Depending on ``fact_overlap`` overlapping facts are either rejected or ``fact`` is
+    trimmed to the time between them. We never split a fact, so if any stored fact lies
+    within ``fact`` or there is nothing left after trimming, it is rejected either way.
+    Facts still waiting in our write-behind journal count as stored.
+
+    Returns:
+        hamster_lib.Fact: ``fact``, trimmed if needed.
+
+    Raises:
+        click.ClickException: If ``fact`` overlaps stored facts and can not be trimmed.
+    """
+    overlapping = _get_overlapping_facts(controler, fact.start, fact.end)
+    overlapping.extend(other for other in _get_journal_facts(controler)
+        if other.start <= fact.end and other.end >= fact.start)
+    if not overlapping:
+        return fact
+
+    def reject():
+        message = _("The fact overlaps existing facts: {facts}".format(facts=', '.join(
+            '{} - {} {}'.format(other.start, other.end, other.activity.name)
+            for other in overlapping)))
+        controler.client_logger.info(message)
+        raise click.ClickException(message)
+
+    if controler.client_config['fact_overlap'] != 'trim':
+        reject()
+    # Backends reject facts sharing a boundary as well, so we keep a second apart.
+    margin = datetime.timedelta(seconds=1)
+    start, end = fact.start, fact.end
+    for other in overlapping:
+        if other.start <= fact.start:
+            start = max(start, other.end + margin)
+        elif other.end >= fact.end:
+            end = min(end, other.start - margin)
+        else:
+            reject()
+    if start >= end:
+        reject()
+    fact.start, fact.end = start, end
+    click.echo(_("Trimmed fact to {start} - {end} to not overlap existing facts.".format(
+        start=start, end=end)))
+    return fact
+
+
+def _get_stored_fact(controler, fact):
+    """
+    Return the stored fact with the same start and activity as ``fact``.
+
+    If ``fact`` has no end (e.g. an *ongoing fact*) any end will do.
+
+    Returns:
+        hamster_lib.Fact or None: The stored fact if there is one.
+    """
+    for stored in controler.facts.get_all(start=fact.start, end=fact.end):
+        if stored.start == fact.start and stored.activity.name == fact.activity.name and (
+                not fact.end or stored.end == fact.end):
+            return stored
+    return None
+
+
+def _time_reference_query(controler):
+    """
+    Return the time in seconds it takes to fetch all facts of the last few days.
+
+    For ``sqlalchemy`` stores the session is reset first so we do not just measure its
+    identity map.
+    """
+    if controler.config['store'] == 'sqlalchemy':
+        controler.store.session.close()
+    end = datetime.datetime.now()
+    start = end - datetime.timedelta(days=OPTIMIZE_REFERENCE_DAYS)
+    timer = timeit.default_timer()
+    controler.facts.get_all(start=start, end=end)
+    return timeit.default_timer() - timer
+
+
+def _get_export_compressor(path):
+    """
+    Return the compressing file class matching the suffix of ``path``.
+
+    Returns:
+        type or None: A ``GzipFile`` like class or ``None`` if no compression is wanted.
+
+    Raises:
+        click.ClickException: If the requested compression is not available.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix not in COMPRESSED_EXPORT_SUFFIXES:
+        return None
+    if suffix == '.xz' and not lzma:
+        raise click.ClickException(_("'xz' compression requires the 'lzma' module."))
+    return {
+        '.gz': gzip.GzipFile,
+        '.bz2': bz2.BZ2File,
+        '.xz': getattr(lzma, 'LZMAFile', None),
+    }[suffix]
+
+
+@contextmanager
+def _export_target(path):
+    """
+    Provide something our report writers can ``open`` in order to export to ``path``.
+
+    Plain file paths are passed on unchanged. For ``-`` (stdout) and compressed paths
+    the writer gets the write end of a pipe instead, see ``_get_fd_target``. Whatever it
+    writes there is streamed to stdout or through the compressor by a background
+    thread, so no uncompressed intermediate file is ever written to disk.
+
+    Args:
+        path (str): Export destination as passed by the user.
+
+    Yields:
+        str or int: Path or file descriptor to be passed to the report writer.
+
+    Raises:
+        click.ClickException: If writing to the final destination failed or is not
+            supported on this platform.
+    """
+    if path != '-' and not _get_export_compressor(path):
+        yield path
+        return
+    if sys.version_info < (3,) and not os.path.isdir(DEV_FD_PATH):
+        raise click.ClickException(_(
+            "Exporting to stdout or to compressed files requires python 3 on this"
+            " platform."))
+    if path == '-':
+        sink = click.get_binary_stream('stdout')
+        close_sink = False
+    else:
+        sink = _get_export_compressor(path)(path, 'wb')
+        close_sink = True
+
+    errors = []
+    read_fd, write_fd = os.pipe()
+    # Writers close the file they opened. Handing out a duplicate means we keep
+    # control over our end of the pipe no matter what the writer does.
+    writer_fd = os.dup(write_fd)
+    pipe = os.fstat(write_fd)
+    pump = threading.Thread(target=_pump_export_stream,
+        args=(read_fd, sink, close_sink, errors))
+    pump.daemon = True
+    pump.start()
+    try:
+        yield _get_fd_target(writer_fd)
+    finally:
+        # The pump only stops once every write end is closed, including the one of
+        # a writer that failed before opening it. Any exception of the writer takes
+        # precedence over errors of the pump.
+        os.close(write_fd)
+        _close_unclaimed_fd(writer_fd, pipe)
+        pump.join()
+    if errors:
+        raise click.ClickException(_("Failed to export facts to {path}: {error}".format(
+            path=path, error=errors[0])))
+
+
+def _get_fd_target(fd):
+    """
+    Return something the builtin ``open`` accepts in order to open the descriptor ``fd``.
+
+    That is its path below ``/dev/fd`` where there is one. Opening that path gives the
+    writer a descriptor of its own, which leaves ``fd`` to us. Elsewhere we can only
+    pass ``fd`` itself, which python 2 does not accept.
+    """
+    if os.path.isdir(DEV_FD_PATH):
+        return os.path.join(DEV_FD_PATH, str(fd))
+    return fd
+
+
+def _close_unclaimed_fd(fd, pipe):
+    """
+    Close ``fd`` if it still refers to ``pipe``.
+
+    Writers close whatever they opened, so if ``fd`` still is our pipe nobody ever
+    claimed it, or the writer opened a descriptor of its own. Otherwise it has been
+    closed already and its number may have been reused by now.
+    """
+    try:
+        stat = os.fstat(fd)
+    except OSError:
+        return
+    if (stat.st_dev, stat.st_ino) == (pipe.st_dev, pipe.st_ino):
+        os.close(fd)
+
+
+def _pump_export_stream(read_fd, sink, close_sink, errors):
+    """
+    Copy everything that arrives at ``read_fd`` to ``sink`` until the pipe is closed.
+
+    Any exception is collected in ``errors`` instead of being raised. We keep on
+    draining the pipe in that case, as the writer would block forever otherwise.
+    """
+    with os.fdopen(read_fd, 'rb') as source:
+        try:
+            shutil.copyfileobj(source, sink, EXPORT_CHUNK_SIZE)
+            if close_sink:
+                sink.close()
+            else:
+                sink.flush()
+        except (IOError, OSError, EOFError) as error:
+            errors.append(error)
+            while source.read(EXPORT_CHUNK_SIZE):
+                pass
+
+
+def _parse_time_range(controler, time_range):
+    """
+    Return ``(start, end)`` of ``time_range``, completed according to our config.
+
+    An empty ``time_range`` means ``(None, None)``.
+    """
+    if not time_range:
+        return (None, None)
+    # [FIXME]
+    # This is a rather crude fix. Recent versions of ``hamster-lib`` do not
+    # provide a dedicated helper to parse *just* time(ranges) but expect a
+    # ``raw_fact`` text. In order to work around this we just append
+    # whitespaces to our time range argument which will qualify for the
+    # desired parsing.
+    # Once raw_fact/time parsing has been refactored in hamster-lib, this
+    # should no longer be needed.
+    time_range = time_range + '  '
+    timeinfo = time_helpers.extract_time_info(time_range)[0]
+    return time_helpers.complete_timeframe(timeinfo, controler.config)
+
+
 def _generate_facts_table(facts):
     """
     Create a nice looking table representing a set of fact instances.
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of 'hamster_cli'.
+#
+# 'hamster_cli' is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# 'hamster_cli' is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with 'hamster_cli'.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Calendar heatmaps of tracked time based on ``numpy``.
+
+Facts are passed as two arrays of start and end times. Rather than splitting each fact
+at every day or hour boundary it crosses, we look at the total time tracked up to any
+point in time. That is a piecewise linear function we can evaluate for all boundaries
+at once from the sorted starts and ends and their cumulative sums. The time tracked
+within a bin is the difference of its boundaries. Facts crossing midnight or
+``day_start`` are thus split without ever looping over them.
+
+``numpy`` is an optional dependency and will only be imported once a heatmap is
+actually computed.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import datetime
+from gettext import gettext as _
+
+# Characters used for each intensity level. The first one marks days without any
+# tracked time.
+SHADES = ('·', '░', '▒', '▓', '█')
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def import_numpy():
+    """
+    Import ``numpy`` on demand.
+
+    Returns:
+        module: The ``numpy`` package.
+
+    Raises:
+        ImportError: If ``numpy`` is not installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(_(
+            "Heatmaps require 'numpy'. You can install it with"
+            " 'pip install hamster_cli[heatmap]'."
+        ))
+    return numpy
+
+
+def to_seconds(values):
+    """
+    Return ``values`` as ``int64`` array of seconds since the epoch.
+
+    Values may be naive datetimes or their ISO format, in any nesting.
+    """
+    np = import_numpy()
+    return np.array(values, dtype='datetime64[s]').astype('int64')
+
+
+def get_tracked_seconds(starts, ends, boundaries):
+    """
+    Return the time tracked between each pair of consecutive ``boundaries``.
+
+    Args:
+        starts (numpy.ndarray): Fact starts in seconds since the epoch.
+        ends (numpy.ndarray): Fact ends in seconds since the epoch.
+        boundaries (numpy.ndarray): Ascending boundaries of our bins in seconds since
+            the epoch.
+
+    Returns:
+        numpy.ndarray: Seconds tracked within each bin. One less than ``boundaries``.
+    """
+    np = import_numpy()
+
+    def get_cumulative(values, points):
+        # For each point the sum of ``point - value`` over all values before it.
+        values = np.sort(values)
+        sums = np.concatenate(([0], np.cumsum(values)))
+        counts = np.searchsorted(values, points, side='right')
+        return points * counts - sums[counts]
+
+    boundaries = np.asarray(boundaries, dtype='int64')
+    tracked = get_cumulative(starts, boundaries) - get_cumulative(ends, boundaries)
+    return np.diff(tracked)
+
+
+def get_daily_hours(starts, ends, first_day, last_day, day_start=datetime.time(0, 0)):
+    """
+    Return the hours tracked on each day from ``first_day`` to ``last_day``.
+
+    Days begin at ``day_start``, so with a ``day_start`` of '05:00' anything tracked
+    until 5 o'clock in the morning counts towards the previous day.
+
+    Returns:
+        numpy.ndarray: Hours tracked per day.
+    """
+    np = import_numpy()
+    offset = (day_start.hour * 60 + day_start.minute) * 60 + day_start.second
+    first = (datetime.datetime.combine(first_day, datetime.time(0, 0)) - EPOCH)
+    first = int(first.total_seconds()) + offset
+    count = (last_day - first_day).days + 1
+    boundaries = first + np.arange(count + 1, dtype='int64') * 86400
+    return get_tracked_seconds(starts, ends, boundaries) / 3600
+
+
+def get_hour_of_week_hours(starts, ends, start, end):
+    """
+    Return the hours tracked within each hour of the week from ``start`` to ``end``.
+
+    Returns:
+        numpy.ndarray: A 7 x 24 matrix, with Monday in the first row and the hour
+            from midnight to 1 o'clock in the first column.
+    """
+    np = import_numpy()
+    first = datetime.datetime.combine(start.date(), datetime.time(start.hour))
+    count = int((end - first).total_seconds() // 3600) + 1
+    boundaries = int((first - EPOCH).total_seconds()) + np.arange(count + 1,
+        dtype='int64') * 3600
+    # Only count the part of the first and last hour within our range.
+    limits = to_seconds([start, end])
+    tracked = get_tracked_seconds(starts, ends, np.clip(boundaries, limits[0], limits[1]))
+    slots = (np.arange(count) + first.weekday() * 24 + first.hour) % (7 * 24)
+    return (np.bincount(slots, weights=tracked, minlength=7 * 24) / 3600).reshape(7, 24)
+
+
+def get_levels(values):
+    """
+    Return the shade for each of ``values``.
+
+    Like GitHub we split all values above zero into quartiles. Zero is always shown as
+    our lowest shade.
+
+    Returns:
+        numpy.ndarray: Index into ``SHADES`` for each value.
+    """
+    np = import_numpy()
+    values = np.asarray(values, dtype='float64')
+    levels = np.zeros(values.shape, dtype='int64')
+    tracked = values > 0
+    if tracked.any():
+        thresholds = np.percentile(values[tracked], (25, 50, 75))
+        levels[tracked] = 1 + np.searchsorted(thresholds, values[tracked], side='right')
+    return levels
+
+
+def render_calendar(first_day, hours):
+    """
+    Render hours per day as a calendar with a row per weekday and a column per week.
+
+    Args:
+        first_day (datetime.date): Day the first value of ``hours`` belongs to.
+        hours (numpy.ndarray): Hours tracked per day.
+
+    Returns:
+        str: The calendar, its month labels and a legend.
+    """
+    np = import_numpy()
+    padding = first_day.weekday()
+    weeks = (padding + len(hours) + 6) // 7
+    cells = np.full(weeks * 7, ' ', dtype='U1')
+    cells[padding:padding + len(hours)] = np.array(SHADES)[get_levels(hours)]
+    grid = cells.reshape(weeks, 7).T
+
+    # Each month is labeled above the first week it shows up in, unless the label of
+    # the previous month is still in the way. A month we only see the end of in our
+    # first few weeks makes way for the next one.
+    months = []
+    for week in range(weeks):
+        day = max(first_day, first_day + datetime.timedelta(days=week * 7 - padding))
+        if not months or day.month != months[-1][1].month:
+            months.append((week, day))
+    if len(months) > 1 and months[1][0] < 4:
+        months.pop(0)
+    labels = ''
+    for week, day in months:
+        if not labels or len(labels) < week:
+            labels = labels.ljust(week) + day.strftime('%b')
+    lines = ['    ' + labels]
+    for weekday, row in zip(WEEKDAYS, grid):
+        lines.append('{} {}'.format(weekday, ''.join(row)))
+    lines.append('')
+    lines.append(_("{total:.1f} hours on {days} of {count} days. Less {shades} More".format(
+        total=float(hours.sum()), days=int((hours > 0).sum()), count=len(hours),
+        shades=''.join(SHADES))))
+    return '\n'.join(lines)
+
+
+def render_hour_of_week(hours):
+    """
+    Render a 7 x 24 matrix of hours as grid with a row per weekday and a column per hour.
+
+    Returns:
+        str: The grid and its hour labels.
+    """
+    np = import_numpy()
+    shades = np.array(SHADES)[get_levels(hours)]
+    labels = ''.join('{:<3}'.format(hour) for hour in range(0, 24, 3))
+    lines = ['    ' + labels.rstrip()]
+    for weekday, row in zip(WEEKDAYS, shades):
+        lines.append('{} {}'.format(weekday, ''.join(row)))
+    return '\n'.join(lines)
@@ -124,6 +124,9 @@ START_HELP = _(
     END:
     When does the fact end? When specified this will override any end information
     present in the *raw fact*.
+
+    Facts overlapping existing ones are rejected. With 'fact_overlap = trim'
+    in your config they are trimmed to the time between existing facts instead.
     """
 )
 
@@ -138,16 +141,76 @@ CANCEL_HELP = _(
 )
 
 
+FLUSH_HELP = _(
+    """
+    Apply all pending entries of the write-behind journal.
+
+    If 'write_behind' is enabled, 'start' and 'stop' only write to a local
+    journal and return right away. The journal is applied by the next command
+    that is neither 'start' nor 'stop' or explicitly by using this command.
+    """
+)
+
+
 EXPORT_HELP = _(
     """
     Export all facts of within a given timewindow to a file of specified format.
 
-    FORMAT: Export format. Currently supported options are: 'csv', 'xml' and
-    'ical'. Defaults to ``csv``.
+    FORMAT: Export format. Currently supported options are: 'csv', 'xml',
+    'ical', 'parquet' and 'arrow'. Defaults to ``csv``. The columnar 'parquet'
+    and 'arrow' formats require 'pyarrow' to be installed.
 
     START: Start of timewindow.
 
     END: End of timewindow.
+
+    By default facts are exported to our data directory. Use '--output' to pick
+    another path instead or pass '-' to write the export to stdout. If the path
+    ends in '.gz', '.bz2' or '.xz' the export will be compressed on the fly.
+    """
+)
+
+
+ARCHIVE_HELP = _(
+    """
+    Move old facts into yearly archive partitions.
+
+    All facts ending before the date passed with '--before' are moved out of
+    your database into one sqlite file per year. 'list', 'search' and 'export'
+    will still find them, but only open an archive if the requested time range
+    reaches into its year. This keeps your main database small and fast.
+    """
+)
+
+
+BENCH_HELP = _(
+    """
+    Time common operations against a throwaway database of generated facts.
+
+    A temporary database using your backend settings is filled with '--facts'
+    facts spread across '--activities' activities and '--categories'
+    categories. The same '--seed' always produces the same facts. Afterwards
+    start/stop cycles, 'list' and 'search' over ranges of 1, 7, 30 and 365
+    days, 'activities' and each export format are run '--repeat' times.
+
+    For each operation the p50, p95 and p99 latency and the throughput are
+    shown. Use '--json' to store results for comparing them across versions.
+    Your actual database is never touched.
+    """
+)
+
+
+CHECK_HELP = _(
+    """
+    Report overlapping facts and untracked gaps.
+
+    Facts within TIME_RANGE are checked in a single sweep. Any two facts
+    overlapping each other are reported, as is untracked time between facts of
+    at least '--min-gap' minutes. Only gaps within a day count, with days
+    beginning at your configured 'day_start'.
+
+    Use '--json' for machine-readable output. Exits with status 1 if any issue
+    was found.
     """
 )
 
@@ -173,11 +236,116 @@ ACTIVITIES_HELP = _(
 )
 
 
+HEATMAP_HELP = _(
+    """
+    Show a calendar of hours tracked per day.
+
+    Each column is a week and each row a day of the week. The darker a day, the
+    more time was tracked on it. Days begin at your configured 'day_start'.
+    TIME_RANGE defaults to the last 52 weeks.
+
+    With '--hours' a second grid shows how tracked time is spread across the
+    hours of the week. Requires 'numpy' ('pip install hamster_cli[heatmap]').
+    """
+)
+
+
+PIVOT_HELP = _(
+    """
+    Show hours tracked per activity or category and period.
+
+    Each row is an activity or category ('--rows') and each column a day, week
+    or month ('--cols') within TIME_RANGE, followed by totals. Facts spanning
+    several periods are split between them. Days begin at your configured
+    'day_start', weeks on mondays.
+
+    Use '--csv' to import the matrix into a spreadsheet.
+    """
+)
+
+
+FLEET_REPORT_HELP = _(
+    """
+    Summarize the databases of a whole team.
+
+    Every '*.sqlite' or '*.db' file below DIRECTORY is taken to belong to one
+    user. A 'hamster_cli.sqlite' is named after the directory it is in. Each
+    database is opened read-only and summarized in its own worker process
+    ('--jobs', one per CPU by default). Only time within TIME_RANGE is counted.
+
+    Prints facts, days and hours tracked per user and the hours per category
+    across users. Unreadable databases are reported and skipped.
+    """
+)
+
+
+SYNC_HELP = _(
+    """
+    Exchange facts with the database at OTHER_DB_PATH.
+
+    Afterwards both databases hold the same facts. Only days whose facts differ
+    are compared, so syncing two nearly identical databases is quick. Facts are
+    considered the same if their start, end, activity, category, description
+    and tags match.
+
+    Facts overlapping a different fact of the other database are conflicts.
+    They are reported and left alone, unless '--prefer' says which database
+    wins. The facts of the other one are then replaced. If facts would overlap
+    any other fact, e.g. because a database holds overlapping facts already,
+    nothing is synced. Archive partitions are not synced.
+    """
+)
+
+
+DEDUPE_HELP = _(
+    """
+    Remove duplicate facts starting within TIME_RANGE.
+
+    Facts are duplicates if their start, end, activity, category, description
+    and tags match. Leading and trailing whitespace of descriptions and the
+    order of tags are ignored. The oldest of each set of duplicates is kept.
+
+    Use '--dry-run' to list duplicates without removing them. Archive
+    partitions are not searched.
+    """
+)
+
+
 LICENSE_HELP = _(
     """Show license information."""
 )
 
 
 DETAILS_HELP = _(
-    """List details about the runtime environment."""
+    """
+    List details about the runtime environment.
+
+    Database statements taking 'slow_query_threshold' milliseconds or longer
+    are logged. Use '--queries' to list the slowest of those seen recently
+    instead.
+    """
+)
+
+
+DB_HELP = _(
+    """Database maintenance commands."""
+)
+
+
+DB_OPTIMIZE_HELP = _(
+    """
+    Optimize the database for faster queries.
+
+    Creates any missing indexes on fact start, end and activity as well as on
+    activity name and category. Afterwards the query planners statistics are
+    updated and the database is defragmented. For sqlite databases using
+    'incremental' auto vacuum only free pages are released, otherwise the
+    database file is rebuilt which may take a while for big databases.
+
+    If you use the log structured store ('store = log') its live segment is
+    compacted into a new base segment instead.
+
+    The time it takes to list the facts of the last 30 days is shown before
+    and after so you can see the gain.
+    """
 )
@@ -0,0 +1,851 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of 'hamster_cli'.
+#
+# 'hamster_cli' is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# 'hamster_cli' is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with 'hamster_cli'.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+An append-only, log structured store for ``hamster_lib``.
+
+Existing data is never modified. Every change to a category, activity, tag or fact is
+appended to the *live segment* as a compact, checksummed record. Once enough records
+have piled up, the store is *compacted*: everything still alive is written to a new
+*base segment* with all facts sorted by start, next to a sparse index holding the
+position of every ``SPARSE_INDEX_INTERVAL``th fact and the latest end of all facts
+before it.
+
+On open, categories, activities, tags and the live segment are loaded into memory,
+including a time index of the live facts. Facts in the base segment stay on disk;
+range queries use the sparse index to seek straight to the first record that may
+still be relevant, i.e. the first one not preceded by facts reaching into the range.
+
+A store is a directory (``db_path``) containing:
+
+    * ``CURRENT``: Number of the current generation.
+    * ``base-<generation>.seg``: The compacted segment.
+    * ``base-<generation>.idx``: Sparse index into the base segment.
+    * ``live-<generation>.seg``: Records appended since the last compaction.
+
+Concurrent processes are serialized by an advisory lock on ``LOCK`` where ``fcntl``
+is available.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import bisect
+import datetime
+import heapq
+import json
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+from gettext import gettext as _
+
+from hamster_lib import objects, storage
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Length and crc32 of the payload that follows.
+RECORD_HEADER = struct.Struct('>II')
+
+# Every n-th fact of the base segment gets an entry in the sparse index.
+SPARSE_INDEX_INTERVAL = 64
+
+# Number of live records that triggers a compaction if the config does not say otherwise.
+DEFAULT_COMPACTION_THRESHOLD = 1000
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Files making up a single generation of our store.
+FILENAMES = {'base': 'base-{}.seg', 'index': 'base-{}.idx', 'live': 'live-{}.seg'}
+
+# Record types. Lower case adds or replaces an entity, upper case removes it.
+CATEGORY, ACTIVITY, TAG, FACT = 'c', 'a', 't', 'f'
+REMOVED = {CATEGORY: 'C', ACTIVITY: 'A', TAG: 'T', FACT: 'F'}
+
+
+def encode_datetime(value):
+    """Return ``value`` as integer microseconds since ``EPOCH``."""
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def decode_datetime(value):
+    """Return the ``datetime.datetime`` encoded by ``encode_datetime``."""
+    return EPOCH + datetime.timedelta(microseconds=value)
+
+
+def encode_record(record):
+    """Return the bytes representing ``record`` in a segment file."""
+    payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload) & 0xffffffff) + payload
+
+
+def read_records(fobj, offset=0):
+    """
+    Yield all records of a segment file, starting at ``offset``.
+
+    Reading stops at the first incomplete or corrupted record, e.g. one that was
+    still being written when a process crashed.
+
+    Yields:
+        tuple: ``(offset, end, record)`` where ``end`` is the offset of the next record.
+    """
+    fobj.seek(offset)
+    while True:
+        header = fobj.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        length, checksum = RECORD_HEADER.unpack(header)
+        payload = fobj.read(length)
+        if len(payload) < length or zlib.crc32(payload) & 0xffffffff != checksum:
+            return
+        end = offset + RECORD_HEADER.size + length
+        yield offset, end, json.loads(payload.decode('utf-8'))
+        offset = end
+
+
+class LogStore(storage.BaseStore):
+    """
+    Log structured store.
+
+    Besides the usual backend settings, ``config`` may hold a
+    ``log_compaction_threshold``: the number of live records after which we compact.
+    """
+
+    def __init__(self, config):
+        """Set up our managers and load the current generation at ``config['db_path']``."""
+        super(LogStore, self).__init__(config)
+        self.categories = CategoryManager(self)
+        self.activities = ActivityManager(self)
+        self.tags = TagManager(self)
+        self.facts = FactManager(self)
+        self.path = config['db_path']
+        self.compaction_threshold = config.get('log_compaction_threshold',
+            DEFAULT_COMPACTION_THRESHOLD)
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.generation = None
+        self._lock_depth = 0
+        with self._locked():
+            self._refresh()
+
+    def cleanup(self):
+        """Do nothing, as each write goes straight to disk."""
+        pass
+
+    def _get_path(self, kind, generation=None):
+        if generation is None:
+            generation = self.generation
+        return os.path.join(self.path, FILENAMES[kind].format(generation))
+
+    @contextmanager
+    def _locked(self, shared=False):
+        """
+        Hold the advisory lock on our store for the duration of the block.
+
+        Nested blocks just keep holding the outermost lock, so anything that may need
+        an exclusive lock later on has to ask for it right away.
+        """
+        if fcntl is None or self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        with open(os.path.join(self.path, 'LOCK'), 'a') as fobj:
+            fcntl.flock(fobj, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                fcntl.flock(fobj, fcntl.LOCK_UN)
+
+    def _read_generation(self):
+        try:
+            with open(os.path.join(self.path, 'CURRENT')) as fobj:
+                return int(fobj.read().strip())
+        except (IOError, OSError):
+            return 0
+
+    def _refresh(self):
+        """
+        Make sure our in memory state reflects what is on disk.
+
+        Anything other processes appended to the live segment since we last looked is
+        replayed. If the store has been compacted meanwhile, we start over.
+        """
+        generation = self._read_generation()
+        if generation != self.generation:
+            self._load(generation)
+        live_path = self._get_path('live')
+        if os.path.getsize(live_path) > self.live_offset:
+            with open(live_path, 'rb') as fobj:
+                for offset, end, record in read_records(fobj, self.live_offset):
+                    self._apply(record)
+                    self.live_offset = end
+                    self.live_records += 1
+
+    def _load(self, generation):
+        """Load the base segment header and sparse index of ``generation``."""
+        self.generation = generation
+        self.category_names = {}
+        self.activity_values = {}
+        self.tag_names = {}
+        self.next_pks = {CATEGORY: 1, ACTIVITY: 1, TAG: 1, FACT: 1}
+        # Facts added or changed since the last compaction by PK and sorted by start.
+        self.live_facts = {}
+        self.time_index = []
+        # PKs of base segment facts that have been changed or removed since.
+        self.shadowed = set()
+        self.sparse_index = []
+        self.base_facts_offset = None
+        self.base_facts = 0
+        self.live_offset = 0
+        self.live_records = 0
+
+        if generation:
+            with open(self._get_path('index'), 'rb') as fobj:
+                for offset, end, record in read_records(fobj):
+                    if record[0] == 'h':
+                        self.base_facts_offset, self.base_facts, next_pks = record[1:]
+                        self.next_pks.update(next_pks)
+                    else:
+                        self.sparse_index.append(tuple(record[1:]))
+            with open(self._get_path('base'), 'rb') as fobj:
+                for offset, end, record in read_records(fobj):
+                    if offset >= self.base_facts_offset:
+                        break
+                    self._apply(record)
+        open(self._get_path('live'), 'ab').close()
+
+    def _apply(self, record):
+        """Apply a single record to our in memory state."""
+        kind, pk = record[0], record[1]
+        lookup = {CATEGORY: self.category_names, ACTIVITY: self.activity_values,
+            TAG: self.tag_names}
+        if kind in lookup:
+            lookup[kind][pk] = record[2] if kind != ACTIVITY else tuple(record[2:])
+        elif kind == FACT or kind == REMOVED[FACT]:
+            old = self.live_facts.pop(pk, None)
+            if old:
+                self.time_index.remove((old[1], pk))
+            if kind == FACT:
+                self.live_facts[pk] = tuple(record[1:])
+                bisect.insort(self.time_index, (record[2], pk))
+            self.shadowed.add(pk)
+            kind = FACT
+        else:
+            kind = next(key for key, value in REMOVED.items() if value == kind)
+            lookup[kind].pop(pk, None)
+        self.next_pks[kind] = max(self.next_pks[kind], pk + 1)
+
+    def _append(self, kind, *values):
+        """
+        Append a new record to the live segment and apply it.
+
+        Args:
+            kind (text_type): Record type.
+            *values: Record values. If the first one is ``None`` a new PK is assigned.
+
+        Returns:
+            int: PK of the entity the record is about.
+        """
+        with self._locked():
+            self._refresh()
+            values = list(values)
+            if values[0] is None:
+                values[0] = self.next_pks[kind]
+            record = [kind] + values
+            fd = os.open(self._get_path('live'), os.O_WRONLY | os.O_APPEND)
+            try:
+                # Drop whatever a crashed writer may have left behind.
+                os.ftruncate(fd, self.live_offset)
+                os.write(fd, encode_record(record))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._refresh()
+            if self.live_records >= self.compaction_threshold:
+                self._compact()
+        return values[0]
+
+    def compact(self):
+        """
+        Merge all live records into a new base segment.
+
+        Returns:
+            tuple: ``(live_records, base_facts)``, the number of live records merged and
+                the number of facts in the new base segment.
+        """
+        with self._locked():
+            self._refresh()
+            live_records = self.live_records
+            self._compact()
+        return live_records, self.base_facts
+
+    def _compact(self):
+        generation = self.generation + 1
+        base_path = self._get_path('base', generation)
+        next_pks = dict(self.next_pks)
+        with open(base_path, 'wb') as base:
+            for pk, name in sorted(self.category_names.items()):
+                base.write(encode_record([CATEGORY, pk, name]))
+            for pk, name in sorted(self.tag_names.items()):
+                base.write(encode_record([TAG, pk, name]))
+            for pk, values in sorted(self.activity_values.items()):
+                base.write(encode_record([ACTIVITY, pk] + list(values)))
+            facts_offset = base.tell()
+            sparse_index = []
+            count = 0
+            latest_end = None
+            for values in self._iter_facts():
+                if not count % SPARSE_INDEX_INTERVAL:
+                    # Facts may overlap, so any fact before may reach the furthest.
+                    sparse_index.append((values[1], base.tell(),
+                        values[1] if latest_end is None else latest_end))
+                base.write(encode_record([FACT] + list(values)))
+                latest_end = values[2] if latest_end is None else max(latest_end, values[2])
+                count += 1
+            base.flush()
+            os.fsync(base.fileno())
+
+        with open(self._get_path('index', generation), 'wb') as index:
+            index.write(encode_record(['h', facts_offset, count, next_pks]))
+            for start, offset, latest_end in sparse_index:
+                index.write(encode_record(['i', start, offset, latest_end]))
+            index.flush()
+            os.fsync(index.fileno())
+        open(self._get_path('live', generation), 'wb').close()
+
+        current = os.path.join(self.path, 'CURRENT')
+        with open(current + '.tmp', 'w') as fobj:
+            fobj.write('{}\n'.format(generation))
+            fobj.flush()
+            os.fsync(fobj.fileno())
+        os.rename(current + '.tmp', current)
+
+        old_generation = self.generation
+        self._load(generation)
+        for kind in FILENAMES:
+            path = self._get_path(kind, old_generation)
+            if os.path.exists(path):
+                os.remove(path)
+        self.logger.debug(_("Compacted into generation {} holding {} facts.".format(
+            generation, count)))
+
+    def _iter_base_facts(self, start=None):
+        """
+        Yield the values of all base segment facts still alive, ordered by start.
+
+        Args:
+            start (int, optional): Skip all facts ending before this encoded datetime,
+                as far as the sparse index tells. We skip ahead to the last entry not
+                preceded by any fact reaching ``start``, no matter how long ago it began.
+        """
+        if not self.base_facts:
+            return
+        offset = self.base_facts_offset
+        if start is not None and self.sparse_index:
+            latest_ends = [entry[2] for entry in self.sparse_index]
+            position = bisect.bisect_left(latest_ends, start) - 1
+            if position >= 0:
+                offset = self.sparse_index[position][1]
+        with open(self._get_path('base'), 'rb') as fobj:
+            for offset, end, record in read_records(fobj, offset):
+                if record[1] not in self.shadowed:
+                    yield tuple(record[1:])
+
+    def _iter_live_facts(self, start=None):
+        """
+        Yield the values of all live facts ordered by start.
+
+        Live facts are few and any of them may reach into ``start``, so we never skip
+        any of them. ``start`` is just accepted for symmetry with ``_iter_base_facts``.
+        """
+        for fact_start, pk in self.time_index:
+            yield self.live_facts[pk]
+
+    def _iter_facts(self, start=None):
+        """
+        Yield the values of all facts ordered by start. See ``_iter_base_facts``.
+
+        Callers need to filter out any facts before ``start`` themselves.
+        """
+        def by_start(facts):
+            return ((values[1], values) for values in facts)
+
+        merged = heapq.merge(by_start(self._iter_base_facts(start)),
+            by_start(self._iter_live_facts(start)))
+        return (values for start, values in merged)
+
+    def _to_category(self, pk):
+        if pk not in self.category_names:
+            return None
+        return objects.Category(self.category_names[pk], pk=pk)
+
+    def _to_activity(self, pk):
+        name, category_pk, deleted = self.activity_values[pk]
+        return objects.Activity(name, pk=pk, category=self._to_category(category_pk),
+            deleted=deleted)
+
+    def _to_fact(self, values):
+        pk, start, end, activity_pk, description, tag_pks = values
+        tags = set(objects.Tag(self.tag_names[tag], pk=tag) for tag in tag_pks
+            if tag in self.tag_names)
+        return objects.Fact(self._to_activity(activity_pk), decode_datetime(start),
+            decode_datetime(end), pk=pk, description=description, tags=tags)
+
+
+class CategoryManager(storage.BaseCategoryManager):
+    """Manage categories of our log structured store."""
+
+    def get_or_create(self, category):
+        """
+        Return the stored category of the same name, creating it if needed.
+
+        Args:
+            category (hamster_lib.Category or None): Category we want.
+
+        Returns:
+            hamster_lib.Category or None: Stored category.
+        """
+        if not category:
+            return None
+        try:
+            return self.get_by_name(category.name)
+        except KeyError:
+            return self._add(objects.Category(category.name))
+
+    def _add(self, category):
+        if category.pk:
+            message = _(
+                "The category ('{!r}') you are trying to add already has an PK."
+                " Are you sure you do not want to ``_update`` instead?".format(category)
+            )
+            self.store.logger.error(message)
+            raise ValueError(message)
+        with self.store._locked():
+            self.store._refresh()
+            if category.name in self.store.category_names.values():
+                message = _("Our database already contains a category named '{}'.".format(
+                    category.name))
+                self.store.logger.error(message)
+                raise ValueError(message)
+            pk = self.store._append(CATEGORY, None, category.name)
+        return objects.Category(category.name, pk=pk)
+
+    def _update(self, category):
+        if not category.pk:
+            message = _("PK-less Category. Are you trying to update a new Category?")
+            self.store.logger.error(message)
+            raise ValueError(message)
+        self.get(category.pk)
+        try:
+            if self.get_by_name(category.name).pk != category.pk:
+                message = _("Our database already contains a category named '{}'.".format(
+                    category.name))
+                self.store.logger.error(message)
+                raise ValueError(message)
+        except KeyError:
+            pass
+        self.store._append(CATEGORY, category.pk, category.name)
+        return category
+
+    def remove(self, category):
+        """Remove ``category`` by appending a tombstone."""
+        if not category.pk:
+            message = _("PK-less Category. Are you trying to remove a new Category?")
+            self.store.logger.error(message)
+            raise ValueError(message)
+        self.get(category.pk)
+        self.store._append(REMOVED[CATEGORY], category.pk)
+
+    def get(self, pk):
+        """Return the category with ``pk``."""
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            result = self.store._to_category(pk)
+        if not result:
+            message = _("No category with 'pk: {}' was found!".format(pk))
+            self.store.logger.error(message)
+            raise KeyError(message)
+        return result
+
+    def get_by_name(self, name):
+        """Return the category named ``name``."""
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            for pk, value in self.store.category_names.items():
+                if value == name:
+                    return objects.Category(value, pk=pk)
+        message = _("No category with 'name: {}' was found!".format(name))
+        self.store.logger.error(message)
+        raise KeyError(message)
+
+    def get_all(self):
+        """Return all categories ordered by name."""
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            categories = [self.store._to_category(pk) for pk in self.store.category_names]
+        return sorted(categories, key=lambda category: category.name)
+
+
+class ActivityManager(storage.BaseActivityManager):
+    """Manage activities of our log structured store."""
+
+    def _add(self, activity):
+        if activity.pk:
+            message = _(
+                "The activity ('{!r}') you are trying to add already has an PK."
+                " Are you sure you do not want to ``_update`` instead?".format(activity)
+            )
+            self.store.logger.error(message)
+            raise ValueError(message)
+        with self.store._locked():
+            try:
+                self.get_by_composite(activity.name, activity.category)
+            except KeyError:
+                pass
+            else:
+                message = _("Our database already contains the passed name/category.name"
+                            "combination.")
+                self.store.logger.error(message)
+                raise ValueError(message)
+            category = self.store.categories.get_or_create(activity.category)
+            pk = self.store._append(ACTIVITY, None, activity.name,
+                category.pk if category else None, activity.deleted)
+        return objects.Activity(activity.name, pk=pk, category=category,
+            deleted=activity.deleted)
+
+    def _update(self, activity):
+        if not activity.pk:
+            message = _("The activity passed ('{!r}') does not seem to have a PK. We don't"
+                        " know which entry to modify.".format(activity))
+            self.store.logger.error(message)
+            raise ValueError(message)
+        self.get(activity.pk)
+        try:
+            if self.get_by_composite(activity.name, activity.category).pk != activity.pk:
+                message = _("Our database already contains the passed name/category.name"
+                            "combination.")
+                self.store.logger.error(message)
+                raise ValueError(message)
+        except KeyError:
+            pass
+        category = self.store.categories.get_or_create(activity.category)
+        self.store._append(ACTIVITY, activity.pk, activity.name,
+            category.pk if category else None, activity.deleted)
+        return self.get(activity.pk)
+
+    def remove(self, activity):
+        """
+        Remove an activity. If there are facts referring to it, just mark it deleted.
+
+        Finding out about those facts requires a scan of the entire store.
+        """
+        if not activity.pk:
+            message = _("The activity you passed does not have a PK. Please provide one.")
+            self.store.logger.error(message)
+            raise ValueError(message)
+        activity = self.get(activity.pk)
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            in_use = any(values[3] == activity.pk for values in self.store._iter_facts())
+        if in_use:
+            activity.deleted = True
+            self._update(activity)
+        else:
+            self.store._append(REMOVED[ACTIVITY], activity.pk)
+        return True
+
+    def get(self, pk):
+        """Return the activity with ``pk``."""
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            if pk in self.store.activity_values:
+                return self.store._to_activity(pk)
+        message = _("No Activity with 'pk: {}' was found!".format(pk))
+        self.store.logger.error(message)
+        raise KeyError(message)
+
+    def get_by_composite(self, name, category):
+        """Return the activity named ``name`` within ``category``."""
+        category_name = category.name if category else None
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            for pk in self.store.activity_values:
+                activity = self.store._to_activity(pk)
+                if activity.name == name and (
+                        activity.category.name if activity.category else None) == category_name:
+                    return activity
+        message = _(
+            "No activity of given combination (name: {name}, category: {category})"
+            " could be found.".format(name=name, category=category_name)
+        )
+        self.store.logger.error(message)
+        raise KeyError(message)
+
+    def get_all(self, category=False, search_term=''):
+        """Return all activities of ``category`` matching ``search_term``, by name."""
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            activities = [self.store._to_activity(pk) for pk in self.store.activity_values]
+        if category is not False:
+            pk = category.pk if category else None
+            activities = [activity for activity in activities if
+                (activity.category.pk if activity.category else None) == pk]
+        if search_term:
+            activities = [activity for activity in activities if
+                search_term.lower() in activity.name.lower()]
+        return sorted(activities, key=lambda activity: activity.name)
+
+
+class TagManager(storage.BaseTagManager):
+    """Manage tags of our log structured store."""
+
+    def get_or_create(self, tag):
+        """
+        Return the stored tag of the same name, creating it if needed.
+
+        Args:
+            tag (hamster_lib.Tag or text_type): Tag we want.
+
+        Returns:
+            hamster_lib.Tag: Stored tag.
+        """
+        name = getattr(tag, 'name', tag)
+        try:
+            return self.get_by_name(name)
+        except KeyError:
+            return self._add(objects.Tag(name))
+
+    def _add(self, tag):
+        if tag.pk:
+            message = _(
+                "The tag ('{!r}') you are trying to add already has an PK."
+                " Are you sure you do not want to ``_update`` instead?".format(tag)
+            )
+            self.store.logger.error(message)
+            raise ValueError(message)
+        with self.store._locked():
+            try:
+                self.get_by_name(tag.name)
+            except KeyError:
+                pass
+            else:
+                message = _("Our database already contains a tag named '{}'.".format(
+                    tag.name))
+                self.store.logger.error(message)
+                raise ValueError(message)
+            pk = self.store._append(TAG, None, tag.name)
+        return objects.Tag(tag.name, pk=pk)
+
+    def _update(self, tag):
+        if not tag.pk:
+            message = _("PK-less Tag. Are you trying to update a new Tag?")
+            self.store.logger.error(message)
+            raise ValueError(message)
+        self.get(tag.pk)
+        self.store._append(TAG, tag.pk, tag.name)
+        return tag
+
+    def remove(self, tag):
+        """Remove ``tag`` by appending a tombstone."""
+        if not tag.pk:
+            message = _("PK-less Tag. Are you trying to remove a new Tag?")
+            self.store.logger.error(message)
+            raise ValueError(message)
+        self.get(tag.pk)
+        self.store._append(REMOVED[TAG], tag.pk)
+        return True
+
+    def get(self, pk):
+        """Return the tag with ``pk``."""
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            if pk in self.store.tag_names:
+                return objects.Tag(self.store.tag_names[pk], pk=pk)
+        message = _("No tag with 'pk: {}' was found!".format(pk))
+        self.store.logger.error(message)
+        raise KeyError(message)
+
+    def get_by_name(self, name):
+        """Return the tag named ``name``."""
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            for pk, value in self.store.tag_names.items():
+                if value == name:
+                    return objects.Tag(value, pk=pk)
+        message = _("No tag with 'name: {}' was found!".format(name))
+        self.store.logger.error(message)
+        raise KeyError(message)
+
+    def get_all(self):
+        """Return all tags ordered by name."""
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            tags = [objects.Tag(name, pk=pk) for pk, name in self.store.tag_names.items()]
+        return sorted(tags, key=lambda tag: tag.name)
+
+
+class FactManager(storage.BaseFactManager):
+    """Manage facts of our log structured store."""
+
+    def _add(self, fact):
+        if fact.pk:
+            message = _(
+                "The fact ('{!r}') you are trying to add already has an PK."
+                " Are you sure you do not want to ``_update`` instead?".format(fact)
+            )
+            self.store.logger.error(message)
+            raise ValueError(message)
+        return self._write(fact)
+
+    def _update(self, fact):
+        if not fact.pk:
+            message = _(
+                "{!r} does not seem to have a PK. We don't know"
+                "which entry to modify.".format(fact)
+            )
+            self.store.logger.error(message)
+            raise ValueError(message)
+        self.get(fact.pk)
+        return self._write(fact)
+
+    def _write(self, fact):
+        """
+        Append ``fact`` to the live segment after making sure its timewindow is free.
+
+        The check and the write happen under the same lock, so concurrent processes can
+        not sneak in an overlapping fact.
+        """
+        activity = self.store.activities.get_or_create(fact.activity)
+        tags = sorted(self.store.tags.get_or_create(tag).pk for tag in fact.tags)
+        with self.store._locked():
+            self.store._refresh()
+            occupied = [other for other in self._get_all(fact.start, fact.end, partial=True)
+                if other.pk != fact.pk]
+            if occupied:
+                message = _("Our database already contains facts for this facts timewindow."
+                            "There can ever only be one fact at any given point in time")
+                self.store.logger.error(message)
+                raise ValueError(message)
+            pk = self.store._append(FACT, fact.pk, encode_datetime(fact.start),
+                encode_datetime(fact.end), activity.pk, fact.description, tags)
+        self.store.logger.debug(_("Wrote fact with PK {}.".format(pk)))
+        return self.get(pk)
+
+    def remove(self, fact):
+        """Remove ``fact`` by appending a tombstone."""
+        if not fact.pk:
+            message = _(
+                "The fact passed ('{!r}') does not seem to havea PK. We don't know"
+                "which entry to remove.".format(fact)
+            )
+            self.store.logger.error(message)
+            raise ValueError(message)
+        self.get(fact.pk, start=fact.start)
+        self.store._append(REMOVED[FACT], fact.pk)
+        return True
+
+    def get(self, pk, start=None):
+        """
+        Retrieve a fact by its PK.
+
+        Facts in the base segment are found by scanning it. Passing the facts ``start``,
+        if known, lets us skip right to it.
+        """
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            if pk in self.store.live_facts:
+                return self.store._to_fact(self.store.live_facts[pk])
+            if pk not in self.store.shadowed:
+                encoded = encode_datetime(start) if start else None
+                for values in self.store._iter_base_facts(encoded):
+                    if values[0] == pk:
+                        return self.store._to_fact(values)
+                    if encoded is not None and values[1] > encoded:
+                        break
+        message = _("No fact with given PK found.")
+        self.store.logger.error(message)
+        raise KeyError(message)
+
+    def get_overlapping(self, start, end):
+        """
+        Return all facts sharing any point in time with ``start`` to ``end``.
+
+        Unlike ``_get_all`` with ``partial=True`` this includes facts enclosing the whole
+        timeframe. Reading starts at the sparse index entry after which facts may first
+        reach into ``start``, so unless facts span a long time, the cost does not depend
+        on the number of facts stored.
+        """
+        encoded_start = encode_datetime(start)
+        encoded_end = encode_datetime(end)
+        result = []
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            for values in self.store._iter_facts(encoded_start):
+                if values[1] > encoded_end:
+                    break
+                if values[2] >= encoded_start:
+                    result.append(self.store._to_fact(values))
+        return result
+
+    def _get_all(self, start=None, end=None, search_term='', partial=False):
+        """
+        Return all facts within a given timeframe that match given search terms.
+
+        Semantics follow those of the ``sqlalchemy`` backend.
+        """
+        encoded_start = encode_datetime(start) if start else None
+        encoded_end = encode_datetime(end) if end else None
+
+        def after_start(value):
+            return encoded_start is None or value >= encoded_start
+
+        def before_end(value):
+            return encoded_end is None or value <= encoded_end
+
+        def matches(values):
+            if partial:
+                return any(after_start(value) and before_end(value) for value in values[1:3])
+            return after_start(values[1]) and before_end(values[2])
+
+        def matches_term(fact):
+            term = search_term.lower()
+            names = [fact.activity.name]
+            if fact.category:
+                names.append(fact.category.name)
+            return any(term in name.lower() for name in names)
+
+        result = []
+        with self.store._locked(shared=True):
+            self.store._refresh()
+            for values in self.store._iter_facts(encoded_start):
+                if encoded_end is not None and values[1] > encoded_end:
+                    break
+                if not matches(values):
+                    continue
+                fact = self.store._to_fact(values)
+                if search_term and not matches_term(fact):
+                    continue
+                result.append(fact)
+        return result
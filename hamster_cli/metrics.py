@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of 'hamster_cli'.
+#
+# 'hamster_cli' is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# 'hamster_cli' is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with 'hamster_cli'.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Per command latency metrics.
+
+Each invocation adds its wall time, the time spent in the backend and the number of
+results it returned to a set of histograms kept per command. All histograms live in a
+small JSON state file. It is updated under an advisory lock where ``fcntl`` is
+available, so concurrent invocations do not lose each other's observations.
+
+The state can be rendered in the Prometheus text format, ready to be picked up by the
+textfile collector of the node exporter.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import bisect
+import codecs
+import json
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Upper bounds of our histogram buckets. Latencies are in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RESULT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+# Each histogram as ``(key, metric name, help text, buckets)``. Observations are passed
+# by ``key``.
+HISTOGRAMS = (
+    ('wall', 'hamster_cli_command_duration_seconds',
+        'Wall time of hamster-cli commands.', LATENCY_BUCKETS),
+    ('backend', 'hamster_cli_command_backend_seconds',
+        'Time hamster-cli commands spent querying the backend.', LATENCY_BUCKETS),
+    ('results', 'hamster_cli_command_results',
+        'Number of results returned by hamster-cli commands.', RESULT_BUCKETS),
+)
+
+
+def observe(state, command, observations):
+    """
+    Add the observations of a single invocation of ``command`` to ``state``.
+
+    Args:
+        state (dict): State as returned by ``load``. It is updated in place.
+        command (str): Name of the command.
+        observations (dict): Observed value by histogram key. Keys that are missing or
+            ``None`` are not recorded.
+
+    Returns:
+        dict: The updated ``state``.
+    """
+    histograms = state.setdefault('commands', {}).setdefault(command, {})
+    for key, name, help, buckets in HISTOGRAMS:
+        value = observations.get(key)
+        if value is None:
+            continue
+        histogram = histograms.get(key)
+        if not histogram or len(histogram['buckets']) != len(buckets) + 1:
+            # The last bucket counts anything above our largest bound.
+            histogram = histograms[key] = {'buckets': [0] * (len(buckets) + 1),
+                'sum': 0.0, 'count': 0}
+        histogram['buckets'][bisect.bisect_left(buckets, value)] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+    return state
+
+
+def render(state):
+    """Return ``state`` in the Prometheus text format."""
+    lines = []
+    for key, name, help, buckets in HISTOGRAMS:
+        lines.append('# HELP {name} {help}'.format(name=name, help=help))
+        lines.append('# TYPE {name} histogram'.format(name=name))
+        for command, histograms in sorted(state.get('commands', {}).items()):
+            histogram = histograms.get(key)
+            if not histogram:
+                continue
+            label = 'command="{}"'.format(command)
+            total = 0
+            bounds = [repr(float(bound)) for bound in buckets] + ['+Inf']
+            for bound, count in zip(bounds, histogram['buckets']):
+                total += count
+                lines.append('{name}_bucket{{{label},le="{bound}"}} {count}'.format(
+                    name=name, label=label, bound=bound, count=total))
+            lines.append('{name}_sum{{{label}}} {value}'.format(name=name, label=label,
+                value=repr(float(histogram['sum']))))
+            lines.append('{name}_count{{{label}}} {value}'.format(name=name, label=label,
+                value=histogram['count']))
+    return '\n'.join(lines) + '\n'
+
+
+def load(path):
+    """Return the state stored at ``path``. A missing or damaged file is an empty state."""
+    try:
+        with codecs.open(path, encoding='utf-8') as fobj:
+            return json.load(fobj)
+    except (IOError, ValueError):
+        return {}
+
+
+def record(path, command, observations, textfile=None):
+    """
+    Add the observations of a single invocation of ``command`` to the state at ``path``.
+
+    Args:
+        path (str): Path of our state file.
+        command (str): Name of the command.
+        observations (dict): Observed value by histogram key, see ``observe``.
+        textfile (str, optional): If given, the updated state is rendered to this path as
+            well.
+
+    Returns:
+        dict: The updated state.
+    """
+    with _locked(path):
+        state = observe(load(path), command, observations)
+        _write(path, json.dumps(state))
+        if textfile:
+            _write(textfile, render(state))
+    return state
+
+
+@contextmanager
+def _locked(path):
+    """Hold an exclusive advisory lock for the state at ``path`` for the duration of the block."""
+    if fcntl is None:
+        yield
+        return
+    with open('{}.lock'.format(path), 'a') as fobj:
+        fcntl.flock(fobj, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fobj, fcntl.LOCK_UN)
+
+
+def _write(path, content):
+    """
+    Replace the file at ``path`` atomically.
+
+    Readers, such as the node exporter, never see a partially written file.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with codecs.open(tmp_path, 'w', encoding='utf-8') as fobj:
+        fobj.write(content)
+    os.rename(tmp_path, path)
@@ -19,6 +19,7 @@ requirements = [
     'appdirs',
     'Click',
     'hamster-lib',
+    'SQLAlchemy',
     'tabulate',
     # py27 compatibility related
     'six',
@@ -40,6 +41,10 @@ setup(
     package_dir={'hamster_cli':
                  'hamster_cli'},
     install_requires=requirements,
+    extras_require={
+        'columnar': ['pyarrow'],
+        'heatmap': ['numpy'],
+    },
     license="GPL3",
     zip_safe=False,
     keywords='hamster_cli',
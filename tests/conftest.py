@@ -110,8 +110,25 @@ def client_config(tmpdir):
         'log_level': 10,
         'log_console': False,
         'logfile_path': False,
+        'log_format': 'text',
+        'log_max_bytes': 1048576,
+        'log_backup_count': 3,
         'export_path': os.path.join(tmpdir.mkdir('export').strpath, 'export'),
+        'archive_path': os.path.join(tmpdir.strpath, 'archive'),
         'logging_path': os.path.join(tmpdir.mkdir('log2').strpath, 'hamster_cli.log'),
+        'last_write_path': os.path.join(tmpdir.mkdir('cache3').strpath, 'last_write'),
+        'write_behind': False,
+        'fact_overlap': 'reject',
+        'journal_path': os.path.join(tmpdir.mkdir('data2').strpath, 'hamster_cli.journal'),
+        'write_retries': 5,
+        'write_retry_delay': 0.05,
+        'write_retry_max_delay': 2.0,
+        'slow_query_threshold': 500.0,
+        'slow_query_redact': False,
+        'slow_query_log_path': os.path.join(tmpdir.strpath, 'hamster_cli.slow_queries'),
+        'metrics': True,
+        'metrics_path': os.path.join(tmpdir.strpath, 'hamster_cli.metrics'),
+        'metrics_textfile': '',
     }
 
 
@@ -133,6 +150,23 @@ def config_instance(tmpdir, faker):
             config.set('Backend', 'db_port', kwargs.get('db_port', ''))
             config.set('Backend', 'db_user', kwargs.get('db_user', '')),
             config.set('Backend', 'db_password', kwargs.get('db_password', ''))
+            config.set('Backend', 'db_pool_size', kwargs.get('db_pool_size', '5'))
+            config.set('Backend', 'db_pool_overflow', kwargs.get('db_pool_overflow', '10'))
+            config.set('Backend', 'db_pool_recycle', kwargs.get('db_pool_recycle', '3600'))
+            config.set('Backend', 'db_pool_timeout', kwargs.get('db_pool_timeout', '30'))
+            config.set('Backend', 'db_pool_pre_ping', kwargs.get('db_pool_pre_ping', 'True'))
+            for key in ('host', 'port', 'name', 'user', 'password'):
+                key = 'replica_{}'.format(key)
+                config.set('Backend', key, kwargs.get(key, ''))
+            config.set('Backend', 'replica_staleness', kwargs.get('replica_staleness', '10'))
+            config.set('Backend', 'sqlite_profile', kwargs.get('sqlite_profile', 'default'))
+            for name, choices in hamster_cli.SQLITE_PRAGMAS:
+                key = 'sqlite_{}'.format(name)
+                config.set('Backend', key, kwargs.get(key, ''))
+            config.set('Backend', 'log_compaction_threshold', kwargs.get(
+                'log_compaction_threshold', '1000'))
+            config.set('Backend', 'db_snapshot', kwargs.get('db_snapshot', ''))
+            config.set('Backend', 'db_snapshot_save', kwargs.get('db_snapshot_save', 'False'))
 
             # Client
             config.add_section('Client')
@@ -141,6 +175,15 @@ def config_instance(tmpdir, faker):
             config.set('Client', 'log_level', kwargs.get('log_level', 'debug'))
             config.set('Client', 'log_console', kwargs.get('log_console', '0'))
             config.set('Client', 'log_filename', kwargs.get('log_filename', faker.file_name()))
+            config.set('Client', 'log_format', kwargs.get('log_format', 'text'))
+            config.set('Client', 'fact_overlap', kwargs.get('fact_overlap', 'reject'))
+            config.set('Client', 'log_max_bytes', kwargs.get('log_max_bytes', '1048576'))
+            config.set('Client', 'log_backup_count', kwargs.get('log_backup_count', '3'))
+            config.set('Client', 'slow_query_threshold', kwargs.get('slow_query_threshold',
+                '500'))
+            config.set('Client', 'slow_query_redact', kwargs.get('slow_query_redact', 'False'))
+            config.set('Client', 'metrics', kwargs.get('metrics', 'True'))
+            config.set('Client', 'metrics_textfile', kwargs.get('metrics_textfile', ''))
             return config
     return generate_config
 
@@ -232,6 +275,18 @@ def controler_with_logging(lib_config, client_config):
     controler.store.cleanup()
 
 
+@pytest.yield_fixture
+def log_controler(lib_config, client_config, tmpdir):
+    """Provide a pseudo controler instance using a log structured store."""
+    lib_config.update({'store': 'log', 'db_path': os.path.join(tmpdir.strpath, 'log_store'),
+        'log_compaction_threshold': 1000})
+    controler = hamster_lib.HamsterControl(lib_config)
+    controler.client_config = client_config
+    hamster_cli._setup_logging(controler)
+    yield controler
+    controler.store.cleanup()
+
+
 @pytest.fixture(params=[
     ('', '', {
         'filter_term': '',
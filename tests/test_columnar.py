@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import os
+
+import pytest
+
+from hamster_cli import columnar
+
+pyarrow = pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def facts(fact_factory, activity, category):
+    """Provide a list of facts sharing the same activity."""
+    start = datetime.datetime(2016, 4, 12, 9, 0, 0)
+    facts = []
+    for offset in range(5):
+        fact = fact_factory(activity=activity, description=None,
+            start=start + datetime.timedelta(hours=offset),
+            end=start + datetime.timedelta(hours=offset, minutes=30))
+        facts.append(fact)
+    return facts
+
+
+@pytest.fixture
+def report_path(tmpdir):
+    """Provide a path to export to."""
+    return os.path.join(tmpdir.strpath, 'report')
+
+
+class TestParquetWriter(object):
+    """Unittests for ``ParquetWriter``."""
+
+    def test_types(self, facts, report_path):
+        """Make sure our columns keep their native types."""
+        columnar.ParquetWriter(report_path).write_report(facts)
+        table = pyarrow.parquet.read_table(report_path)
+        assert pyarrow.types.is_timestamp(table.schema.field('start').type)
+        assert pyarrow.types.is_dictionary(table.schema.field('activity').type)
+        row = table.to_pylist()[0]
+        assert row['start'] == facts[0].start
+        assert row['duration'] == datetime.timedelta(minutes=30)
+        assert row['activity'] == facts[0].activity.name
+        assert row['description'] is None
+
+    def test_row_groups(self, facts, report_path):
+        """Make sure each chunk of facts ends up in its own row group."""
+        columnar.ParquetWriter(report_path, chunk_size=2).write_report(facts)
+        parquet_file = pyarrow.parquet.ParquetFile(report_path)
+        assert parquet_file.num_row_groups == 3
+        assert parquet_file.metadata.num_rows == len(facts)
+
+
+class TestArrowWriter(object):
+    """Unittests for ``ArrowWriter``."""
+
+    def test_memory_mappable(self, facts, report_path):
+        """Make sure the result can be memory mapped and read back across batches."""
+        columnar.ArrowWriter(report_path, chunk_size=2).write_report(facts)
+        reader = pyarrow.ipc.open_file(pyarrow.memory_map(report_path))
+        assert reader.num_record_batches == 3
+        table = reader.read_all()
+        assert table.column('activity').to_pylist() == [fact.activity.name for fact in facts]
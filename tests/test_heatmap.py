@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import datetime
+
+import pytest
+
+from hamster_cli import heatmap
+
+numpy = pytest.importorskip('numpy')
+
+
+def get_intervals(*intervals):
+    """Return start and end arrays for ``'%Y-%m-%d %H:%M'`` formatted ``intervals``."""
+    starts, ends = heatmap.to_seconds([(datetime.datetime.strptime(start, '%Y-%m-%d %H:%M'),
+        datetime.datetime.strptime(end, '%Y-%m-%d %H:%M')) for start, end in intervals]).T
+    return starts, ends
+
+
+class TestGetTrackedSeconds(object):
+    """Unittests for ``get_tracked_seconds``."""
+
+    def test_split(self):
+        """Make sure facts are split at boundaries and anything outside is ignored."""
+        starts = numpy.array([0, 50, 250])
+        ends = numpy.array([150, 60, 400])
+        boundaries = numpy.array([100, 200, 300])
+        assert heatmap.get_tracked_seconds(starts, ends, boundaries).tolist() == [50, 50]
+
+    def test_no_facts(self):
+        """Make sure we get empty bins without any facts."""
+        empty = numpy.zeros(0, dtype='int64')
+        assert heatmap.get_tracked_seconds(empty, empty, [0, 10, 20]).tolist() == [0, 0]
+
+
+class TestGetDailyHours(object):
+    """Unittests for ``get_daily_hours``."""
+
+    @pytest.mark.parametrize(('day_start', 'expectation'), (
+        (datetime.time(0, 0), [0, 3, 2]),
+        (datetime.time(5, 0), [1, 4, 0]),
+    ))
+    def test_day_start(self, day_start, expectation):
+        """Make sure facts are split at midnight or ``day_start``."""
+        starts, ends = get_intervals(('2016-01-02 23:00', '2016-01-03 02:00'),
+            ('2016-01-02 04:00', '2016-01-02 06:00'))
+        hours = heatmap.get_daily_hours(starts, ends, datetime.date(2016, 1, 1),
+            datetime.date(2016, 1, 3), day_start)
+        assert hours.tolist() == expectation
+
+
+class TestGetHourOfWeekHours(object):
+    """Unittests for ``get_hour_of_week_hours``."""
+
+    def test_hour_of_week(self):
+        """Make sure time is added to the matching hour of the right weekday."""
+        # 2016-01-04 is a Monday.
+        starts, ends = get_intervals(('2016-01-04 09:30', '2016-01-04 11:00'),
+            ('2016-01-11 09:00', '2016-01-11 10:00'), ('2016-01-10 23:00', '2016-01-11 00:30'))
+        hours = heatmap.get_hour_of_week_hours(starts, ends,
+            datetime.datetime(2016, 1, 1, 12, 15), datetime.datetime(2016, 1, 31))
+        assert hours[0, 9] == 1.5
+        assert hours[0, 10] == 1
+        assert hours[0, 0] == 0.5
+        assert hours[6, 23] == 1
+        assert hours.sum() == 4
+
+    def test_range_limits(self):
+        """Make sure only time within the range is counted."""
+        starts, ends = get_intervals(('2016-01-04 09:00', '2016-01-04 11:00'))
+        hours = heatmap.get_hour_of_week_hours(starts, ends,
+            datetime.datetime(2016, 1, 4, 9, 30), datetime.datetime(2016, 1, 4, 10, 15))
+        assert hours.sum() == 0.75
+
+
+class TestRender(object):
+    """Unittests for rendering heatmaps."""
+
+    def test_levels(self):
+        """Make sure zero gets its own level and everything else is split in quartiles."""
+        assert heatmap.get_levels([0, 1, 2, 3, 4]).tolist() == [0, 1, 2, 3, 4]
+        assert heatmap.get_levels([0, 0]).tolist() == [0, 0]
+
+    def test_calendar(self):
+        """Make sure each weekday gets a row and each week a column."""
+        # 2016-01-01 is a Friday.
+        hours = numpy.zeros(31)
+        hours[2] = 8
+        lines = heatmap.render_calendar(datetime.date(2016, 1, 1), hours).splitlines()
+        assert lines[0].split() == ['Jan']
+        assert lines[1] == 'Mon  ····'
+        assert lines[5] == 'Fri ·····'
+        assert lines[7] == 'Sun █····'
+        assert lines[-1].startswith('8.0 hours on 1 of 31 days.')
+
+    def test_hour_of_week(self):
+        """Make sure each weekday gets a row of 24 hours."""
+        hours = numpy.zeros((7, 24))
+        hours[2, 12] = 1
+        lines = heatmap.render_hour_of_week(hours).splitlines()
+        assert len(lines) == 8
+        assert lines[3] == 'Wed ' + '·' * 12 + '█' + '·' * 11
@@ -1,5 +1,12 @@
 from __future__ import unicode_literals
 
+import os
+
+import hamster_lib
+import pytest
+
+from hamster_cli import metrics
+
 
 class TestBasicRun(object):
     def test_basic_run(self, runner):
@@ -68,6 +75,13 @@ class TestExport(object):
         result = runner(['export'])
         assert result.exit_code == 0
 
+    def test_export_stdout(self, runner, get_config_file):
+        """Make sure that exporting to stdout leaves nothing but the export there."""
+        get_config_file()
+        result = runner(['export', 'csv', '--output', '-'])
+        assert result.exit_code == 0
+        assert result.output.startswith('start time')
+
 
 class TestCategories(object):
     def test_categories(self, runner):
@@ -85,6 +99,83 @@ class TestActivities(object):
         assert result.exit_code == 0
 
 
+class TestCheck(object):
+    """Make sure the ``check`` command works as expected."""
+
+    def test_check(self, runner):
+        """Make sure we exit cleanly if there are no issues."""
+        result = runner(['check', '--json'])
+        assert result.exit_code == 0
+        assert result.output.rstrip().endswith('[]')
+
+    def test_check_issues(self, runner):
+        """Make sure we exit with an error status if there are issues."""
+        runner(['start', 'foo@bar', '2016-01-01 09:00', '2016-01-01 10:00'])
+        runner(['start', 'foo@bar', '2016-01-01 11:00', '2016-01-01 12:00'])
+        result = runner(['check', '2016-01-01'])
+        assert result.exit_code == 1
+        assert 'gap' in result.output
+
+
+class TestHeatmap(object):
+    """Make sure the ``heatmap`` command works as expected."""
+
+    def test_heatmap(self, runner):
+        """Make sure a calendar of the last year is shown."""
+        pytest.importorskip('numpy')
+        result = runner(['heatmap', '--hours'])
+        assert result.exit_code == 0
+        assert 'hours on 0 of' in result.output
+
+
+class TestPivot(object):
+    """Make sure the ``pivot`` command works as expected."""
+
+    def test_pivot(self, runner):
+        """Make sure tracked time shows up in our matrix."""
+        runner(['start', 'foo@bar', '2016-01-01 09:00', '2016-01-01 10:30'])
+        result = runner(['pivot', '2016-01-01', '--cols', 'day', '--csv'])
+        assert result.exit_code == 0
+        assert 'foo@bar,1.50,1.50' in result.output
+
+
+class TestFleetReport(object):
+    """Make sure the ``fleet-report`` command works as expected."""
+
+    def test_fleet_report(self, runner, tmpdir):
+        """Make sure an unreadable database is skipped."""
+        fleet = tmpdir.mkdir('fleet')
+        fleet.join('alice.sqlite').write('no database')
+        result = runner(['fleet-report', fleet.strpath, '--jobs', '1'])
+        assert result.exit_code == 0
+        assert 'Skipped alice' in result.output
+
+
+class TestSync(object):
+    """Make sure the ``sync`` command works as expected."""
+
+    def test_sync(self, runner, tmpdir, lib_config):
+        """Make sure our facts are copied to the other database."""
+        path = tmpdir.join('other.sqlite').strpath
+        hamster_lib.HamsterControl(dict(lib_config, db_path=path))
+        runner(['start', 'foo@bar', '2016-01-01 09:00', '2016-01-01 10:30'])
+        result = runner(['sync', path])
+        assert result.exit_code == 0
+        assert '1 of 1 days differ.' in result.output
+        assert 'Copying 1 facts to and removing 0 from {}'.format(path) in result.output
+
+
+class TestDedupe(object):
+    """Make sure the ``dedupe`` command works as expected."""
+
+    def test_dedupe(self, runner):
+        """Make sure a database without duplicates is left alone."""
+        runner(['start', 'foo@bar', '2016-01-01 09:00', '2016-01-01 10:30'])
+        result = runner(['dedupe', '--dry-run'])
+        assert result.exit_code == 0
+        assert 'No duplicates found.' in result.output
+
+
 class TestLicense(object):
     """Make sure command works as expected."""
 
@@ -101,3 +192,122 @@ class TestDetails(object):
         """Make sure command launches without exception."""
         result = runner(['details'])
         assert result.exit_code == 0
+
+    def test_details_queries(self, runner):
+        """Make sure we get a summary of slow statements."""
+        result = runner(['details', '--queries'])
+        assert result.exit_code == 0
+        assert 'No slow queries recorded.' in result.output
+
+
+class TestOptimize(object):
+    """Make sure command works as expected."""
+
+    def test_optimize(self, runner):
+        """Make sure command launches without exception."""
+        result = runner(['db', 'optimize'])
+        assert result.exit_code == 0
+
+
+class TestArchive(object):
+    """Make sure command works as expected."""
+
+    def test_archive(self, runner):
+        """Make sure command launches without exception."""
+        result = runner(['archive', '--before', '2015-01-01'])
+        assert result.exit_code == 0
+
+
+class TestFlush(object):
+    """Make sure command works as expected."""
+
+    def test_flush(self, runner):
+        """Make sure command launches without exception."""
+        result = runner(['flush'])
+        assert result.exit_code == 0
+
+
+class TestSnapshot(object):
+    """Make sure in-memory databases are seeded from and written back to a snapshot."""
+
+    def test_snapshot(self, runner, get_config_file, tmpdir):
+        """Make sure facts added by one command are seen by the next."""
+        path = os.path.join(tmpdir.strpath, 'snapshot.sqlite')
+        get_config_file(db_path=':memory:', db_snapshot=path, db_snapshot_save='True')
+        result = runner(['start', 'foo@bar', '2016-01-01 10:00', '2016-01-01 11:00'])
+        assert result.exit_code == 0
+        assert os.path.exists(path)
+        result = runner(['export', 'csv', '--output', '-'])
+        assert 'foo' in result.output
+
+
+class TestProfile(object):
+    """Make sure the global profiling options work as expected."""
+
+    def test_profile(self, runner):
+        """Make sure a breakdown of all phases is shown."""
+        result = runner(['--profile', 'list'])
+        assert result.exit_code == 0
+        for phase in ('config', 'controler', 'logging', 'backend', 'render', 'total'):
+            assert phase in result.output
+
+    def test_profile_stats(self, runner, appdirs):
+        """Make sure cProfile statistics are dumped to our cache directory."""
+        result = runner(['--profile-stats', 'activities'])
+        assert result.exit_code == 0
+        assert [name for name in os.listdir(appdirs.user_cache_dir) if
+            name.endswith('.pstats')]
+
+    def test_memprofile(self, runner):
+        """Make sure peak memory and each phase are reported."""
+        result = runner(['--memprofile', 'list'])
+        assert result.exit_code == 0
+        assert 'Peak memory' in result.output
+        for phase in ('backend', 'table', 'render'):
+            assert phase in result.output
+
+    def test_memprofile_output(self, runner, tmpdir):
+        """Make sure the report is written to the given file instead."""
+        path = os.path.join(tmpdir.strpath, 'memory')
+        result = runner(['--memprofile-output', path, 'activities'])
+        assert result.exit_code == 0
+        with open(path) as fobj:
+            assert fobj.read().startswith('Peak memory')
+
+
+class TestBench(object):
+    """Make sure the ``bench`` command works as expected."""
+
+    def test_bench(self, runner):
+        """Make sure results are shown and our own database is left alone."""
+        result = runner(['bench', '--facts', '10', '--repeat', '1'])
+        assert result.exit_code == 0
+        assert 'export csv' in result.output
+        assert 'activity-' not in runner(['list']).output
+
+
+class TestMetrics(object):
+    """Make sure each invocation is recorded in our metrics."""
+
+    def test_metrics(self, runner, appdirs):
+        """Make sure repeated invocations add up."""
+        runner(['list'])
+        runner(['list'])
+        state = metrics.load(os.path.join(appdirs.user_cache_dir, 'hamster_cli.metrics'))
+        assert state['commands']['list']['wall']['count'] == 2
+        assert state['commands']['list']['results']['sum'] == 0
+
+    def test_textfile(self, runner, appdirs, get_config_file, tmpdir):
+        """Make sure our metrics are rendered to the configured textfile."""
+        textfile = os.path.join(tmpdir.strpath, 'hamster_cli.prom')
+        get_config_file(metrics_textfile=textfile)
+        assert runner(['activities']).exit_code == 0
+        with open(textfile) as fobj:
+            assert 'hamster_cli_command_duration_seconds_count{command="activities"} 1' in (
+                fobj.read())
+
+    def test_disabled(self, runner, appdirs, get_config_file):
+        """Make sure nothing is recorded if disabled."""
+        get_config_file(metrics='False')
+        runner(['list'])
+        assert not os.path.exists(os.path.join(appdirs.user_cache_dir, 'hamster_cli.metrics'))
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import os
+
+import hamster_lib
+import pytest
+
+from hamster_cli import logstore
+
+
+@pytest.fixture
+def log_config(lib_config, tmpdir):
+    """Provide a backend config using a log structured store."""
+    lib_config.update({
+        'store': 'log',
+        'db_path': os.path.join(tmpdir.strpath, 'store'),
+        'log_compaction_threshold': 1000,
+    })
+    return lib_config
+
+
+@pytest.fixture
+def store(log_config):
+    """Provide a fresh log structured store."""
+    return logstore.LogStore(log_config)
+
+
+def add_facts(store, count, start=datetime.datetime(2016, 1, 1, 9, 0, 0)):
+    """Add ``count`` consecutive, non overlapping facts of 30 minutes each."""
+    facts = []
+    for index in range(count):
+        fact_start = start + datetime.timedelta(hours=index)
+        facts.append(store.facts.save(hamster_lib.Fact(
+            hamster_lib.Activity('foo{}'.format(index % 3),
+                category=hamster_lib.Category('bar')),
+            fact_start, fact_start + datetime.timedelta(minutes=30),
+            description='baz', tags=[hamster_lib.Tag('tag')])))
+    return facts
+
+
+class TestRecords(object):
+    """Unittests for our on disk record format."""
+
+    def test_datetime_roundtrip(self):
+        """Make sure datetimes survive encoding, including microseconds."""
+        value = datetime.datetime(2016, 4, 12, 9, 3, 12, 12345)
+        assert logstore.decode_datetime(logstore.encode_datetime(value)) == value
+
+    def test_torn_record(self, tmpdir):
+        """Make sure reading stops at an incomplete record."""
+        path = os.path.join(tmpdir.strpath, 'segment')
+        with open(path, 'wb') as fobj:
+            fobj.write(logstore.encode_record(['c', 1, 'foo']))
+            fobj.write(logstore.encode_record(['c', 2, 'bar'])[:-2])
+        with open(path, 'rb') as fobj:
+            records = [record for offset, end, record in logstore.read_records(fobj)]
+        assert records == [['c', 1, 'foo']]
+
+
+class TestLogStore(object):
+    """Unittests for ``LogStore`` and its managers."""
+
+    def test_registered(self, log_config):
+        """Make sure ``HamsterControl`` picks up our store."""
+        from hamster_cli import hamster_cli  # NOQA
+        controler = hamster_lib.HamsterControl(log_config)
+        assert isinstance(controler.store, logstore.LogStore)
+
+    def test_categories(self, store):
+        """Make sure categories can be added, renamed and removed."""
+        category = store.categories.save(hamster_lib.Category('foo'))
+        assert store.categories.get_by_name('foo') == category
+        with pytest.raises(ValueError):
+            store.categories.save(hamster_lib.Category('foo'))
+        category.name = 'bar'
+        store.categories.save(category)
+        assert [item.name for item in store.categories.get_all()] == ['bar']
+        store.categories.remove(category)
+        assert store.categories.get_all() == []
+
+    def test_activities(self, store):
+        """Make sure activities are unique per category and can be filtered."""
+        category = store.categories.save(hamster_lib.Category('bar'))
+        store.activities.save(hamster_lib.Activity('foo', category=category))
+        store.activities.save(hamster_lib.Activity('foo'))
+        with pytest.raises(ValueError):
+            store.activities.save(hamster_lib.Activity('foo', category=category))
+        assert len(store.activities.get_all()) == 2
+        assert len(store.activities.get_all(category=category)) == 1
+        assert len(store.activities.get_all(category=None)) == 1
+        assert store.activities.get_all(search_term='baz') == []
+
+    def test_activity_in_use_marked_deleted(self, store):
+        """Make sure removing an activity still referenced by facts only marks it deleted."""
+        fact, = add_facts(store, 1)
+        store.activities.remove(fact.activity)
+        assert store.activities.get(fact.activity.pk).deleted
+
+    def test_facts(self, store):
+        """Make sure facts come back with activity, category and tags."""
+        fact, = add_facts(store, 1)
+        result, = store.facts.get_all()
+        assert result == fact
+        assert result.category.name == 'bar'
+        assert [tag.name for tag in result.tags] == ['tag']
+
+    def test_overlap(self, store):
+        """Make sure we do not accept facts overlapping existing ones."""
+        fact, = add_facts(store, 1)
+        with pytest.raises(ValueError):
+            store.facts.save(hamster_lib.Fact(fact.activity,
+                fact.start + datetime.timedelta(minutes=10),
+                fact.end + datetime.timedelta(minutes=10)))
+
+    def test_get_overlapping(self, store, mocker):
+        """Make sure we find facts enclosing or reaching into the timeframe only."""
+        mocker.patch('hamster_cli.logstore.SPARSE_INDEX_INTERVAL', 4)
+        facts = add_facts(store, 10)
+        store.compact()
+        result = store.facts.get_overlapping(facts[5].start + datetime.timedelta(
+            minutes=10), facts[5].start + datetime.timedelta(minutes=20))
+        assert result == [facts[5]]
+        result = store.facts.get_overlapping(facts[5].end, facts[7].start)
+        assert result == facts[5:8]
+
+    @pytest.mark.parametrize('compact', (False, True))
+    def test_get_overlapping_enclosing(self, store, compact, mocker):
+        """Make sure facts enclosing many others are found, compacted or not."""
+        mocker.patch('hamster_cli.logstore.SPARSE_INDEX_INTERVAL', 4)
+        enclosing = store.facts.save(hamster_lib.Fact(hamster_lib.Activity('foo'),
+            datetime.datetime(2016, 1, 1, 0), datetime.datetime(2016, 1, 1, 23)))
+        # Legacy data may overlap, so we bypass our overlap check.
+        for hour in range(1, 20):
+            store._append(logstore.FACT, None, logstore.encode_datetime(
+                datetime.datetime(2016, 1, 1, hour)), logstore.encode_datetime(
+                datetime.datetime(2016, 1, 1, hour, 30)), enclosing.activity.pk, '', [])
+        if compact:
+            store.compact()
+        result = store.facts.get_overlapping(datetime.datetime(2016, 1, 1, 21),
+            datetime.datetime(2016, 1, 1, 22))
+        assert result == [enclosing]
+
+    def test_update_and_remove(self, store):
+        """Make sure updated facts replace the old version and removed ones are gone."""
+        first, second = add_facts(store, 2)
+        first.description = 'changed'
+        store.facts.save(first)
+        store.facts.remove(second)
+        assert [fact.description for fact in store.facts.get_all()] == ['changed']
+        with pytest.raises(KeyError):
+            store.facts.get(second.pk)
+
+    @pytest.mark.parametrize('compact', (False, True))
+    def test_range_queries(self, store, compact, mocker):
+        """Make sure range queries hit exactly the expected facts, compacted or not."""
+        mocker.patch('hamster_cli.logstore.SPARSE_INDEX_INTERVAL', 4)
+        facts = add_facts(store, 30)
+        if compact:
+            store.compact()
+            assert len(store.sparse_index) == 8
+        start, end = facts[10].start, facts[20].end
+        result = store.facts.get_all(start, end)
+        assert result == facts[10:21]
+        partial = store.facts._get_all(start + datetime.timedelta(minutes=10), end,
+            partial=True)
+        assert partial == facts[10:21]
+        assert store.facts.get_all(filter_term='FOO1') == facts[1::3]
+
+    def test_reopen(self, store, log_config):
+        """Make sure everything is still there after reopening the store."""
+        facts = add_facts(store, 5)
+        store.compact()
+        store.facts.remove(facts[0])
+        add_facts(store, 1, start=datetime.datetime(2016, 2, 1))
+        reopened = logstore.LogStore(log_config)
+        assert len(reopened.facts.get_all()) == 5
+        assert reopened.facts.get(facts[1].pk, start=facts[1].start) == facts[1]
+
+    def test_compaction_threshold(self, log_config):
+        """Make sure we compact once enough live records piled up."""
+        log_config['log_compaction_threshold'] = 10
+        store = logstore.LogStore(log_config)
+        add_facts(store, 5)
+        assert store.generation > 0
+        assert store.live_records < 10
+        assert len(store.facts.get_all()) == 5
+        assert sorted(os.listdir(store.path)) == ['CURRENT', 'LOCK',
+            'base-{}.idx'.format(store.generation), 'base-{}.seg'.format(store.generation),
+            'live-{}.seg'.format(store.generation)]
+
+    def test_torn_tail_recovered(self, store, log_config):
+        """Make sure a record left half written by a crash is dropped on the next write."""
+        add_facts(store, 1)
+        with open(store._get_path('live'), 'ab') as fobj:
+            fobj.write(b'\x00\x00\x01')
+        reopened = logstore.LogStore(log_config)
+        add_facts(reopened, 1, start=datetime.datetime(2016, 2, 1))
+        assert len(logstore.LogStore(log_config).facts.get_all()) == 2
+
+    def test_concurrent_instances(self, store, log_config):
+        """Make sure writes of one instance are seen by, and do not clash with, another."""
+        other = logstore.LogStore(log_config)
+        add_facts(store, 1)
+        second, = add_facts(other, 1, start=datetime.datetime(2016, 2, 1))
+        assert len(store.facts.get_all()) == 2
+        assert second.pk == 2
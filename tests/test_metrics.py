@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+
+import pytest
+
+from hamster_cli import metrics
+
+
+@pytest.fixture
+def state_path(tmpdir):
+    """Provide a path for our state file."""
+    return os.path.join(tmpdir.strpath, 'hamster_cli.metrics')
+
+
+def _record_worker(path, count):
+    """Record ``count`` invocations of 'list'. Used by our concurrency test."""
+    for index in range(count):
+        metrics.record(path, 'list', {'wall': 0.1})
+
+
+class TestObserve(object):
+    """Unittests for adding observations to our histograms."""
+
+    @pytest.mark.parametrize(('value', 'bucket'), (
+        (0.001, 0),
+        (0.005, 0),
+        (0.0051, 1),
+        (10.0, 10),
+        (11.0, 11),
+    ))
+    def test_bucket(self, value, bucket):
+        """Make sure values end up in the first bucket whose bound they do not exceed."""
+        state = metrics.observe({}, 'list', {'wall': value})
+        histogram = state['commands']['list']['wall']
+        assert histogram['buckets'][bucket] == 1
+        assert sum(histogram['buckets']) == 1
+        assert (histogram['sum'], histogram['count']) == (value, 1)
+
+    def test_missing_observations(self):
+        """Make sure we only record what has been observed."""
+        state = metrics.observe({}, 'start', {'wall': 0.1, 'results': None})
+        assert sorted(state['commands']['start']) == ['wall']
+
+    def test_buckets_changed(self):
+        """Make sure histograms recorded with other buckets are started over."""
+        state = {'commands': {'list': {'wall': {'buckets': [5, 5], 'sum': 1.0, 'count': 10}}}}
+        histogram = metrics.observe(state, 'list', {'wall': 0.1})['commands']['list']['wall']
+        assert histogram['count'] == 1
+        assert len(histogram['buckets']) == len(metrics.LATENCY_BUCKETS) + 1
+
+
+class TestRender(object):
+    """Unittests for rendering our state in the Prometheus text format."""
+
+    def test_render(self):
+        """Make sure buckets are cumulative and sum as well as count are present."""
+        state = metrics.observe({}, 'list', {'wall': 0.02, 'results': 5})
+        state = metrics.observe(state, 'list', {'wall': 20.0, 'results': 0})
+        lines = metrics.render(state).splitlines()
+        assert '# TYPE hamster_cli_command_duration_seconds histogram' in lines
+        assert 'hamster_cli_command_duration_seconds_bucket{command="list",le="0.01"} 0' in lines
+        assert 'hamster_cli_command_duration_seconds_bucket{command="list",le="0.025"} 1' in lines
+        assert 'hamster_cli_command_duration_seconds_bucket{command="list",le="+Inf"} 2' in lines
+        assert 'hamster_cli_command_duration_seconds_sum{command="list"} 20.02' in lines
+        assert 'hamster_cli_command_duration_seconds_count{command="list"} 2' in lines
+        assert 'hamster_cli_command_results_bucket{command="list",le="0.0"} 1' in lines
+        assert not [line for line in lines if 'backend_seconds_bucket' in line]
+
+
+class TestRecord(object):
+    """Unittests for updating our state file."""
+
+    def test_record(self, state_path, tmpdir):
+        """Make sure observations add up across invocations and the textfile is written."""
+        textfile = os.path.join(tmpdir.strpath, 'hamster_cli.prom')
+        metrics.record(state_path, 'list', {'wall': 0.1})
+        state = metrics.record(state_path, 'list', {'wall': 0.2}, textfile=textfile)
+        assert metrics.load(state_path) == state
+        assert state['commands']['list']['wall']['count'] == 2
+        with open(textfile) as fobj:
+            assert fobj.read() == metrics.render(state)
+        assert sorted(os.listdir(tmpdir.strpath)) == ['hamster_cli.metrics',
+            'hamster_cli.metrics.lock', 'hamster_cli.prom']
+
+    def test_damaged_state(self, state_path):
+        """Make sure a damaged state file is started over instead of failing."""
+        with open(state_path, 'w') as fobj:
+            fobj.write('{"commands": ')
+        state = metrics.record(state_path, 'list', {'wall': 0.1})
+        assert state['commands']['list']['wall']['count'] == 1
+
+    @pytest.mark.skipif(metrics.fcntl is None, reason="Requires 'fcntl'.")
+    def test_concurrent_invocations(self, state_path):
+        """Make sure concurrent invocations do not lose each other's observations."""
+        workers, count = 4, 25
+        processes = [multiprocessing.Process(target=_record_worker, args=(state_path, count))
+            for worker in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        assert [process.exitcode for process in processes] == [0] * workers
+        assert metrics.load(state_path)['commands']['list']['wall']['count'] == workers * count